@@ -0,0 +1,74 @@
+"""
+Benchmark de area/partida como object frente a Categorical
+Mide memoria de las columnas y tiempos de normalizacion, validacion de
+dominio, groupby y escritura Parquet.
+
+Uso: python project/bench/bench_categoricas.py [filas]
+"""
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+import validacion
+
+AREA_MAP = {'ventas': 'Ventas', 'VENTAS': 'Ventas', 'ti': 'Ti', 'TI': 'Ti', 'IT': 'Ti',
+            'rrhh': 'Rrhh', 'RRHH': 'Rrhh', 'marketing': 'Marketing', 'operaciones': 'Operaciones'}
+AREAS = sorted(['Ventas', 'Marketing', 'Ti', 'Rrhh', 'Operaciones'])
+PARTIDA_MAP = {'salarios': 'Salarios', 'PUBLICIDAD': 'Publicidad'}
+
+def datos(n):
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'area': rng.choice(['Ventas', 'Marketing', 'TI', 'RRHH', 'Operaciones', 'ventas', 'ti'], n),
+        'partida': rng.choice(['Salarios', 'Material Oficina', 'Software', 'Hardware', 'Publicidad',
+                               'Formacion', 'Viajes', 'Servicios Externos', 'salarios', 'PUBLICIDAD'], n),
+        'importe': rng.uniform(100, 15000, n).round(2),
+    })
+
+def cronometrar(tiempos, nombre, fn):
+    inicio = time.perf_counter()
+    resultado = fn()
+    tiempos[nombre] = time.perf_counter() - inicio
+    return resultado
+
+def antes(df):
+    t = {}
+    area = cronometrar(t, 'norm_area', lambda: df['area'].replace(AREA_MAP).str.title())
+    partida = cronometrar(t, 'norm_partida', lambda: df['partida'].replace(PARTIDA_MAP).str.title())
+    limpio = df.assign(area=area, partida=partida)
+    cronometrar(t, 'isin', lambda: limpio['area'].isin(AREAS))
+    cronometrar(t, 'groupby', lambda: limpio.groupby('area')['importe'].sum())
+    cronometrar(t, 'parquet', lambda: limpio.to_parquet(io.BytesIO(), index=False))
+    return limpio, t
+
+def despues(df):
+    t = {}
+    area = cronometrar(t, 'norm_area', lambda: validacion.a_categoria(
+        df['area'], lambda v: v.replace(AREA_MAP).str.title(), AREAS))
+    partida = cronometrar(t, 'norm_partida', lambda: validacion.a_categoria(
+        df['partida'], lambda v: v.replace(PARTIDA_MAP).str.title()))
+    limpio = df.assign(area=area, partida=partida)
+    cronometrar(t, 'isin', lambda: limpio['area'].isin(AREAS))
+    cronometrar(t, 'groupby', lambda: limpio.groupby('area', observed=True)['importe'].sum())
+    cronometrar(t, 'parquet', lambda: limpio.to_parquet(io.BytesIO(), index=False))
+    return limpio, t
+
+def main(n):
+    df = datos(n)
+    obj, t_obj = antes(df)
+    cat, t_cat = despues(df)
+    mb = lambda d: d[['area', 'partida']].memory_usage(deep=True, index=False).sum() / 1e6
+    print(f"Filas: {n:,}")
+    print(f"Memoria area+partida: object {mb(obj):,.1f} MB | category {mb(cat):,.1f} MB "
+          f"({mb(obj) / mb(cat):.0f}x)")
+    print(f"{'Paso':<12} | {'object (s)':>10} | {'category (s)':>12}")
+    for paso in t_obj:
+        print(f"{paso:<12} | {t_obj[paso]:>10.3f} | {t_cat[paso]:>12.3f}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000)
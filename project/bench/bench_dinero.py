@@ -0,0 +1,153 @@
+"""
+Benchmark de importes en coma fija (centimos int64) frente a float64
+Referencia: importe float64 redondeado con .round(2) (ruta anterior). Se
+mide cada paso por el que pasa el dinero: conversion al limpiar, pasada
+de Oro sobre Plata (motor_kpis), KPIs y escritura Parquet (float64 frente
+a DECIMAL(18,2)). Ademas, el error acumulado de sumar en float:
+total de Plata y estado incremental sumando deltas batch a batch. Comprueba
+que los importes inf/1e20 acaban en cuarentena.
+
+Uso: python project/bench/bench_dinero.py [filas]
+"""
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+
+import dinero
+import get_data
+import limpieza
+import motor_kpis
+import oro
+
+BATCHES = 1000
+
+
+def plata(n):
+    """Gastos limpios sinteticos con importe float64 (euros) y en centimos"""
+    rng = np.random.default_rng(42)
+    tabla = get_data.generar_bloque(n, rng, tasas=get_data.Tasas(0, 0, 0, 0, 0))
+    texto = pd.Series(pd.arrays.ArrowStringArray(tabla['importe'].cast(pa.string())))
+    df = pd.DataFrame({
+        'fecha': pd.to_datetime(tabla['fecha'].to_numpy(zero_copy_only=False)),
+        'area': limpieza.normalizar_area(pd.Series(tabla['area'].to_numpy(zero_copy_only=False))),
+        'partida': limpieza.normalizar_partida(pd.Series(tabla['partida'].to_numpy(zero_copy_only=False))),
+    })
+    return texto, df
+
+
+def medir(fn, repeticiones=3):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = fn()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def kpis(agregados, presupuesto):
+    return oro.calcular_kpis(agregados['gasto_area'], presupuesto, 'bench')
+
+
+def kpis_float(agregados, presupuesto):
+    """Ruta anterior: cociente float redondeado"""
+    df = agregados['gasto_area'].merge(presupuesto, on='area', how='left')
+    df['kpi_ejecucion'] = (df['gasto_acumulado'] / df['presupuesto_anual'] * 100).round(2)
+    df['kpi_ejecucion_decimal'] = (df['gasto_acumulado'] / df['presupuesto_anual']).round(4)
+    return df
+
+
+def escribir(tabla, **opciones):
+    pq.write_table(tabla, io.BytesIO(), **opciones)
+
+
+def lectura_pandas(df_cent):
+    """pd.read_parquet (sin dinero.a_pandas) devuelve los importes exactos"""
+    buffer = io.BytesIO()
+    pq.write_table(dinero.a_tabla(df_cent), buffer, **dinero.OPCIONES_PARQUET)
+    buffer.seek(0)
+    leido = pd.read_parquet(buffer)['importe']
+    return bool((leido.map(lambda v: int(v.scaleb(dinero.DECIMALES))).to_numpy() == df_cent['importe'].to_numpy()).all())
+
+
+def fuera_de_rango():
+    """Importes inf/1e20 van a cuarentena al limpiar (no llegan a centimos)
+    y a_centimos no los convierte en silencio"""
+    texto = pd.Series(['12.50', 'inf', '1e20', '-inf', '99.99'], dtype=pd.ArrowDtype(pa.string()))
+    bronce = pd.DataFrame({'fecha': '2024-01-15', 'area': 'Ventas', 'partida': 'Software', 'importe': texto})
+    validos, rechazados, causas = limpieza.limpiar_gastos(bronce)
+    en_cuarentena = dict(zip(rechazados['importe'], causas))
+    esperado = {'inf': 'Error en conversion de tipos', '-inf': 'Error en conversion de tipos',
+                '1e20': 'Importe fuera de rango'}
+    try:
+        dinero.a_centimos(pd.Series([1e20]))
+        lanza = False
+    except ValueError:
+        lanza = True
+    return en_cuarentena == esperado and validos['importe'].tolist() == [1250, 9999] and lanza
+
+
+def deriva_incremental(importes):
+    """Suma batch a batch (como estado_oro) en float y en centimos"""
+    total_float, total_cent = 0.0, 0
+    for trozo in np.array_split(importes, BATCHES):
+        total_float += float((trozo / 100).sum())
+        total_cent += int(trozo.sum())
+    return total_float, total_cent
+
+
+def main(n):
+    texto, df = plata(n)
+    presupuesto = pd.DataFrame({'area': pd.Categorical(limpieza.areas_validas), 'presupuesto_anual': 1e9})
+    filas = []
+
+    t_f, euros = medir(lambda: limpieza.a_numero(texto).round(2))
+    t_c, centimos = medir(lambda: dinero.a_centimos(limpieza.a_numero(texto)))
+    filas.append(('conversion (a_numero + redondeo)', t_f, t_c))
+
+    df_float, df_cent = df.assign(importe=euros), df.assign(importe=centimos)
+    # La pasada sobre Plata es lo que escala con las filas; el enrollado
+    # posterior trabaja sobre el grano fino (solo centimos)
+    t_f, _ = medir(lambda: motor_kpis.agregar_fino(df_float, oro.AGREGADOS_ORO))
+    t_c, _ = medir(lambda: motor_kpis.agregar_fino(df_cent, oro.AGREGADOS_ORO))
+    filas.append(('pasada de Oro sobre Plata (motor_kpis)', t_f, t_c))
+    agregados_f = {'gasto_area': df_float.groupby('area', observed=True)['importe'].sum()
+                   .round(2).rename('gasto_acumulado').reset_index()}
+    agregados_c = oro.agregar(df_cent, oro.AGREGADOS_BASE)
+
+    t_f, _ = medir(lambda: kpis_float(agregados_f, presupuesto))
+    t_c, _ = medir(lambda: kpis(agregados_c, presupuesto.assign(presupuesto_anual=10 ** 11)))
+    filas.append(('KPIs de ejecucion', t_f, t_c))
+
+    t_f, _ = medir(lambda: escribir(pa.Table.from_pandas(df_float, preserve_index=False)))
+    t_c, _ = medir(lambda: escribir(dinero.a_tabla(df_cent), **dinero.OPCIONES_PARQUET))
+    filas.append(('Parquet Plata (float64 / DECIMAL)', t_f, t_c))
+
+    exacto = int(centimos.sum())
+    ida_vuelta = lectura_pandas(df_cent.head(100_000))
+    rango = fuera_de_rango()
+    total_float = float(euros.sum())
+    incremental_float, incremental_cent = deriva_incremental(centimos.to_numpy())
+
+    print(f"Filas: {n:,}")
+    print(f"{'Paso':<38} | {'float s':>8} | {'cent s':>8} | {'x':>5}")
+    print(f"{'-'*38}-|-{'-'*8}-|-{'-'*8}-|-{'-'*5}")
+    for nombre, t_float, t_cent in filas:
+        print(f"{nombre:<38} | {t_float:>8.3f} | {t_cent:>8.3f} | {t_float / t_cent:>5.2f}")
+    print(f"\nTotal exacto (centimos): {exacto / 100:,.2f}")
+    print(f"Suma float64 de Plata:   {total_float:,.6f} (error {total_float - exacto / 100:+.2e} EUR)")
+    print(f"Estado incremental, {BATCHES} batches: float {incremental_float:,.6f} "
+          f"(error {incremental_float - exacto / 100:+.2e} EUR), centimos exacto: {incremental_cent == exacto}")
+    print(f"pd.read_parquet de DECIMAL(18,2) exacto (Decimal): {ida_vuelta}")
+    print(f"inf/1e20 en cuarentena y a_centimos lanza ValueError: {rango}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000)
@@ -0,0 +1,30 @@
+"""
+Micro-benchmark de generacion de _event_id
+Compara la list comprehension con uuid4 frente al generador vectorizado.
+
+Uso: python project/bench/bench_event_id.py [filas ...]
+"""
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+from event_ids import generar_event_ids
+
+def medir(fn):
+    inicio = time.perf_counter()
+    fn()
+    return time.perf_counter() - inicio
+
+def main(tamanos):
+    print(f"{'Filas':>12} | {'uuid4 (s)':>10} | {'aleatorio (s)':>13} | {'determinista (s)':>16} | {'Speedup':>7}")
+    print("-" * 72)
+    for n in tamanos:
+        t_uuid = medir(lambda: [str(uuid.uuid4()) for _ in range(n)])
+        t_rand = medir(lambda: generar_event_ids(n))
+        t_det = medir(lambda: generar_event_ids(n, semilla='20240101_000000/gastos.csv'))
+        print(f"{n:>12,} | {t_uuid:>10.3f} | {t_rand:>13.3f} | {t_det:>16.3f} | {t_uuid / t_rand:>6.1f}x")
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [1_000_000, 10_000_000])
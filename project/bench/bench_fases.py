@@ -0,0 +1,210 @@
+"""
+Benchmark por fase y etapa del ETL a varias escalas, con comparacion
+contra una linea base
+Para cada escala genera gastos sinteticos con semilla (get_data.py) y
+ejecuta el Pipeline completo con metricas en un proceso nuevo y en un
+directorio temporal (el pico de RSS no arrastra escalas anteriores ni se
+tocan los datos del proyecto). Se guarda, por escala, el tiempo real, CPU
+y memoria de cada etapa instrumentada: read_csv, trazabilidad, cada
+regla de limpieza, dedup, groupby, escrituras Parquet, SQLite y render.
+Por defecto las escrituras van en serie (--hilos-escritura 0) para que el
+desglose por fase sume el total; con hilos, cada escritura se sigue
+midiendo en su hilo pero se solapa con las etapas de calculo.
+
+Uso:
+    python project/bench/bench_fases.py                                  # 10k, 1M y 10M filas
+    python project/bench/bench_fases.py --escalas 10000 1000000 --base base.json
+    python project/bench/bench_fases.py --diff base.json nuevo.json
+
+Con --base (o --diff) imprime la diferencia por etapa y termina con
+codigo 1 si alguna etapa de mas de MINIMO_S empeora mas que --umbral;
+--repeticiones guarda el minimo de varias ejecuciones por escala.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(RAIZ, 'project', 'ingest'))
+
+ESCALAS = [10_000, 1_000_000, 10_000_000]
+# Etapas mas rapidas que esto no se marcan como regresion (ruido)
+MINIMO_S = 0.05
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir_escala(filas, semilla=42, chunksize=0, hilos_escritura=0):
+    """Genera los datos y ejecuta el Pipeline en el directorio actual.
+
+    Devuelve las etapas agregadas por nombre (las repetidas, como bloques
+    en streaming, se suman) y los totales de la ejecucion.
+    """
+    import pandas as pd
+
+    import get_data
+    from pipeline import Pipeline
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        get_data.generar_datos_ejemplo(filas, semilla)
+        t_generacion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        Pipeline(chunksize=chunksize, con_metricas=True, hilos_escritura=hilos_escritura).ejecutar('bench')
+        t_total = time.perf_counter() - inicio
+
+    with open('project/data/metrics/run_metrics_batch_bench.json', encoding='utf-8') as f:
+        df = pd.DataFrame(json.load(f)['etapas'])
+    etapas = df.groupby('etapa', sort=False).agg(
+        n=('nombre', 'size'),
+        wall_s=('wall_s', 'sum'),
+        cpu_s=('cpu_s', 'sum'),
+        rss_pico_mb=('rss_pico_mb', 'max'),
+        rss_delta_mb=('rss_delta_mb', 'sum'),
+        filas_entrada=('filas_entrada', lambda s: s.sum(min_count=1)),
+    )
+    etapas = etapas.astype(object).where(etapas.notna(), None)
+    return {
+        'filas': filas,
+        'chunksize': chunksize,
+        'hilos_escritura': hilos_escritura,
+        'generacion_s': t_generacion,
+        'total_s': t_total,
+        'rss_pico_mb': float(df['rss_pico_mb'].max()),
+        'etapas': etapas.to_dict(orient='index'),
+    }
+
+
+def ejecutar_escala(filas, semilla, chunksize, hilos_escritura=0):
+    """medir_escala en un proceso y directorio nuevos"""
+    with tempfile.TemporaryDirectory() as tmp:
+        comando = [sys.executable, os.path.abspath(__file__), '--una-escala', str(filas),
+                   '--semilla', str(semilla), '--chunksize', str(chunksize),
+                   '--hilos-escritura', str(hilos_escritura)]
+        salida = subprocess.run(comando, cwd=tmp, capture_output=True, text=True, check=True).stdout
+    return json.loads(salida)
+
+
+def _minimo(medidas):
+    """Con repeticiones se queda con el minimo de cada etapa (menos ruido)"""
+    mejor = min(medidas, key=lambda m: m['total_s'])
+    for etapa, e in mejor['etapas'].items():
+        for campo in ['wall_s', 'cpu_s']:
+            e[campo] = min(m['etapas'][etapa][campo] for m in medidas if etapa in m['etapas'])
+    mejor['repeticiones'] = len(medidas)
+    return mejor
+
+
+def ejecutar(escalas, semilla=42, chunksize=0, repeticiones=1, hilos_escritura=0):
+    resultado = {
+        'commit': _commit(),
+        'fecha': datetime.now().isoformat(),
+        'entorno': {'python': platform.python_version(), 'maquina': platform.machine(),
+                    'cpus': os.cpu_count()},
+        'escalas': {},
+    }
+    for filas in escalas:
+        print(f"Escala {filas:,} filas...", flush=True)
+        medida = _minimo([ejecutar_escala(filas, semilla, chunksize, hilos_escritura) for _ in range(repeticiones)])
+        resultado['escalas'][str(filas)] = medida
+        print(f"   {medida['total_s']:.2f} s, pico {medida['rss_pico_mb']:.0f} MB "
+              f"(generacion {medida['generacion_s']:.2f} s)")
+    return resultado
+
+
+def imprimir(resultado):
+    for filas, medida in resultado['escalas'].items():
+        print(f"\n{int(filas):,} filas | total {medida['total_s']:.2f} s | pico {medida['rss_pico_mb']:.0f} MB")
+        ancho = max(map(len, medida['etapas']))
+        print(f"{'Etapa':<{ancho}} | {'wall s':>8} | {'cpu s':>8} | {'RSS +MB':>8}")
+        print(f"{'-'*ancho}-|-{'-'*8}-|-{'-'*8}-|-{'-'*8}")
+        for etapa, e in medida['etapas'].items():
+            delta = '' if e['rss_delta_mb'] is None else f"{e['rss_delta_mb']:.0f}"
+            print(f"{etapa:<{ancho}} | {e['wall_s']:>8.3f} | {e['cpu_s']:>8.3f} | {delta:>8}")
+
+
+def comparar(base, nuevo, umbral=0.10):
+    """Imprime la diferencia por escala y etapa; devuelve las regresiones"""
+    regresiones = []
+    print(f"Base: {base.get('commit')} ({base.get('fecha')}) | Nuevo: {nuevo.get('commit')} ({nuevo.get('fecha')})")
+    for filas in [f for f in nuevo['escalas'] if f in base['escalas']]:
+        b, n = base['escalas'][filas], nuevo['escalas'][filas]
+        print(f"\n{int(filas):,} filas | total {b['total_s']:.2f} -> {n['total_s']:.2f} s | "
+              f"pico {b['rss_pico_mb']:.0f} -> {n['rss_pico_mb']:.0f} MB")
+        etapas = list(b['etapas']) + [e for e in n['etapas'] if e not in b['etapas']]
+        ancho = max(map(len, etapas))
+        print(f"{'Etapa':<{ancho}} | {'base s':>8} | {'nuevo s':>8} | {'cambio':>8}")
+        print(f"{'-'*ancho}-|-{'-'*8}-|-{'-'*8}-|-{'-'*8}")
+        for etapa in etapas:
+            t_base = b['etapas'].get(etapa, {}).get('wall_s')
+            t_nuevo = n['etapas'].get(etapa, {}).get('wall_s')
+            if t_base is None or t_nuevo is None:
+                cambio = 'nueva' if t_base is None else 'quitada'
+            else:
+                cambio = f'{(t_nuevo / t_base - 1) * 100:+.0f}%' if t_base > 0 else ''
+                if max(t_base, t_nuevo) >= MINIMO_S and t_nuevo > t_base * (1 + umbral):
+                    regresiones.append((filas, etapa))
+                    cambio += ' !'
+            fmt = lambda t: '' if t is None else f'{t:.3f}'
+            print(f"{etapa:<{ancho}} | {fmt(t_base):>8} | {fmt(t_nuevo):>8} | {cambio:>8}")
+    print(f"\nRegresiones (> {umbral:.0%}): {len(regresiones)}")
+    return regresiones
+
+
+def _cargar(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark por fase del ETL a varias escalas')
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--chunksize', type=int, default=0, help='Modo streaming (0 = en memoria)')
+    parser.add_argument('--hilos-escritura', type=int, default=0,
+                        help='Hilos de escritura del Pipeline (0 = en serie, desglose por fase aditivo)')
+    parser.add_argument('--repeticiones', type=int, default=1,
+                        help='Ejecuciones por escala; se guarda el minimo por etapa')
+    parser.add_argument('--salida', default=None,
+                        help='JSON de resultados (por defecto project/data/metrics/bench_fases_{commit}.json)')
+    parser.add_argument('--base', default=None, help='JSON de una ejecucion anterior para comparar')
+    parser.add_argument('--diff', nargs=2, metavar=('BASE', 'NUEVO'), default=None,
+                        help='Solo compara dos JSON guardados')
+    parser.add_argument('--umbral', type=float, default=0.10)
+    parser.add_argument('--una-escala', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.una_escala is not None:
+        # Proceso hijo: mide una escala en el directorio actual y emite JSON
+        print(json.dumps(medir_escala(args.una_escala, args.semilla, args.chunksize, args.hilos_escritura)))
+        sys.exit(0)
+
+    if args.diff:
+        sys.exit(1 if comparar(_cargar(args.diff[0]), _cargar(args.diff[1]), args.umbral) else 0)
+
+    resultado = ejecutar(args.escalas, args.semilla, args.chunksize, args.repeticiones, args.hilos_escritura)
+    salida = args.salida or os.path.join(RAIZ, 'project', 'data', 'metrics',
+                                         f"bench_fases_{resultado['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2)
+    imprimir(resultado)
+    print(f"\nResultados guardados: {salida}")
+    if args.base:
+        print()
+        sys.exit(1 if comparar(_cargar(args.base), resultado, args.umbral) else 0)
@@ -0,0 +1,58 @@
+"""
+Benchmark del motor de KPIs: un recorrido de Plata por agregado frente a
+una sola pasada al grano fino y enrollado
+Plata sintetica de N filas; los agregados son los de oro.AGREGADOS_ORO.
+
+Uso: python project/bench/bench_kpis.py [filas]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+
+import motor_kpis
+import oro
+
+
+def plata(n, semilla=42):
+    rng = np.random.default_rng(semilla)
+    areas = ['Marketing', 'Operaciones', 'Rrhh', 'Ti', 'Ventas']
+    partidas = ['Hardware', 'Publicidad', 'Salarios', 'Software']
+    return pd.DataFrame({
+        'fecha': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, n), unit='D'),
+        'area': pd.Categorical.from_codes(rng.integers(0, len(areas), n), areas),
+        'partida': pd.Categorical.from_codes(rng.integers(0, len(partidas), n), partidas),
+        'importe': rng.integers(1_000, 1_500_000, n),  # centimos, como en Plata
+    })
+
+
+def por_agregado(df, agregados):
+    """Referencia: cada agregado recorre Plata completa"""
+    return {a.nombre: motor_kpis.calcular(df, [a])[a.nombre] for a in agregados}
+
+
+def medir(fn):
+    inicio = time.perf_counter()
+    resultado = fn()
+    return time.perf_counter() - inicio, resultado
+
+
+def main(n):
+    df = plata(n)
+    t_ref, ref = medir(lambda: por_agregado(df, oro.AGREGADOS_ORO))
+    t_motor, res = medir(lambda: motor_kpis.calcular(df, oro.AGREGADOS_ORO))
+    iguales = all(ref[k].equals(res[k]) for k in ref)
+
+    print(f"Filas: {n:,} | Agregados: {len(oro.AGREGADOS_ORO)} | Resultados identicos: {iguales}")
+    print(f"{'Metodo':<32} | {'s':>7} | {'x':>6}")
+    print(f"{'-'*32}-|-{'-'*7}-|-{'-'*6}")
+    print(f"{'Un recorrido por agregado':<32} | {t_ref:>7.3f} | {1:>6.1f}")
+    print(f"{'Una pasada + enrollado':<32} | {t_motor:>7.3f} | {t_ref / t_motor:>6.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000)
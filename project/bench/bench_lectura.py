@@ -0,0 +1,106 @@
+"""
+Benchmark de lectura + conversion de tipos de gastos.csv
+Referencia: pd.read_csv con inferencia de tipos y despues pd.to_datetime /
+pd.to_numeric sobre las columnas. Frente a la lectura con esquema
+declarado de ingesta.leer_csv (pyarrow, solo las columnas del esquema) y
+la conversion de limpieza.a_fecha / a_numero, completa y por bloques, y
+con la entrada comprimida en gzip y zstd. Comprueba tambien que
+a_numero deja nulos 'inf'/'nan' (por el cast unico y por la ruta lenta).
+
+Uso: python project/bench/bench_lectura.py [filas]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+
+import get_data
+import limpieza
+from ingesta import DTYPES_GASTOS, leer_csv
+
+BLOQUE = 1_000_000
+
+
+def referencia(ruta):
+    df = pd.read_csv(ruta)
+    return pd.to_datetime(df['fecha'], errors='coerce'), pd.to_numeric(df['importe'], errors='coerce')
+
+
+def con_esquema(ruta):
+    df = leer_csv(ruta, dtype=DTYPES_GASTOS, columnas=list(DTYPES_GASTOS))
+    return limpieza.a_fecha(df['fecha']), limpieza.a_numero(df['importe'])
+
+
+def por_bloques_pandas(ruta):
+    """Lector por bloques anterior (pd.read_csv con chunksize)"""
+    for bloque in pd.read_csv(ruta, dtype=DTYPES_GASTOS, chunksize=BLOQUE, dtype_backend='pyarrow'):
+        limpieza.a_fecha(bloque['fecha']), limpieza.a_numero(bloque['importe'])
+
+
+def por_bloques(ruta):
+    for bloque in leer_csv(ruta, dtype=DTYPES_GASTOS, chunksize=BLOQUE, columnas=list(DTYPES_GASTOS)):
+        limpieza.a_fecha(bloque['fecha']), limpieza.a_numero(bloque['importe'])
+
+
+def no_finitos():
+    """'inf', '-inf' y 'nan' quedan nulos en a_numero; '1e20' es un numero
+    (lo rechaza la regla de rango). Columna corta (un solo cast de Arrow) y
+    con texto largo (regex + pd.to_numeric)"""
+    entradas = ['inf', '-inf', 'nan', 'Infinity', '1e20', '12.50']
+    esperado = [None, None, None, None, 1e20, 12.5]
+    for extra in [[], ['importe no numerico, texto largo']]:
+        s = pd.Series(entradas + extra, dtype=pd.ArrowDtype(pa.string()))
+        valores = limpieza.a_numero(s)[:len(entradas)]
+        if valores.isna().tolist() != [v is None for v in esperado] or \
+                valores.dropna().tolist() != [v for v in esperado if v is not None]:
+            return False
+    return True
+
+
+def comprimir(ruta, codec, extension):
+    destino = ruta + extension
+    with open(ruta, 'rb') as origen, pa.CompressedOutputStream(destino, codec) as salida:
+        while trozo := origen.read(1 << 24):
+            salida.write(trozo)
+    return destino
+
+
+def medir(fn):
+    inicio = time.perf_counter()
+    resultado = fn()
+    return time.perf_counter() - inicio, resultado
+
+
+def main(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'gastos.csv')
+        get_data.generar_gastos(ruta, n)
+        t_ref, (fecha_ref, importe_ref) = medir(lambda: referencia(ruta))
+        t_esq, (fecha, importe) = medir(lambda: con_esquema(ruta))
+        iguales = fecha.equals(fecha_ref) and importe.equals(importe_ref)
+        t_bloques_pd, _ = medir(lambda: por_bloques_pandas(ruta))
+        t_bloques, _ = medir(lambda: por_bloques(ruta))
+        ruta_gz = comprimir(ruta, 'gzip', '.gz')
+        ruta_zst = comprimir(ruta, 'zstd', '.zst')
+        t_gz, _ = medir(lambda: con_esquema(ruta_gz))
+        t_zst, _ = medir(lambda: con_esquema(ruta_zst))
+        tamanos = {r: os.path.getsize(r) / 1e6 for r in [ruta, ruta_gz, ruta_zst]}
+
+    print(f"Filas: {n:,} | CSV {tamanos[ruta]:,.0f} MB | gz {tamanos[ruta_gz]:,.0f} MB | "
+          f"zst {tamanos[ruta_zst]:,.0f} MB | fecha/importe identicos: {iguales}")
+    print(f"{'Lectura + conversion':<40} | {'s':>7} | {'x':>6}")
+    print(f"{'-'*40}-|-{'-'*7}-|-{'-'*6}")
+    for nombre, t in [('read_csv con inferencia + to_*', t_ref), ('esquema pyarrow + a_fecha/a_numero', t_esq),
+                      ('por bloques: pd.read_csv(chunksize)', t_bloques_pd), ('por bloques: pyarrow open_csv', t_bloques),
+                      ('esquema pyarrow, .csv.gz', t_gz), ('esquema pyarrow, .csv.zst', t_zst)]:
+        print(f"{nombre:<40} | {t:>7.3f} | {t_ref / t:>6.1f}")
+    print(f"\na_numero: inf/-inf/nan como nulos (cuarentena por conversion): {no_finitos()}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000)
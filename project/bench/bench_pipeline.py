@@ -0,0 +1,71 @@
+"""
+Benchmark de arranque en frio frente a worker caliente
+Frio: cada batch es un proceso nuevo (python project/ingest/run.py), que
+paga el arranque del interprete y la importacion de pandas/pyarrow.
+Caliente: un unico proceso crea el Pipeline una vez y ejecuta los batches
+seguidos; el primero incluye la importacion, el resto es solo el ETL.
+
+Uso: python project/bench/bench_pipeline.py [batches]
+"""
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+
+
+def medir(fn):
+    inicio = time.perf_counter()
+    fn()
+    return time.perf_counter() - inicio
+
+
+def frio(n):
+    comando = [sys.executable, 'project/ingest/run.py']
+    return [medir(lambda i=i: subprocess.run(comando + ['--batch-id', f'bench_frio_{i}'], cwd=RAIZ,
+                                              stdout=subprocess.DEVNULL, check=True))
+            for i in range(n)]
+
+
+def solo_importacion():
+    comando = [sys.executable, '-c', 'import pipeline']
+    entorno = dict(os.environ, PYTHONPATH=os.path.join(RAIZ, 'project', 'ingest'))
+    return medir(lambda: subprocess.run(comando, cwd=RAIZ, env=entorno, check=True))
+
+
+def caliente(n):
+    os.chdir(RAIZ)
+    tiempos = []
+    inicio = time.perf_counter()
+    from pipeline import Pipeline
+    p = Pipeline()
+    t_import = time.perf_counter() - inicio
+    for i in range(n):
+        with contextlib.redirect_stdout(io.StringIO()):
+            tiempos.append(medir(lambda: p.ejecutar(f'bench_caliente_{i}')))
+    return t_import, tiempos
+
+
+def main(n):
+    t_frio = frio(n)
+    t_arranque = solo_importacion()
+    t_import, t_caliente = caliente(n)
+    media_frio = sum(t_frio) / n
+    media_caliente = sum(t_caliente[1:]) / max(1, n - 1)
+    print(f"Batches: {n}")
+    print(f"{'Modo':<34} | {'s/batch':>8}")
+    print("-" * 46)
+    print(f"{'Frio (proceso por batch)':<34} | {media_frio:>8.3f}")
+    print(f"{'  arranque + imports (python -c)':<34} | {t_arranque:>8.3f}")
+    print(f"{'Caliente: primer batch (+import)':<34} | {t_import + t_caliente[0]:>8.3f}")
+    print(f"{'Caliente: batches siguientes':<34} | {media_caliente:>8.3f}")
+    print(f"\nAhorro por batch en caliente: {media_frio - media_caliente:.3f} s "
+          f"({media_frio / media_caliente:.1f}x)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,81 @@
+"""
+Benchmark del renderizado de tablas: iterrows + concatenacion frente a
+formateo por columnas
+Tabla de detalle sintetica area x partida x mes con N filas; la version
+por columnas se escribe en streaming a archivo en Markdown, HTML y CSV.
+
+Uso: python project/bench/bench_render.py [filas]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+
+import render
+from render import Columna
+
+COLUMNAS = [
+    Columna('Area', 'area'),
+    Columna('Partida', 'partida'),
+    Columna('Mes', 'mes'),
+    Columna('Gasto (EUR)', 'gasto', '{:,.2f}', 'der'),
+    Columna('KPI (%)', 'kpi', '**{:.2f}%**', 'der'),
+]
+
+
+def detalle(n, semilla=42):
+    rng = np.random.default_rng(semilla)
+    areas = ['Ti', 'Marketing', 'Operaciones', 'Ventas', 'Rrhh']
+    partidas = ['Software', 'Hardware', 'Publicidad', 'Salarios', 'Formacion', 'Viajes']
+    meses = [f'2024-{m:02d}' for m in range(1, 13)]
+    return pd.DataFrame({
+        'area': pd.Categorical.from_codes(rng.integers(0, len(areas), n), areas),
+        'partida': pd.Categorical.from_codes(rng.integers(0, len(partidas), n), partidas),
+        'mes': np.array(meses, dtype=object)[rng.integers(0, len(meses), n)],
+        'gasto': rng.uniform(10, 50_000, n).round(2),
+        'kpi': rng.uniform(0, 150, n).round(2),
+    })
+
+
+def iterrows_concatenacion(df):
+    """Referencia: el patron anterior de la fase 4"""
+    texto = "| Area | Partida | Mes | Gasto (EUR) | KPI (%) |\n"
+    texto += "|------|---------|-----|------------:|--------:|\n"
+    for _, row in df.iterrows():
+        texto += f"| {row['area']} | {row['partida']} | {row['mes']} | {row['gasto']:,.2f} | **{row['kpi']:.2f}%** |\n"
+    return texto
+
+
+def medir(fn):
+    inicio = time.perf_counter()
+    resultado = fn()
+    return time.perf_counter() - inicio, resultado
+
+
+def main(n):
+    df = detalle(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'detalle')
+        t_ref, texto_ref = medir(lambda: iterrows_concatenacion(df))
+        t_md, _ = medir(lambda: render.escribir(render.tabla_markdown(df, COLUMNAS), ruta + '.md'))
+        t_html, _ = medir(lambda: render.escribir(render.tabla_html(df, COLUMNAS), ruta + '.html'))
+        t_csv, _ = medir(lambda: render.escribir(render.tabla_csv(df, COLUMNAS), ruta + '.csv'))
+        with open(ruta + '.md', encoding='utf-8') as f:
+            iguales = f.read() == texto_ref
+
+    print(f"Filas: {n:,} | Markdown identico a la referencia: {iguales}")
+    print(f"{'Metodo':<34} | {'s':>7} | {'x':>6}")
+    print(f"{'-'*34}-|-{'-'*7}-|-{'-'*6}")
+    print(f"{'iterrows + concatenacion (md)':<34} | {t_ref:>7.3f} | {1:>6.1f}")
+    for nombre, t in [('por columnas, streaming (md)', t_md), ('por columnas, streaming (html)', t_html),
+                      ('por columnas, streaming (csv)', t_csv)]:
+        print(f"{nombre:<34} | {t:>7.3f} | {t_ref / t:>6.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,53 @@
+"""
+Benchmark del reporte regenerado solo desde Oro
+Compara una ejecucion completa del pipeline con el modo solo reporte:
+lectura en frio de los Parquet de Oro (memory-map), re-render con la
+cache caliente y un reporte por cada mes del periodo en un bucle.
+
+Uso: python project/bench/bench_reporte_oro.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+
+
+def medir(fn):
+    inicio = time.perf_counter()
+    fn()
+    return time.perf_counter() - inicio
+
+
+def main():
+    os.chdir(RAIZ)
+    import artefactos_oro
+    import reporte
+    from pipeline import Pipeline
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        t_pipeline = medir(lambda: Pipeline().ejecutar('bench_reporte'))
+
+    ruta = os.path.join('project', 'output', 'reporte_bench.md')
+    artefactos_oro.limpiar_cache()
+    t_frio = medir(lambda: reporte.generar_desde_oro(ruta))
+    t_cache = medir(lambda: reporte.generar_desde_oro(ruta))
+
+    _, df_mensual, _ = artefactos_oro.leer_oro()
+    meses = sorted(df_mensual['mes'].unique())
+    t_meses = medir(lambda: [reporte.generar_desde_oro(ruta, desde=m, hasta=m) for m in meses])
+    os.remove(ruta)
+
+    print(f"{'Modo':<36} | {'ms':>9}")
+    print(f"{'-'*36}-|-{'-'*9}")
+    print(f"{'Pipeline completo':<36} | {t_pipeline * 1000:>9.1f}")
+    print(f"{'Solo reporte (Oro en frio)':<36} | {t_frio * 1000:>9.1f}")
+    print(f"{'Solo reporte (cache caliente)':<36} | {t_cache * 1000:>9.1f}")
+    print(f"{f'{len(meses)} reportes mensuales (por reporte)':<36} | {t_meses / max(1, len(meses)) * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
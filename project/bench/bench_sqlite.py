@@ -0,0 +1,102 @@
+"""
+Benchmark de carga de Oro en SQLite
+Compara la sobrescritura con to_sql(if_exists='replace') frente al upsert
+transaccional en modo WAL: tiempo de carga y latencia de un lector que
+consulta v_ejecucion_detalle y tendencia_mensual mientras se carga.
+
+Uso: python project/bench/bench_sqlite.py [filas_mensuales ...]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ingest'))
+import dinero
+import oro
+
+CARGAS = 5
+
+
+def generar(n_mensual):
+    """Tablas de Oro sinteticas: n_mensual filas (mes, area)"""
+    n_areas = max(1, n_mensual // 120)
+    areas = [f'Area{i:05d}' for i in range(n_areas)]
+    meses = pd.period_range('2000-01', periods=-(-n_mensual // n_areas), freq='M').astype(str)
+    mensual = pd.MultiIndex.from_product([meses, areas], names=['mes', 'area']).to_frame(index=False)[:n_mensual]
+    rng = np.random.default_rng(0)
+    # Importes en centimos, como en Oro
+    mensual['gasto_mensual'] = rng.integers(10_000, 1_000_000, len(mensual))
+    gasto = mensual.groupby('area')['gasto_mensual'].sum()
+    df_oro = pd.DataFrame({
+        'area': gasto.index,
+        'gasto_acumulado': gasto.to_numpy(),
+        'presupuesto_anual': rng.integers(10 ** 7, 10 ** 8, len(gasto)),
+    })
+    df_oro['kpi_ejecucion'] = dinero.cociente(df_oro['gasto_acumulado'], df_oro['presupuesto_anual'], 2, factor=100)
+    df_oro['kpi_ejecucion_decimal'] = (df_oro['kpi_ejecucion'] / 100).round(4)
+    df_oro['_batch_id'] = 'bench'
+    df_oro['_created_at'] = '2024-01-01T00:00:00'
+    return df_oro, mensual
+
+
+def cargar_replace(df_oro, df_mensual, ruta):
+    """Carga original: tablas reemplazadas sin PK ni indices"""
+    conn = sqlite3.connect(ruta)
+    oro.a_centimos_sql(df_oro).to_sql('kpi_ejecucion', conn, if_exists='replace', index=False)
+    oro.a_centimos_sql(df_mensual).to_sql('tendencia_mensual', conn, if_exists='replace', index=False)
+    conn.execute('DROP VIEW IF EXISTS v_ejecucion_detalle')
+    conn.execute(oro.VISTA_EJECUCION_DETALLE)
+    conn.commit()
+    conn.close()
+
+
+def lector(ruta, parar, latencias, errores):
+    conn = sqlite3.connect(ruta, timeout=30)
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        try:
+            conn.execute('SELECT * FROM v_ejecucion_detalle LIMIT 10').fetchall()
+            conn.execute("SELECT SUM(gasto_mensual_cent) FROM tendencia_mensual "
+                         "WHERE mes BETWEEN '2001-01' AND '2001-06'").fetchall()
+            latencias.append(time.perf_counter() - inicio)
+        except sqlite3.Error:
+            errores.append(1)
+        time.sleep(0.001)
+    conn.close()
+
+
+def medir(cargar, df_oro, df_mensual):
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'finanzas.db')
+        cargar(df_oro, df_mensual, ruta)
+        parar, latencias, errores = threading.Event(), [], []
+        hilo = threading.Thread(target=lector, args=(ruta, parar, latencias, errores))
+        hilo.start()
+        inicio = time.perf_counter()
+        for _ in range(CARGAS):
+            cargar(df_oro, df_mensual, ruta)
+        t_carga = (time.perf_counter() - inicio) / CARGAS
+        parar.set()
+        hilo.join()
+    lat = np.array(latencias or [np.nan]) * 1000
+    return t_carga, np.percentile(lat, 50), lat.max(), len(errores)
+
+
+def main(tamanos):
+    print(f"{'Filas':>10} | {'Modo':>8} | {'Carga (s)':>9} | {'p50 lect (ms)':>13} | {'max lect (ms)':>13} | {'Errores':>7}")
+    print("-" * 78)
+    for n in tamanos:
+        df_oro, df_mensual = generar(n)
+        for modo, cargar in [('replace', cargar_replace), ('upsert', oro.cargar_sqlite)]:
+            t, p50, pmax, err = medir(cargar, df_oro, df_mensual)
+            print(f"{n:>10,} | {modo:>8} | {t:>9.3f} | {p50:>13.2f} | {pmax:>13.2f} | {err:>7}")
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [10_000, 200_000])
@@ -0,0 +1,237 @@
+"""
+Almacenamiento particionado de Bronce y Plata
+Los gastos se escriben como dataset Parquet con particionado hive:
+
+    Plata:  project/data/clean/gastos/anio=2024/mes=3/area=Ti/part-{BATCH_ID}.parquet
+    Bronce: project/data/raw/gastos/anio=2024/mes=3/part-{BATCH_ID}.parquet
+
+y se leen con poda de particiones: una consulta "Ti, 2024-03..2024-06"
+solo abre los archivos de esas particiones. Bronce no se particiona por
+area porque conserva el valor original sin normalizar ('ti', 'IT'...).
+
+Uso: python project/ingest/almacen.py --capa clean --area Ti --desde 2024-03 --hasta 2024-06
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import dinero
+import escritura
+import limpieza
+from ingesta import COLUMNAS_TRAZABILIDAD
+
+CAPAS = {'raw': 'project/data/raw/gastos', 'clean': 'project/data/clean/gastos'}
+ESQUEMAS_PARTICION = {
+    'raw': pa.schema([('anio', pa.int16()), ('mes', pa.int8())]),
+    'clean': pa.schema([('anio', pa.int16()), ('mes', pa.int8()), ('area', pa.string())]),
+}
+# Valor de directorio para claves nulas (fecha no interpretable en Bronce)
+NULO_HIVE = '__HIVE_DEFAULT_PARTITION__'
+FILAS_POR_ROW_GROUP = 256_000
+
+
+def grupos_particion(df, columnas):
+    """Particion (anio, mes y opcionalmente area) de cada fila.
+
+    Devuelve [(valores, posiciones)] en orden de primera aparicion, con las
+    posiciones de cada particion en orden de lectura. Se calcula sobre
+    codigos enteros (mes desde 1970 y codigo de area) con una sola
+    ordenacion estable, sin DataFrames intermedios. En Bronce `fecha` llega
+    como texto y se interpreta con el mismo conversor de Plata, sin
+    modificar la columna original.
+    """
+    if len(df) == 0:
+        return []
+    fecha = df['fecha'] if pd.api.types.is_datetime64_any_dtype(df['fecha']) else limpieza.a_fecha(df['fecha'])
+    meses = fecha.to_numpy().astype('datetime64[M]')
+    clave, _ = pd.factorize(meses.view('int64'))
+    if 'area' in columnas:
+        codigos_area, _ = pd.factorize(df['area'], use_na_sentinel=True)
+        clave = clave.astype('int64') * (codigos_area.max(initial=-1) + 2) + (codigos_area + 1)
+        clave, _ = pd.factorize(clave)
+
+    orden = np.argsort(clave, kind='stable')
+    limites = np.cumsum(np.bincount(clave))[:-1]
+    grupos = []
+    for posiciones in np.split(orden, limites):
+        i = posiciones[0]
+        mes = meses[i]
+        valores = [None, None] if np.isnat(mes) else [mes.astype(int) // 12 + 1970, mes.astype(int) % 12 + 1]
+        if 'area' in columnas:
+            area = df['area'].iloc[i]
+            valores.append(None if pd.isna(area) else str(area))
+        grupos.append((tuple(valores), posiciones))
+    return grupos
+
+
+def _directorio(base, columnas, valores):
+    partes = [f'{col}={NULO_HIVE if pd.isna(v) else v}' for col, v in zip(columnas, valores)]
+    return os.path.join(base, *partes)
+
+
+class EscritorParticionado:
+    """Escribe DataFrames de gastos en el dataset hive de una capa.
+
+    Mantiene un ParquetWriter abierto por particion, de modo que sucesivas
+    llamadas a `escribir` (p. ej. bloques en streaming) se anaden como row
+    groups al mismo archivo `part-{nombre}.parquet` de cada particion.
+    Cada archivo se escribe en un temporal oculto y se publica al cerrar;
+    `rutas` acumula los archivos escritos.
+    """
+
+    def __init__(self, capa, nombre, esquema=None):
+        self.base = CAPAS[capa]
+        self.columnas = ESQUEMAS_PARTICION[capa].names
+        self.nombre = nombre
+        self.esquema = esquema
+        self.writers = {}
+        self.rutas = []
+
+    def escribir(self, df):
+        # Las columnas de particion viven en la ruta, no dentro del archivo
+        datos = df.drop(columns=[c for c in self.columnas if c in df.columns])
+        if self.esquema is not None:
+            self.esquema = pa.schema([f for f in self.esquema if f.name not in self.columnas])
+        # Tabla Arrow sobre los mismos buffers del DataFrame; solo se copia
+        # cada particion al extraerla (y al convertir al esquema de destino)
+        completa = dinero.a_tabla(datos)
+        esquema = self._esquema_destino(completa.schema)
+        for clave, pos in grupos_particion(df, self.columnas):
+            tabla = completa.take(pos)
+            if not tabla.schema.equals(esquema):
+                tabla = tabla.cast(esquema)
+            if clave not in self.writers:
+                directorio = _directorio(self.base, self.columnas, clave)
+                os.makedirs(directorio, exist_ok=True)
+                ruta = os.path.join(directorio, f'part-{self.nombre}.parquet')
+                temporal = escritura.ruta_temporal(ruta)
+                writer = pq.ParquetWriter(temporal, tabla.schema, **dinero.OPCIONES_PARQUET)
+                self.writers[clave] = (writer, temporal, ruta)
+                self.rutas.append(ruta)
+            self.writers[clave][0].write_table(tabla, row_group_size=FILAS_POR_ROW_GROUP)
+
+    def _esquema_destino(self, esquema_tabla):
+        """Esquema explicito o, sin el, el de la tabla con la trazabilidad
+        como texto (en memoria son Categorical de un solo valor)"""
+        campos = self.esquema if self.esquema is not None else [
+            pa.field(f.name, pa.string()) if f.name in COLUMNAS_TRAZABILIDAD else f for f in esquema_tabla]
+        # Se conservan los metadatos de pandas (tipos de extension como _event_id)
+        return pa.schema(campos, metadata=esquema_tabla.metadata)
+
+    def cerrar(self):
+        for writer, temporal, ruta in self.writers.values():
+            writer.close()
+            escritura.publicar(temporal, ruta)
+        self.writers = {}
+
+    def abortar(self):
+        """Cierra y borra los temporales sin publicar nada"""
+        for writer, temporal, _ in self.writers.values():
+            writer.close()
+            escritura.descartar(temporal)
+        self.writers = {}
+        self.rutas = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *exc):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.abortar()
+
+
+def escribir_gastos(df, capa, nombre, esquema=None):
+    """Escritura de una sola vez de un DataFrame de gastos en la capa
+    indicada. Devuelve las rutas de los archivos escritos."""
+    with EscritorParticionado(capa, nombre, esquema) as escritor:
+        escritor.escribir(df)
+    return escritor.rutas
+
+
+def _meses(desde, hasta):
+    periodos = pd.period_range(desde, hasta, freq='M')
+    return [(p.year, p.month) for p in periodos]
+
+
+def filtro_particiones(area=None, desde=None, hasta=None):
+    """Expresion de filtro sobre anio/mes/area.
+
+    En Plata todas son columnas de particion (poda de archivos); en Bronce
+    area es una columna de datos y el filtro se empuja a la lectura.
+    """
+    filtro = None
+    if area is not None:
+        areas = [area] if isinstance(area, str) else list(area)
+        filtro = ds.field('area').isin(areas)
+    if desde is not None or hasta is not None:
+        if desde is None or hasta is None:
+            raise ValueError('El rango de meses necesita desde y hasta (YYYY-MM)')
+        por_mes = None
+        for anio, mes in _meses(desde, hasta):
+            expr = (ds.field('anio') == anio) & (ds.field('mes') == mes)
+            por_mes = expr if por_mes is None else por_mes | expr
+        filtro = por_mes if filtro is None else filtro & por_mes
+    return filtro
+
+
+def dataset_gastos(capa='clean'):
+    particionado = ds.partitioning(ESQUEMAS_PARTICION[capa], flavor='hive')
+    return ds.dataset(CAPAS[capa], format='parquet', partitioning=particionado)
+
+
+def archivos(capa='clean', area=None, desde=None, hasta=None):
+    """Archivos que tocaria una consulta tras la poda de particiones"""
+    filtro = filtro_particiones(area, desde, hasta)
+    return sorted(f.path for f in dataset_gastos(capa).get_fragments(filter=filtro))
+
+
+def leer_gastos(capa='clean', area=None, desde=None, hasta=None, columnas=None, filtro=None):
+    """Lee gastos podando particiones por rango de meses (YYYY-MM) y area.
+
+    `filtro` admite una expresion pyarrow adicional que se empuja a la
+    lectura (estadisticas de row group), p. ej.
+    ds.field('importe') > dinero.literal(1000). En Plata `importe` es
+    DECIMAL(18,2) y se devuelve en centimos (int64).
+    """
+    expr = filtro_particiones(area, desde, hasta)
+    if filtro is not None:
+        expr = filtro if expr is None else expr & filtro
+    return _a_pandas(dataset_gastos(capa).to_table(columns=columnas, filter=expr), capa)
+
+
+def leer_archivos(rutas, capa='clean', columnas=None):
+    """Lee solo los archivos indicados del dataset de una capa (p. ej. los
+    que escribio un batch), con las columnas de particion desde la ruta"""
+    particionado = ds.partitioning(ESQUEMAS_PARTICION[capa], flavor='hive')
+    dataset = ds.dataset(rutas, format='parquet', partitioning=particionado, partition_base_dir=CAPAS[capa])
+    return _a_pandas(dataset.to_table(columns=columnas), capa)
+
+
+def _a_pandas(tabla, capa):
+    df = dinero.a_pandas(tabla)
+    if 'area' in df.columns and capa == 'clean':
+        df['area'] = df['area'].astype(pd.CategoricalDtype(limpieza.areas_validas))
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consulta de gastos con poda de particiones')
+    parser.add_argument('--capa', choices=list(CAPAS), default='clean')
+    parser.add_argument('--area', default=None)
+    parser.add_argument('--desde', default=None, help='Mes inicial YYYY-MM')
+    parser.add_argument('--hasta', default=None, help='Mes final YYYY-MM')
+    args = parser.parse_args()
+
+    rutas = archivos(args.capa, args.area, args.desde, args.hasta)
+    df = leer_gastos(args.capa, args.area, args.desde, args.hasta)
+    print(f"Archivos leidos: {len(rutas)}")
+    for ruta in rutas:
+        print(f"   {ruta}")
+    print(f"Registros: {len(df)}")
@@ -0,0 +1,105 @@
+"""
+Artefactos Parquet de la capa Oro: escritura con contexto y lectura en cache
+Cada Parquet de Oro puede llevar en los metadatos del esquema un
+diccionario JSON con el contexto del batch que lo genero (recuentos,
+fechas...), de modo que el reporte se puede regenerar solo desde Oro.
+
+La lectura usa memory-map y guarda el DataFrame ya convertido en una
+cache por ruta, invalidada cuando cambia el mtime o el tamano del
+archivo: releer el mismo artefacto no vuelve a tocar disco.
+
+    python project/ingest/artefactos_oro.py      # comprueba que pd.read_parquet lee Oro
+"""
+import glob
+import json
+import os
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import dinero
+import escritura
+
+DIR_ORO = 'project/data/gold'
+RUTA_KPIS = os.path.join(DIR_ORO, 'kpi_ejecucion.parquet')
+RUTA_MENSUAL = os.path.join(DIR_ORO, 'tendencia_mensual.parquet')
+# Clave de los metadatos propios en el esquema Parquet
+CLAVE_METADATOS = b'etl'
+
+# ruta -> ((mtime_ns, tamano), DataFrame, metadatos)
+_cache = {}
+
+
+def escribir_parquet(df, ruta, metadatos=None):
+    """Como df.to_parquet(ruta, index=False), con los importes como
+    DECIMAL(18,2) y anadiendo `metadatos` (dict). Escritura atomica."""
+    tabla = dinero.a_tabla(df)
+    if metadatos is not None:
+        esquema = dict(tabla.schema.metadata or {})
+        esquema[CLAVE_METADATOS] = json.dumps(metadatos).encode('utf-8')
+        tabla = tabla.replace_schema_metadata(esquema)
+    with escritura.atomica(ruta) as temporal:
+        pq.write_table(tabla, temporal, **dinero.OPCIONES_PARQUET)
+    return ruta
+
+
+def leer_parquet(ruta):
+    """Lee un Parquet con memory-map; devuelve (DataFrame, metadatos o None).
+
+    Los importes DECIMAL(18,2) vuelven como centimos enteros.
+
+    El DataFrame es compartido con la cache: se devuelve una copia
+    superficial, asi que anadir o sustituir columnas no la altera, pero no
+    se deben modificar valores en el sitio.
+    """
+    estado = os.stat(ruta)
+    version = (estado.st_mtime_ns, estado.st_size)
+    entrada = _cache.get(ruta)
+    if entrada is None or entrada[0] != version:
+        tabla = pq.read_table(ruta, memory_map=True)
+        crudo = (tabla.schema.metadata or {}).get(CLAVE_METADATOS)
+        entrada = (version, dinero.a_pandas(tabla), None if crudo is None else json.loads(crudo))
+        _cache[ruta] = entrada
+    return entrada[1].copy(deep=False), entrada[2]
+
+
+def limpiar_cache():
+    _cache.clear()
+
+
+def leer_oro(directorio=DIR_ORO):
+    """KPIs, tendencia mensual y metadatos del batch que los genero"""
+    df_oro, metadatos = leer_parquet(os.path.join(directorio, 'kpi_ejecucion.parquet'))
+    df_mensual, _ = leer_parquet(os.path.join(directorio, 'tendencia_mensual.parquet'))
+    return df_oro, df_mensual, metadatos
+
+
+def comprobar_lectura_pandas(directorio=DIR_ORO):
+    """Relee cada Parquet de Oro con pd.read_parquet, sin dinero.a_pandas,
+    y comprueba que los importes (Decimal) coinciden con los centimos.
+
+    Los artefactos de Oro se consultan tambien fuera del ETL (notebooks,
+    docs/kpis.md); lanza ValueError si alguno no se puede leer asi.
+    Devuelve las rutas comprobadas.
+    """
+    rutas = sorted(glob.glob(os.path.join(directorio, '*.parquet')))
+    for ruta in rutas:
+        try:
+            df = pd.read_parquet(ruta)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'{ruta}: pd.read_parquet falla ({e})') from e
+        centimos, _ = leer_parquet(ruta)
+        for col in df.columns:
+            if not dinero.es_importe(col) or col not in centimos:
+                continue
+            esperado = [None if pd.isna(c) else Decimal(int(c)).scaleb(-dinero.DECIMALES) for c in centimos[col]]
+            leido = [None if pd.isna(v) else Decimal(v) for v in df[col]]
+            if leido != esperado:
+                raise ValueError(f'{ruta}: la columna {col} no coincide con sus centimos')
+    return rutas
+
+
+if __name__ == '__main__':
+    for ruta in comprobar_lectura_pandas():
+        print(f"OK  pd.read_parquet  {ruta}")
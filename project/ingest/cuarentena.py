@@ -0,0 +1,209 @@
+"""
+Almacen de cuarentena: dataset particionado por causa con indice de metadatos
+Los registros rechazados se escriben segun se detectan (sin acumularlos
+en memoria) en un dataset Parquet por tabla y causa:
+
+    project/data/quarantine/gastos/causa=importe_negativo_o_cero/part-{BATCH_ID}.parquet
+
+Conservan los valores de Bronce tal cual llegaron; la causa es una
+columna de diccionario (un codigo por fila). Cada archivo escrito se anota
+en un indice SQLite (batch, tabla, causa, filas, ruta), de modo que los
+recuentos y la localizacion de una causa se resuelven en el indice, sin
+recorrer los archivos:
+
+    python project/ingest/cuarentena.py                       # recuentos por batch y causa
+    python project/ingest/cuarentena.py --causa "Area no reconocida" --batch-id 20241110_143045
+"""
+import argparse
+import os
+import re
+import sqlite3
+import unicodedata
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import escritura
+import limpieza
+from ingesta import COLUMNAS_TRAZABILIDAD
+
+DIR_CUARENTENA = 'project/data/quarantine'
+RUTA_INDICE = os.path.join(DIR_CUARENTENA, 'indice_cuarentena.db')
+# Todas las causas conocidas: la causa de cada fila es un codigo de este diccionario
+TIPO_CAUSA = pd.CategoricalDtype([r.causa for r in limpieza.REGLAS_GASTOS + limpieza.REGLAS_PRESUPUESTO])
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS archivos_cuarentena (
+    ruta TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    tabla TEXT NOT NULL,
+    causa TEXT NOT NULL,
+    filas INTEGER NOT NULL,
+    escrito_en TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cuarentena_causa ON archivos_cuarentena (causa, batch_id);
+CREATE INDEX IF NOT EXISTS idx_cuarentena_batch ON archivos_cuarentena (batch_id, tabla);
+"""
+
+
+def slug(causa):
+    """Nombre de directorio de una causa: 'Area no reconocida' -> 'area_no_reconocida'"""
+    texto = unicodedata.normalize('NFKD', causa).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', texto.lower()).strip('_')
+
+
+def abrir_indice(ruta=RUTA_INDICE):
+    """Abre (y crea si no existe) el indice; espera si otro proceso escribe"""
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    conn = sqlite3.connect(ruta, timeout=30)
+    conn.executescript(_ESQUEMA)
+    return conn
+
+
+class AlmacenCuarentena:
+    """Escritor de cuarentena de un batch.
+
+    Mantiene un ParquetWriter abierto por (tabla, causa): sucesivas llamadas
+    a `anadir` (p. ej. bloques en streaming) se anaden como row groups al
+    mismo archivo. Al cerrar se registran los archivos en el indice.
+    """
+
+    def __init__(self, batch_id, nombre=None, base=DIR_CUARENTENA, ruta_indice=RUTA_INDICE):
+        self.batch_id = batch_id
+        self.nombre = nombre or batch_id
+        self.base = base
+        self.ruta_indice = ruta_indice
+        self.writers = {}
+        self.filas = {}
+
+    def anadir(self, tabla, df, causa):
+        """Escribe los rechazados de `tabla` con su causa (texto o Categorical
+        por fila) y devuelve cuantos se escribieron de cada causa"""
+        if len(df) == 0:
+            return pd.Series(dtype='int64')
+        df = limpieza.marcar_cuarentena(df, causa)
+        df['_quarantine_reason'] = df['_quarantine_reason'].astype(TIPO_CAUSA)
+        codigos = df['_quarantine_reason'].cat.codes.to_numpy()
+        if (codigos < 0).any():
+            raise ValueError(f'Causa de cuarentena desconocida (opciones: {list(TIPO_CAUSA.categories)})')
+        # En streaming una misma columna puede mezclar texto (bronce) y numeros
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].astype('string')
+        completa = pa.Table.from_pandas(df, preserve_index=False)
+        # Trazabilidad como texto (en memoria son Categorical de un solo valor);
+        # columnas todo nulas como texto para que el esquema no cambie entre bloques
+        esquema = pa.schema([pa.field(f.name, pa.string())
+                             if f.name in COLUMNAS_TRAZABILIDAD or pa.types.is_null(f.type) else f
+                             for f in completa.schema], metadata=completa.schema.metadata)
+        completa = completa.cast(esquema)
+
+        for codigo in pd.unique(codigos):
+            causa_fila = TIPO_CAUSA.categories[codigo]
+            tabla_causa = completa.filter(pa.array(codigos == codigo))
+            clave = (tabla, causa_fila)
+            if clave not in self.writers:
+                directorio = os.path.join(self.base, tabla, f'causa={slug(causa_fila)}')
+                os.makedirs(directorio, exist_ok=True)
+                ruta = os.path.join(directorio, f'part-{self.nombre}.parquet')
+                temporal = escritura.ruta_temporal(ruta)
+                self.writers[clave] = (pq.ParquetWriter(temporal, esquema), temporal, ruta)
+            writer = self.writers[clave][0]
+            writer.write_table(tabla_causa.cast(writer.schema))
+            self.filas[clave] = self.filas.get(clave, 0) + tabla_causa.num_rows
+        return df['_quarantine_reason'].value_counts(sort=False)
+
+    def conteos(self):
+        """Filas escritas por causa (Serie indexada por causa, en orden de deteccion)"""
+        conteos = {}
+        for (_, causa), n in self.filas.items():
+            conteos[causa] = conteos.get(causa, 0) + n
+        return pd.Series(conteos, dtype='int64', name='filas')
+
+    def cerrar(self):
+        """Publica los archivos (escritos en temporales) y los registra en el
+        indice en una transaccion"""
+        escrito_en = datetime.now().isoformat()
+        filas_indice = []
+        for (tabla, causa), (writer, temporal, ruta) in self.writers.items():
+            writer.close()
+            escritura.publicar(temporal, ruta)
+            filas_indice.append((ruta, self.batch_id, tabla, causa, self.filas[(tabla, causa)], escrito_en))
+        self.writers = {}
+        if filas_indice:
+            conn = abrir_indice(self.ruta_indice)
+            with conn:
+                # Reprocesar un batch sobrescribe sus archivos y sus entradas
+                conn.executemany('INSERT OR REPLACE INTO archivos_cuarentena VALUES (?, ?, ?, ?, ?, ?)', filas_indice)
+            conn.close()
+
+    def abortar(self):
+        """Cierra y borra los temporales sin publicar ni registrar nada"""
+        for writer, temporal, _ in self.writers.values():
+            writer.close()
+            escritura.descartar(temporal)
+        self.writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *exc):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.abortar()
+
+
+# ========== CONSULTAS (sobre el indice) ==========
+def _filtro(causa=None, batch_id=None, tabla=None):
+    condiciones, parametros = [], []
+    for columna, valor in [('causa', causa), ('batch_id', batch_id), ('tabla', tabla)]:
+        if valor is not None:
+            condiciones.append(f'{columna} = ?')
+            parametros.append(valor)
+    return (' WHERE ' + ' AND '.join(condiciones) if condiciones else ''), parametros
+
+
+def conteos(causa=None, batch_id=None, tabla=None, ruta_indice=RUTA_INDICE):
+    """Registros en cuarentena por batch, tabla y causa (solo lee el indice)"""
+    donde, parametros = _filtro(causa, batch_id, tabla)
+    conn = abrir_indice(ruta_indice)
+    df = pd.read_sql(f'SELECT batch_id, tabla, causa, SUM(filas) AS filas FROM archivos_cuarentena{donde} '
+                     'GROUP BY batch_id, tabla, causa ORDER BY batch_id, tabla, causa', conn, params=parametros)
+    conn.close()
+    return df
+
+
+def archivos(causa=None, batch_id=None, tabla=None, ruta_indice=RUTA_INDICE):
+    """Archivos que contienen la causa/batch/tabla pedidos, segun el indice"""
+    donde, parametros = _filtro(causa, batch_id, tabla)
+    conn = abrir_indice(ruta_indice)
+    rutas = [r for (r,) in conn.execute(f'SELECT ruta FROM archivos_cuarentena{donde} ORDER BY ruta', parametros)]
+    conn.close()
+    return rutas
+
+
+def leer(tabla='gastos', causa=None, batch_id=None, ruta_indice=RUTA_INDICE):
+    """Registros en cuarentena de una tabla; solo abre los archivos del indice"""
+    rutas = archivos(causa, batch_id, tabla, ruta_indice)
+    if not rutas:
+        return pd.DataFrame()
+    df = pd.concat([pq.read_table(r, partitioning=None).to_pandas() for r in rutas], ignore_index=True)
+    df['_quarantine_reason'] = df['_quarantine_reason'].astype(TIPO_CAUSA)
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consulta de la cuarentena por causa y batch')
+    parser.add_argument('--causa', default=None, help=f'Una de: {", ".join(TIPO_CAUSA.categories)}')
+    parser.add_argument('--batch-id', default=None)
+    parser.add_argument('--tabla', choices=['gastos', 'presupuesto'], default=None)
+    args = parser.parse_args()
+
+    df = conteos(args.causa, args.batch_id, args.tabla)
+    if df.empty:
+        print("Sin registros en cuarentena para el filtro indicado")
+    else:
+        print(df.to_string(index=False))
+        print(f"\nTotal: {df['filas'].sum()} registros en {len(archivos(args.causa, args.batch_id, args.tabla))} archivos")
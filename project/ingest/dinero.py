@@ -0,0 +1,183 @@
+"""
+Importes en coma fija: centimos int64 en memoria, DECIMAL(18,2) en disco
+Los importes se convierten a centimos enteros al limpiar y desde ahi las
+sumas, acumulados, variaciones y KPIs son aritmetica entera vectorizada:
+el resultado es exacto y no depende del orden en que se suma. En los
+bordes:
+
+- Parquet (Plata y Oro): decimal128(18, 2), construido directamente desde
+  los centimos (el valor sin escala de un decimal(18, 2) son los centimos)
+  y guardado como INT64.
+- SQLite: INTEGER en centimos.
+- Reporte: euros solo para mostrar (centimos / 100 se imprime exacto con
+  2 decimales).
+
+Son importes las columnas `importe`, `presupuesto_*`, `restante` y
+`gasto_*` (salvo los porcentajes `*_pct`).
+"""
+import json
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+DECIMALES = 2
+ESCALA = 10 ** DECIMALES
+TIPO_DECIMAL = pa.decimal128(18, DECIMALES)
+# Mayor importe representable (exclusivo) en decimal(18, 2), en euros
+LIMITE_EUROS = 10 ** (TIPO_DECIMAL.precision - DECIMALES)
+# Con precision <= 18 el decimal se guarda como INT64 en Parquet (mas
+# rapido de escribir y leer que FIXED_LEN_BYTE_ARRAY)
+OPCIONES_PARQUET = {'store_decimal_as_integer': True}
+
+
+def es_importe(columna):
+    return (columna in ('importe', 'restante') or columna.startswith(('presupuesto_', 'gasto'))) \
+        and not columna.endswith('_pct')
+
+
+def a_centimos(euros):
+    """Euros (float, ya convertidos desde texto) -> centimos int64.
+
+    Redondea igual que el antiguo .round(2): los nulos se conservan como
+    Int64 nullable. Un valor infinito o fuera de decimal(18, 2) lanza
+    ValueError (la limpieza los envia antes a cuarentena).
+    """
+    valores = euros.to_numpy(dtype='float64', na_value=np.nan)
+    if (np.abs(valores) >= LIMITE_EUROS).any():
+        raise ValueError(f'Importe infinito o fuera de rango (|importe| >= {LIMITE_EUROS:.0e})')
+    centimos = valores * ESCALA
+    np.rint(centimos, out=centimos)
+    if np.isnan(centimos).any():
+        return pd.Series(pd.array(centimos, dtype='Int64'), index=euros.index, name=euros.name)
+    return pd.Series(centimos.astype('int64'), index=euros.index, name=euros.name)
+
+
+def a_euros(centimos):
+    """Centimos -> euros float64 (NaN para nulos), solo para mostrar"""
+    return pd.Series(centimos.to_numpy(dtype='float64', na_value=np.nan) / ESCALA,
+                     index=centimos.index, name=centimos.name)
+
+
+def cociente(num, den, decimales=2, factor=1):
+    """round(num * factor / den, decimales) exacto con enteros.
+
+    Divide en parte entera y resto para no desbordar int64 con los
+    importes grandes; el redondeo es al mas cercano (medios hacia arriba).
+    NaN si falta algun operando o el denominador es 0.
+    """
+    num, den = pd.array(num, dtype='Int64'), pd.array(den, dtype='Int64')
+    n, d = num.to_numpy(dtype='int64', na_value=0), den.to_numpy(dtype='int64', na_value=0)
+    validos = ~num.isna() & ~den.isna() & (d != 0)
+    signo = np.where(d < 0, -1, 1)
+    n = np.where(validos, n * signo, 0)
+    d = np.where(validos, d * signo, 1)
+    k = factor * 10 ** decimales
+    entero, resto = np.divmod(n, d)
+    escalado = entero * k + (resto * k + d // 2) // d
+    return np.where(validos, escalado / 10 ** decimales, np.nan)
+
+
+def literal(euros):
+    """Euros como escalar decimal(18, 2), para filtros de pyarrow sobre
+    importes: ds.field('importe') > dinero.literal(1000)"""
+    return pa.scalar(Decimal(str(euros)), TIPO_DECIMAL)
+
+
+def a_decimal(centimos):
+    """Serie de centimos (int64 o Int64) -> pa.Array decimal128(18, 2) sin
+    pasar por objetos Decimal: el valor de 128 bits es el int64 con signo
+    extendido a la palabra alta"""
+    mascara, n_nulos = None, 0
+    if isinstance(centimos.dtype, np.dtype) and centimos.dtype.kind == 'i':
+        bajos = np.asarray(centimos, dtype='int64')
+    else:
+        valores = pd.array(centimos, dtype='Int64')
+        bajos = valores.to_numpy(dtype='int64', na_value=0)
+        n_nulos = int(valores.isna().sum())
+        if n_nulos:
+            mascara = pa.array(~valores.isna()).buffers()[1]
+    palabras = np.empty((len(bajos), 2), dtype='int64')
+    palabras[:, 0] = bajos
+    np.right_shift(bajos, 63, out=palabras[:, 1])
+    return pa.Array.from_buffers(TIPO_DECIMAL, len(bajos), [mascara, pa.py_buffer(palabras)], null_count=n_nulos)
+
+
+def desde_decimal(arr):
+    """pa.Array/ChunkedArray decimal -> centimos: ndarray int64 o, con
+    nulos, IntegerArray (Int64)"""
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks() if arr.num_chunks else pa.array([], TIPO_DECIMAL)
+    if arr.type != TIPO_DECIMAL:
+        arr = arr.cast(TIPO_DECIMAL)
+    palabras = np.frombuffer(arr.buffers()[1], dtype='<i8')
+    bajos = palabras[2 * arr.offset:2 * (arr.offset + len(arr)):2].copy()
+    if arr.null_count:
+        return pd.arrays.IntegerArray(bajos, arr.is_null().to_numpy(zero_copy_only=False))
+    return bajos
+
+
+def a_tabla(df):
+    """pa.Table.from_pandas(df) con los importes enteros como decimal(18, 2).
+
+    Los metadatos b'pandas' de las columnas convertidas se reescriben como
+    los de una columna de Decimal (object): pd.read_parquet sigue leyendo
+    el archivo sin pasar por dinero.a_pandas.
+    """
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    convertidas = set()
+    for i, campo in enumerate(tabla.schema):
+        if es_importe(campo.name) and pa.types.is_integer(campo.type):
+            tabla = tabla.set_column(i, pa.field(campo.name, TIPO_DECIMAL), a_decimal(df[campo.name]))
+            convertidas.add(campo.name)
+    if convertidas and tabla.schema.metadata and b'pandas' in tabla.schema.metadata:
+        metadatos = dict(tabla.schema.metadata)
+        pandas_meta = json.loads(metadatos[b'pandas'])
+        for columna in pandas_meta['columns']:
+            if columna['field_name'] in convertidas:
+                columna.update(pandas_type='decimal', numpy_type='object',
+                               metadata={'precision': TIPO_DECIMAL.precision, 'scale': TIPO_DECIMAL.scale})
+        metadatos[b'pandas'] = json.dumps(pandas_meta).encode('utf-8')
+        tabla = tabla.replace_schema_metadata(metadatos)
+    return tabla
+
+
+def a_pandas(tabla):
+    """tabla.to_pandas() con las columnas decimales como centimos (sin
+    crear un objeto Decimal por fila)"""
+    decimales = [c.name for c in tabla.schema if pa.types.is_decimal(c.type)]
+    if not decimales:
+        return tabla.to_pandas()
+    df = tabla.drop_columns(decimales).to_pandas()
+    for col in decimales:
+        df.insert(tabla.schema.get_field_index(col), col, desde_decimal(tabla[col]))
+    return df
+
+
+def migrar_sqlite(conn, esquema, columnas):
+    """Crea `esquema` convirtiendo a centimos INTEGER las tablas que aun
+    guardan importes REAL (bases de versiones anteriores).
+
+    columnas: {tabla: [columnas de importe]}. Cada tabla antigua se
+    renombra, se crea la nueva con el esquema y se copian sus filas, todo
+    en una unica transaccion: si algo falla la base queda como estaba.
+    """
+    # BEGIN explicito: sqlite3 no abre transaccion antes de ALTER/CREATE, y
+    # executescript confirmaria lo pendiente; el esquema va sentencia a sentencia
+    conn.execute('BEGIN')
+    with conn:
+        antiguas = {}
+        for tabla, importes in columnas.items():
+            tipos = {c[1]: c[2] for c in conn.execute(f'PRAGMA table_info({tabla})')}
+            if any(tipos.get(c) == 'REAL' for c in importes):
+                conn.execute(f'ALTER TABLE {tabla} RENAME TO _{tabla}_real')
+                antiguas[tabla] = list(tipos)
+        for sentencia in esquema.split(';'):
+            if sentencia.strip():
+                conn.execute(sentencia)
+        for tabla, nombres in antiguas.items():
+            valores = ', '.join(f'CAST(ROUND({c} * {ESCALA}) AS INTEGER)' if c in columnas[tabla] else c
+                                for c in nombres)
+            conn.execute(f'INSERT INTO {tabla} ({", ".join(nombres)}) SELECT {valores} FROM _{tabla}_real')
+            conn.execute(f'DROP TABLE _{tabla}_real')
@@ -0,0 +1,111 @@
+"""
+Escritura de salidas: atomica (escribir y renombrar) y en segundo plano
+Todas las salidas del pipeline se escriben primero en un temporal oculto
+del mismo directorio (`.{nombre}.{pid}.tmp`) y se renombran al terminar
+con os.replace: un lector ve el archivo anterior completo o el nuevo,
+nunca uno a medias. Los lectores de datasets de pyarrow ignoran los
+archivos que empiezan por '.', asi que un temporal nunca entra en una
+consulta.
+
+EscritorFondo entrega las escrituras a un pool de hilos acotado para que
+la E/S se solape con el calculo de la fase siguiente:
+
+    with EscritorFondo(hilos=2) as escritor:
+        escritor.enviar('plata', almacen.escribir_gastos, df.copy(deep=False), 'clean', batch_id)
+        ...                     # la fase siguiente calcula mientras se escribe
+    # al salir: barrera que espera todas las escrituras y propaga sus errores
+
+Con hilos=0 cada escritura se ejecuta en el momento, en el hilo que la envia.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+
+def ruta_temporal(ruta):
+    directorio, nombre = os.path.split(ruta)
+    return os.path.join(directorio, f'.{nombre}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+
+def publicar(temporal, ruta):
+    """Sustituye `ruta` por el temporal ya completo (atomico en el mismo sistema de archivos)"""
+    os.replace(temporal, ruta)
+
+
+def descartar(temporal):
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+
+@contextmanager
+def atomica(ruta):
+    """Ruta temporal donde escribir; al salir sin error sustituye a `ruta`,
+    y con error se borra sin tocar `ruta`"""
+    temporal = ruta_temporal(ruta)
+    try:
+        yield temporal
+    except BaseException:
+        descartar(temporal)
+        raise
+    publicar(temporal, ruta)
+
+
+class EscritorFondo:
+    """Pool de hilos acotado para escrituras.
+
+    `enviar` bloquea mientras haya `max_pendientes` escrituras sin terminar
+    (contrapresion: los DataFrames pendientes no se acumulan sin limite).
+    `esperar` es la barrera final: espera todas y, si alguna fallo, lanza
+    RuntimeError con las escrituras fallidas encadenado al primer error.
+    """
+
+    def __init__(self, hilos=2, max_pendientes=None):
+        self.hilos = hilos
+        self.pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='escritura') if hilos else None
+        self.huecos = threading.BoundedSemaphore(max_pendientes or 2 * max(hilos, 1))
+        self.futuros = []
+
+    def enviar(self, etiqueta, fn, *args, **kwargs):
+        """Programa fn(*args, **kwargs). Los DataFrames que la fase siguiente
+        vaya a modificar deben pasarse como copia superficial (con
+        Copy-on-Write, df.copy(deep=False) es una instantanea sin copiar datos)."""
+        if self.pool is None:
+            fn(*args, **kwargs)
+            return
+        self.huecos.acquire()
+        try:
+            futuro = self.pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.huecos.release()
+            raise
+        futuro.add_done_callback(lambda _: self.huecos.release())
+        self.futuros.append((etiqueta, futuro))
+
+    def esperar(self):
+        """Barrera: espera todas las escrituras enviadas y propaga los errores"""
+        futuros, self.futuros = self.futuros, []
+        wait([f for _, f in futuros])
+        fallidas = [(etiqueta, f.exception()) for etiqueta, f in futuros if f.exception() is not None]
+        if fallidas:
+            detalle = ', '.join(f'{etiqueta} ({type(e).__name__}: {e})' for etiqueta, e in fallidas)
+            raise RuntimeError(f'Fallaron {len(fallidas)} escrituras: {detalle}') from fallidas[0][1]
+
+    def cerrar(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *exc):
+        try:
+            if tipo is None:
+                self.esperar()
+            else:
+                # La fase ya fallo: se espera a las escrituras en curso sin
+                # tapar el error original con los suyos
+                wait([f for _, f in self.futuros])
+                self.futuros = []
+        finally:
+            self.cerrar()
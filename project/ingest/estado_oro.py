@@ -0,0 +1,92 @@
+"""
+Estado incremental de la capa Oro
+Mantiene sumas acumuladas por area y por (mes, area) junto con la marca
+de agua de batches ya procesados, de modo que cada batch solo agrega sus
+propias filas y fusiona los deltas en los totales. Los importes son
+centimos INTEGER: sumar deltas batch tras batch no acumula error.
+"""
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+import dinero
+
+RUTA_ESTADO = 'project/data/gold/estado_oro.db'
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS batches_procesados (
+    batch_id TEXT PRIMARY KEY,
+    filas INTEGER NOT NULL,
+    procesado_en TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gasto_area (
+    area TEXT PRIMARY KEY,
+    gasto_acumulado INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gasto_mensual (
+    mes TEXT NOT NULL,
+    area TEXT NOT NULL,
+    gasto_mensual INTEGER NOT NULL,
+    PRIMARY KEY (mes, area)
+);
+"""
+
+
+def abrir_estado(ruta=RUTA_ESTADO):
+    """Abre (y crea si no existe) el almacen de estado"""
+    conn = sqlite3.connect(ruta)
+    dinero.migrar_sqlite(conn, _ESQUEMA, {'gasto_area': ['gasto_acumulado'], 'gasto_mensual': ['gasto_mensual']})
+    return conn
+
+
+def batch_procesado(conn, batch_id):
+    """True si el batch ya esta por debajo de la marca de agua"""
+    fila = conn.execute('SELECT 1 FROM batches_procesados WHERE batch_id = ?', (batch_id,)).fetchone()
+    return fila is not None
+
+
+def aplicar_batch(conn, batch_id, df_gastos, df_reemplazados=None, en_transaccion=None):
+    """Agrega solo las filas del batch y fusiona los deltas en los totales.
+
+    df_reemplazados (fecha, area, importe) son registros de batches
+    anteriores que este batch sustituye; sus importes se restan.
+    Deltas y marca de agua se escriben en la misma transaccion: un batch
+    ya procesado es un no-op y un fallo a mitad no deja deltas sueltos.
+    en_transaccion(conn), si se da, escribe en esa misma transaccion (los
+    cambios del indice de deduplicacion, que vive en esta base).
+    Devuelve False si el batch ya estaba aplicado.
+    """
+    if batch_procesado(conn, batch_id):
+        return False
+
+    movimientos = df_gastos[['fecha', 'area', 'importe']]
+    if df_reemplazados is not None and len(df_reemplazados) > 0:
+        anulaciones = df_reemplazados[['fecha', 'area', 'importe']].assign(importe=lambda d: -d['importe'])
+        movimientos = pd.concat([movimientos, anulaciones], ignore_index=True)
+
+    mes = movimientos['fecha'].dt.to_period('M').astype(str)
+    delta_area = movimientos.groupby('area', observed=True)['importe'].sum()
+    delta_mensual = movimientos.groupby([mes, movimientos['area']], observed=True)['importe'].sum()
+
+    with conn:
+        conn.executemany(
+            """INSERT INTO gasto_area (area, gasto_acumulado) VALUES (?, ?)
+               ON CONFLICT(area) DO UPDATE SET gasto_acumulado = gasto_acumulado + excluded.gasto_acumulado""",
+            delta_area.items())
+        conn.executemany(
+            """INSERT INTO gasto_mensual (mes, area, gasto_mensual) VALUES (?, ?, ?)
+               ON CONFLICT(mes, area) DO UPDATE SET gasto_mensual = gasto_mensual + excluded.gasto_mensual""",
+            ((m, a, v) for (m, a), v in delta_mensual.items()))
+        conn.execute('INSERT INTO batches_procesados VALUES (?, ?, ?)',
+                     (batch_id, len(df_gastos), datetime.now().isoformat()))
+        if en_transaccion is not None:
+            en_transaccion(conn)
+    return True
+
+
+def leer_totales(conn):
+    """Devuelve (df_gasto_area, df_mensual) con los totales acumulados"""
+    df_gasto_area = pd.read_sql('SELECT area, gasto_acumulado FROM gasto_area ORDER BY area', conn)
+    df_mensual = pd.read_sql('SELECT mes, area, gasto_mensual FROM gasto_mensual ORDER BY mes, area', conn)
+    return df_gasto_area, df_mensual
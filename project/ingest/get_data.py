@@ -1,107 +1,205 @@
 """
 Generador de datos de ejemplo para el proyecto de Finanzas
 Crea gastos.csv y presupuesto.csv con datos realistas
+
+Vectorizado y con semilla: los gastos se generan por bloques de filas
+(memoria acotada por el tamaño de bloque, no por el total) y cada bloque
+se escribe directamente en CSV. Las tasas de datos sucios (nulos,
+negativos, variantes de escritura, duplicados y fechas invalidas) son
+configurables, de modo que el resultado sirve de fixture para medir el
+ETL a cualquier volumen.
+
+Cada fila tiene su propia clave natural (fecha, area, partida): la fila
+i-esima del archivo ocupa una casilla distinta de un espacio de claves
+con al menos tantas casillas como filas, ampliado con subpartidas
+("Software 0042") cuando las partidas no bastan. Los unicos duplicados
+son los de --tasa-duplicados, a cualquier volumen:
+
+    python project/ingest/get_data.py                                   # 500 filas de ejemplo
+    python project/ingest/get_data.py --filas 50000000 --anios 2022 2023 2024 --salida /tmp/carga
+    python project/ingest/get_data.py --filas 10000000 --tasa-duplicados 0.05
 """
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+import argparse
+import math
 import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Áreas de la empresa (nombres canonicos; las variantes se generan al vuelo)
+AREAS = ['Ventas', 'Marketing', 'TI', 'RRHH', 'Operaciones']
+
+# Partidas presupuestarias
+PARTIDAS = [
+    'Salarios', 'Material Oficina', 'Software', 'Hardware',
+    'Publicidad', 'Formación', 'Viajes', 'Servicios Externos',
+]
+
+# Fechas que la limpieza no puede convertir (-> cuarentena)
+FECHAS_INVALIDAS = ['2024-13-45', '31/02/2024', 'sin fecha', '2024-00-10']
+
+# Fraccion de filas afectada por cada tipo de error
+Tasas = namedtuple('Tasas', ['nulos', 'negativos', 'variantes', 'duplicados', 'fechas_invalidas'],
+                   defaults=[0.005, 0.02, 0.05, 0.005, 0.002])
 
-def generar_datos_ejemplo():
+RANGO_IMPORTE = (100, 15000)
+IMPORTE_MEDIO = sum(RANGO_IMPORTE) / 2
+FILAS_POR_BLOQUE = 1_000_000
+ESQUEMA_GASTOS = pa.schema([('fecha', pa.string()), ('area', pa.string()),
+                            ('partida', pa.string()), ('importe', pa.float64())])
+
+
+def _con_variantes(nombres):
+    """Tabla [canonico, minusculas, MAYUSCULAS] por nombre: codigo * 3 + variante"""
+    return np.array([v for n in nombres for v in (n, n.lower(), n.upper())], dtype=object)
+
+
+def _subpartidas(partidas, n_sub):
+    """Nombres de (partida, subpartida) en orden partida * n_sub + subpartida"""
+    if n_sub == 1:
+        return list(partidas)
+    ancho = len(str(n_sub - 1))
+    return [f'{p} {s:0{ancho}d}' for p in partidas for s in range(n_sub)]
+
+
+def _claves(inicio, n, total, dias, n_areas, n_partidas):
+    """Casillas (dia, area, partida, subpartida) distintas para las filas
+    [inicio, inicio + n) de un archivo de `total` filas.
+
+    La fila i ocupa la casilla (a * i) mod K, con K >= total y a coprimo
+    con K: una biyeccion, asi que dos filas nunca comparten clave, y con
+    a ~ 0.618 K las filas consecutivas quedan repartidas por todo el
+    espacio.
     """
-    Genera archivos CSV de ejemplo para gastos y presupuesto
+    n_sub = max(1, math.ceil(total / (dias * n_areas * n_partidas)))
+    k = dias * n_areas * n_partidas * n_sub
+    a = int(k * 0.6180339887) | 1
+    while math.gcd(a, k) != 1:
+        a += 2
+    casilla = (np.arange(inicio, inicio + n, dtype='int64') * a) % k
+    casilla, dia = np.divmod(casilla, dias)
+    casilla, area = np.divmod(casilla, n_areas)
+    sub, partida = np.divmod(casilla, n_partidas)
+    return dia, area, partida * n_sub + sub, n_sub
+
+
+def generar_bloque(n, rng, anios=(2024,), areas=AREAS, partidas=PARTIDAS, tasas=Tasas(), inicio=0, total=None):
+    """Un bloque de `n` gastos como tabla Arrow (sin bucles por fila).
+
+    inicio / total: posicion del bloque en el archivo y filas del archivo
+    (por defecto, un archivo de un solo bloque); fijan la clave natural de
+    cada fila. Las columnas de texto se construyen indexando tablas
+    pequeñas de valores por codigos enteros.
     """
-    # Crear carpeta data si no existe
-    os.makedirs('project/data', exist_ok=True)
-    
-    # ========== GASTOS.CSV ==========
-    print("📊 Generando gastos.csv...")
-    
-    # Áreas de la empresa
-    areas = ['Ventas', 'Marketing', 'TI', 'RRHH', 'Operaciones', 'ventas', 'ti']  # Con variaciones
-    
-    # Partidas presupuestarias
-    partidas = [
-        'Salarios', 'Material Oficina', 'Software', 'Hardware',
-        'Publicidad', 'Formación', 'Viajes', 'Servicios Externos',
-        'salarios', 'PUBLICIDAD'  # Variaciones para validar limpieza
-    ]
-    
-    # Generar 500 registros de gastos
-    np.random.seed(42)
-    num_registros = 500
-    
-    fecha_inicio = datetime(2024, 1, 1)
-    
-    gastos_data = []
-    for i in range(num_registros):
-        # Fecha aleatoria en 2024
-        dias_aleatorios = np.random.randint(0, 300)
-        fecha = fecha_inicio + timedelta(days=dias_aleatorios)
-        
-        area = np.random.choice(areas)
-        partida = np.random.choice(partidas)
-        
-        # Importes realistas (algunos negativos para validar)
-        if np.random.random() < 0.02:  # 2% de errores
-            importe = np.random.uniform(-1000, -100)  # Negativos (inválidos)
-        else:
-            importe = round(np.random.uniform(100, 15000), 2)
-        
-        gastos_data.append({
-            'fecha': fecha.strftime('%Y-%m-%d'),
-            'area': area,
-            'partida': partida,
-            'importe': importe
-        })
-    
-    # Añadir algunos registros duplicados para probar deduplicación
-    gastos_data.append(gastos_data[0].copy())
-    gastos_data.append(gastos_data[0].copy())
-    
-    # Añadir registros con datos faltantes (para cuarentena)
-    gastos_data.append({
-        'fecha': '2024-05-15',
-        'area': None,
-        'partida': 'Salarios',
-        'importe': 5000
-    })
-    gastos_data.append({
-        'fecha': '2024-06-20',
-        'area': 'Ventas',
-        'partida': None,
-        'importe': 3000
+    primer_dia = np.datetime64(f'{min(anios)}-01-01')
+    dias = (np.datetime64(f'{max(anios) + 1}-01-01') - primer_dia).astype(int)
+    dia, codigo_area, codigo_partida, n_sub = _claves(inicio, n, n if total is None else total,
+                                                      dias, len(areas), len(partidas))
+    fechas = (primer_dia + dia).astype(str).astype(object)
+
+    # Variantes de escritura (minusculas/MAYUSCULAS) que la limpieza normaliza
+    variante_area = np.where(rng.random(n) < tasas.variantes, rng.integers(1, 3, n), 0)
+    variante_partida = np.where(rng.random(n) < tasas.variantes, rng.integers(1, 3, n), 0)
+    area = _con_variantes(areas)[codigo_area * 3 + variante_area]
+    partida = _con_variantes(_subpartidas(partidas, n_sub))[codigo_partida * 3 + variante_partida]
+
+    # Importes realistas (algunos negativos para validar)
+    importe = rng.uniform(*RANGO_IMPORTE, n).round(2)
+    negativos = rng.random(n) < tasas.negativos
+    importe[negativos] = rng.uniform(-1000, -100, negativos.sum()).round(2)
+
+    malas = rng.random(n) < tasas.fechas_invalidas
+    fechas[malas] = rng.choice(FECHAS_INVALIDAS, malas.sum())
+
+    # Campos obligatorios nulos: un campo al azar por fila afectada
+    columnas = {'fecha': fechas, 'area': area, 'partida': partida, 'importe': importe}
+    nulos = np.flatnonzero(rng.random(n) < tasas.nulos)
+    campo_nulo = rng.integers(0, len(columnas), len(nulos))
+    mascaras = {col: np.zeros(n, dtype=bool) for col in columnas}
+    for i, col in enumerate(columnas):
+        mascaras[col][nulos[campo_nulo == i]] = True
+
+    # Duplicados exactos: filas que repiten otra fila del mismo bloque
+    indices = np.arange(n)
+    duplicados = rng.random(n) < tasas.duplicados
+    indices[duplicados] = rng.integers(0, n, duplicados.sum())
+
+    return pa.table({col: pa.array(valores[indices], type=ESQUEMA_GASTOS.field(col).type,
+                                   mask=mascaras[col][indices])
+                     for col, valores in columnas.items()}, schema=ESQUEMA_GASTOS)
+
+
+def generar_presupuesto(rng, filas, anios=(2024,), areas=AREAS):
+    """Presupuesto anual por (año, area), escalado al gasto esperado para
+    que la ejecucion quede en torno al 100% con cualquier volumen"""
+    anio = np.repeat(np.asarray(anios), len(areas))
+    gasto_esperado = filas * IMPORTE_MEDIO / len(anio)
+    return pd.DataFrame({
+        'area': np.tile(np.asarray(areas, dtype=object), len(anios)),
+        'presupuesto_anual': (gasto_esperado * rng.uniform(0.8, 1.3, len(anio))).round(2),
+        'año': anio,
     })
-    
-    df_gastos = pd.DataFrame(gastos_data)
-    df_gastos.to_csv('project/data/gastos.csv', index=False)
-    print(f"✅ gastos.csv creado: {len(df_gastos)} registros")
-    
+
+
+def generar_gastos(ruta, filas, semilla=42, filas_por_bloque=FILAS_POR_BLOQUE, **opciones):
+    """Escribe `filas` gastos en el CSV `ruta` bloque a bloque.
+
+    Cada bloque usa su propio generador derivado de (semilla, n de bloque):
+    el resultado es reproducible y no depende de lo generado antes.
+    """
+    with pacsv.CSVWriter(ruta, ESQUEMA_GASTOS) as escritor:
+        for n_bloque, inicio in enumerate(range(0, filas, filas_por_bloque)):
+            rng = np.random.default_rng([semilla, n_bloque])
+            escritor.write_table(generar_bloque(min(filas_por_bloque, filas - inicio), rng,
+                                                inicio=inicio, total=filas, **opciones))
+    return ruta
+
+
+def generar_datos_ejemplo(filas=500, semilla=42, salida='project/data', anios=(2024,),
+                          areas=AREAS, tasas=Tasas(), filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Genera archivos de ejemplo para gastos y presupuesto
+    """
+    # Crear carpeta data si no existe
+    os.makedirs(salida, exist_ok=True)
+
+    # ========== GASTOS ==========
+    ruta_gastos = os.path.join(salida, 'gastos.csv')
+    print(f"📊 Generando {ruta_gastos} ({filas:,} registros, bloques de {filas_por_bloque:,})...")
+    generar_gastos(ruta_gastos, filas, semilla, filas_por_bloque, anios=anios, areas=areas, tasas=tasas)
+    print(f"✅ {ruta_gastos} creado: {filas:,} registros ({os.path.getsize(ruta_gastos) / 1e6:,.1f} MB)")
+
     # ========== PRESUPUESTO.CSV ==========
     print("\n📊 Generando presupuesto.csv...")
-    
-    # Presupuestos por área (normalizados)
-    areas_normalizadas = ['Ventas', 'Marketing', 'TI', 'RRHH', 'Operaciones']
-    
-    presupuesto_data = []
-    for area in areas_normalizadas:
-        # Presupuesto anual por área
-        presupuesto_anual = np.random.uniform(200000, 800000)
-        
-        presupuesto_data.append({
-            'area': area,
-            'presupuesto_anual': round(presupuesto_anual, 2),
-            'año': 2024
-        })
-    
-    df_presupuesto = pd.DataFrame(presupuesto_data)
-    df_presupuesto.to_csv('project/data/presupuesto.csv', index=False)
+    # Generador propio: el presupuesto no depende de los bloques de gastos
+    df_presupuesto = generar_presupuesto(np.random.default_rng(semilla), filas, anios, areas)
+    df_presupuesto.to_csv(os.path.join(salida, 'presupuesto.csv'), index=False)
     print(f"✅ presupuesto.csv creado: {len(df_presupuesto)} registros")
-    
-    print("\n🎉 Datos de ejemplo generados correctamente en project/data/")
+
+    print(f"\n🎉 Datos de ejemplo generados correctamente en {salida}/")
     print("\nPróximos pasos:")
     print("  1. Ejecuta: python project/ingest/run.py")
     print("  2. Revisa el reporte en: project/output/reporte.md")
 
+
 if __name__ == '__main__':
-    generar_datos_ejemplo()
+    defecto = Tasas()
+    parser = argparse.ArgumentParser(description='Genera gastos y presupuesto sinteticos')
+    parser.add_argument('--filas', type=int, default=500)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', default='project/data')
+    parser.add_argument('--anios', type=int, nargs='+', default=[2024])
+    parser.add_argument('--areas', nargs='+', default=AREAS,
+                        help='Areas fuera del dominio del ETL van a cuarentena como "Area no reconocida"')
+    parser.add_argument('--filas-por-bloque', type=int, default=FILAS_POR_BLOQUE,
+                        help='Filas en memoria a la vez (acota la memoria)')
+    for tasa in Tasas._fields:
+        parser.add_argument(f'--tasa-{tasa.replace("_", "-")}', type=float, default=getattr(defecto, tasa))
+    args = parser.parse_args()
+
+    tasas = Tasas(*[getattr(args, f'tasa_{t}') for t in Tasas._fields])
+    generar_datos_ejemplo(args.filas, args.semilla, args.salida, sorted(args.anios),
+                          args.areas, tasas, args.filas_por_bloque)
@@ -0,0 +1,174 @@
+"""
+Indice persistente de clave natural para deduplicacion entre batches
+Guarda, por hash de (fecha, area, partida), el registro ganador
+(_event_id, _ingest_ts, _batch_id, importe en centimos). La capa Plata consulta solo
+las claves del batch actual en lugar de releer el historico de clean/.
+
+La resolucion no escribe: devuelve los cambios pendientes (Cambios), que
+se confirman en la misma transaccion que los deltas y la marca de agua de
+estado_oro (misma base SQLite). Si el batch falla antes de Oro, el indice
+no guarda ganadores cuyos importes nunca llegaron al estado acumulado.
+"""
+import sqlite3
+from collections import namedtuple
+
+import pandas as pd
+
+import dinero
+
+# Misma base que estado_oro: el indice se confirma en la transaccion de Oro
+RUTA_INDICE = 'project/data/gold/estado_oro.db'
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS indice_clave_natural (
+    clave INTEGER PRIMARY KEY,
+    fecha TEXT NOT NULL,
+    area TEXT NOT NULL,
+    partida TEXT NOT NULL,
+    importe INTEGER NOT NULL,
+    event_id TEXT NOT NULL,
+    ingest_ts TEXT NOT NULL,
+    batch_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reemplazos (
+    batch_id TEXT NOT NULL,
+    clave INTEGER NOT NULL,
+    fecha TEXT NOT NULL,
+    area TEXT NOT NULL,
+    importe INTEGER NOT NULL,
+    batch_id_anterior TEXT NOT NULL,
+    PRIMARY KEY (batch_id, clave)
+);
+"""
+
+_COLUMNAS = ['clave', 'fecha', 'area', 'partida', 'importe', 'event_id', 'ingest_ts', 'batch_id']
+_COLUMNAS_REEMPLAZOS = ['batch_id', 'clave', 'fecha', 'area', 'importe', 'batch_id_anterior']
+CLAVE_NATURAL = ['fecha', 'area', 'partida']
+
+# Cambios de un batch pendientes de confirmar: ganadores (_COLUMNAS) y
+# reemplazos (_COLUMNAS_REEMPLAZOS), ambos DataFrames
+Cambios = namedtuple('Cambios', ['ganadores', 'reemplazos'])
+
+
+def abrir_indice(ruta=RUTA_INDICE):
+    """Abre (y crea si no existe) el indice de clave natural"""
+    conn = sqlite3.connect(ruta)
+    dinero.migrar_sqlite(conn, _ESQUEMA, {'indice_clave_natural': ['importe'], 'reemplazos': ['importe']})
+    return conn
+
+
+def hash_clave(df):
+    """Hash int64 de (fecha, area, partida), estable entre ejecuciones"""
+    clave = pd.DataFrame({
+        'fecha': df['fecha'].dt.strftime('%Y-%m-%d'),
+        'area': df['area'].astype(str),
+        'partida': df['partida'].astype(str),
+    })
+    return pd.util.hash_pandas_object(clave, index=False).astype('int64')
+
+
+def sin_cambios():
+    return Cambios(pd.DataFrame(columns=_COLUMNAS), pd.DataFrame(columns=_COLUMNAS_REEMPLAZOS))
+
+
+def combinar(cambios):
+    """Cambios de varios batches resueltos en orden, como uno solo (para
+    cada clave gana el ultimo)"""
+    cambios = [c for c in cambios if c is not None]
+    if not cambios:
+        return sin_cambios()
+    ganadores = pd.concat([c.ganadores for c in cambios], ignore_index=True)
+    return Cambios(ganadores.drop_duplicates('clave', keep='last').reset_index(drop=True),
+                   pd.concat([c.reemplazos for c in cambios], ignore_index=True))
+
+
+def _colisiones(a, b):
+    """Filas cuyo hash coincide pero su clave natural no"""
+    return (a[CLAVE_NATURAL].to_numpy() != b[CLAVE_NATURAL].to_numpy()).any(axis=1)
+
+
+def resolver_batch(conn, df_gastos, pendientes=None):
+    """Resuelve el batch (ya deduplicado internamente) contra el indice.
+
+    - Clave nueva: gana.
+    - Clave de un batch anterior con _ingest_ts <= al actual: el registro
+      del batch la reemplaza (supersesion) y se anota en `reemplazos`.
+    - Clave de un batch anterior mas reciente: el registro entrante queda
+      obsoleto y se descarta de Plata.
+    - Clave del mismo batch (reproceso): no cuenta como supersesion.
+
+    pendientes: Cambios ya resueltos pero aun sin confirmar (p. ej. los
+    sub-lotes anteriores de un micro-batch); tienen prioridad sobre el
+    indice. Una coincidencia de hash con otra clave natural lanza
+    ValueError en lugar de fusionar registros distintos.
+
+    No escribe en el indice. Devuelve (df_gastos_ganadores, cambios,
+    n_reemplazos, n_obsoletos); `cambios` se confirma con `aplicar`.
+    """
+    lote = pd.DataFrame({
+        'clave': hash_clave(df_gastos).to_numpy(),
+        'fecha': df_gastos['fecha'].dt.strftime('%Y-%m-%d').to_numpy(),
+        'area': df_gastos['area'].astype(str).to_numpy(),
+        'partida': df_gastos['partida'].astype(str).to_numpy(),
+        'importe': df_gastos['importe'].to_numpy(),
+        'event_id': df_gastos['_event_id'].astype(str).to_numpy(),
+        'ingest_ts': df_gastos['_ingest_ts'].to_numpy(),
+        'batch_id': df_gastos['_batch_id'].to_numpy(),
+    })
+    if lote['clave'].duplicated().any():
+        raise ValueError('Colision de hash de clave natural dentro del batch')
+
+    with conn:
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS _lote (clave INTEGER PRIMARY KEY)')
+        conn.execute('DELETE FROM _lote')
+        conn.executemany('INSERT INTO _lote VALUES (?)', ((int(c),) for c in lote['clave']))
+        existentes = pd.read_sql(
+            'SELECT i.clave, i.fecha, i.area, i.partida, i.importe, i.ingest_ts, i.batch_id '
+            'FROM _lote l JOIN indice_clave_natural i ON i.clave = l.clave', conn)
+    if pendientes is not None and len(pendientes.ganadores) > 0:
+        previos = pendientes.ganadores[pendientes.ganadores['clave'].isin(lote['clave'])]
+        existentes = pd.concat([existentes[~existentes['clave'].isin(previos['clave'])],
+                                previos[existentes.columns]], ignore_index=True)
+
+    cruce = lote[['clave', 'ingest_ts', 'batch_id'] + CLAVE_NATURAL].merge(
+        existentes, on='clave', how='left', suffixes=('', '_ant'))
+    previo = cruce['batch_id_ant'].notna().to_numpy()
+    anteriores = cruce.loc[previo, [f'{c}_ant' for c in CLAVE_NATURAL]].set_axis(CLAVE_NATURAL, axis=1)
+    if _colisiones(cruce.loc[previo], anteriores).any():
+        raise ValueError('Colision de hash de clave natural con el indice: distinta (fecha, area, partida)')
+
+    otro_batch = cruce['batch_id_ant'].notna() & (cruce['batch_id_ant'] != cruce['batch_id'])
+    obsoleto = (otro_batch & (cruce['ingest_ts_ant'] > cruce['ingest_ts'])).to_numpy()
+    reemplazo = otro_batch.to_numpy() & ~obsoleto
+
+    reemplazos = cruce.loc[reemplazo, ['batch_id', 'clave', 'fecha_ant', 'area_ant', 'importe', 'batch_id_ant']]
+    reemplazos.columns = _COLUMNAS_REEMPLAZOS
+    cambios = Cambios(lote.loc[~obsoleto, _COLUMNAS].reset_index(drop=True), reemplazos.reset_index(drop=True))
+    return df_gastos[~obsoleto], cambios, int(reemplazo.sum()), int(obsoleto.sum())
+
+
+def aplicar(conn, cambios):
+    """Escribe ganadores y reemplazos. No abre transaccion: se llama dentro
+    de la del llamador (estado_oro.aplicar_batch) o mediante `registrar`."""
+    conn.executemany(
+        f"INSERT OR REPLACE INTO reemplazos ({', '.join(_COLUMNAS_REEMPLAZOS)}) "
+        f"VALUES ({', '.join('?' * len(_COLUMNAS_REEMPLAZOS))})",
+        cambios.reemplazos[_COLUMNAS_REEMPLAZOS].itertuples(index=False, name=None))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO indice_clave_natural ({', '.join(_COLUMNAS)}) "
+        f"VALUES ({', '.join('?' * len(_COLUMNAS))})",
+        cambios.ganadores[_COLUMNAS].itertuples(index=False, name=None))
+
+
+def registrar(conn, cambios):
+    """Confirma los cambios en su propia transaccion (Oro no incremental)"""
+    with conn:
+        aplicar(conn, cambios)
+
+
+def reemplazados(cambios):
+    """Registros sustituidos (fecha, area, importe), para restar sus
+    importes en Oro"""
+    df = cambios.reemplazos[['fecha', 'area', 'importe']].reset_index(drop=True)
+    df['fecha'] = pd.to_datetime(df['fecha'])
+    return df
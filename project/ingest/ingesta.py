@@ -0,0 +1,123 @@
+"""
+Ingesta (capa Bronce): esquema de lectura y metadatos de trazabilidad
+Los datos viajan en columnas Arrow desde la lectura del CSV: las fases se
+pasan los mismos buffers y la escritura Parquet los reutiliza sin
+convertir objetos Python.
+"""
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from event_ids import generar_event_ids
+
+# Tipos explicitos para la lectura de gastos: todos los bloques/particiones
+# deben compartir esquema para escribirse en Parquet de forma homogenea.
+# Bronce acepta todo, asi que las columnas de origen se leen como texto
+# (string de Arrow: un buffer contiguo en lugar de un objeto str por celda).
+TEXTO = pd.ArrowDtype(pa.string())
+DTYPES_GASTOS = {'fecha': TEXTO, 'area': TEXTO, 'partida': TEXTO, 'importe': TEXTO}
+# `año` es opcional: los tipos de columnas ausentes se ignoran
+DTYPES_PRESUPUESTO = {'area': TEXTO, 'presupuesto_anual': TEXTO, 'año': TEXTO}
+COLUMNAS_TRAZABILIDAD = ['_ingest_ts', '_source_file', '_batch_id', '_event_id']
+ESQUEMA_BRONCE_GASTOS = pa.schema(
+    [(col, pa.string()) for col in DTYPES_GASTOS]
+    + [(col, pa.string()) for col in COLUMNAS_TRAZABILIDAD]
+)
+# Mismos valores nulos que pandas.read_csv
+NULOS_CSV = pacsv.ConvertOptions().null_values + ['<NA>', 'None']
+# Entradas comprimidas: pyarrow descomprime segun la extension
+EXTENSIONES_COMPRIMIDAS = ['.gz', '.zst']
+
+
+@contextmanager
+def copy_on_write():
+    """Copy-on-Write solo mientras dura el contexto (tambien como decorador):
+    los filtros por mascara no copian datos hasta que se modifican, sin
+    cambiar la configuracion de pandas de quien importa el modulo. En
+    pandas >= 3 siempre esta activo y la opcion esta obsoleta."""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        yield
+        return
+    with pd.option_context('mode.copy_on_write', True):
+        yield
+
+
+def buscar_csv(ruta):
+    """`ruta` si existe; si no, su version comprimida (gastos.csv.gz, .zst)"""
+    for candidata in [ruta] + [ruta + ext for ext in EXTENSIONES_COMPRIMIDAS]:
+        if os.path.exists(candidata):
+            return candidata
+    return ruta
+
+
+def _opciones(dtype, columnas):
+    tipos = None if dtype is None else {col: t.pyarrow_dtype for col, t in dtype.items()}
+    return pacsv.ConvertOptions(column_types=tipos, include_columns=columnas, null_values=NULOS_CSV,
+                                strings_can_be_null=True)
+
+
+def _a_pandas(tabla, inicio=0):
+    df = tabla.to_pandas(types_mapper=pd.ArrowDtype)
+    df.index = pd.RangeIndex(inicio, inicio + len(df))
+    return df
+
+
+def _compacta(tabla):
+    """Copia contigua sin desplazamiento: algunos kernels de pyarrow (if_else
+    con texto) leen mal los arrays que son un slice de otro"""
+    return tabla.take(np.arange(tabla.num_rows))
+
+
+def _leer_por_bloques(ruta, opciones, chunksize):
+    """Bloques de exactamente `chunksize` filas (el ultimo, el resto) con el
+    indice continuo entre bloques, como pd.read_csv(chunksize=...)"""
+    pendiente, inicio = None, 0
+    for lote in pacsv.open_csv(ruta, convert_options=opciones):
+        tabla = pa.Table.from_batches([lote])
+        pendiente = tabla if pendiente is None else pa.concat_tables([pendiente, tabla])
+        while pendiente.num_rows >= chunksize:
+            yield _a_pandas(_compacta(pendiente.slice(0, chunksize)), inicio)
+            pendiente, inicio = pendiente.slice(chunksize), inicio + chunksize
+    if pendiente is not None and pendiente.num_rows > 0:
+        yield _a_pandas(_compacta(pendiente), inicio)
+
+
+def leer_csv(ruta, dtype=None, chunksize=None, columnas=None):
+    """Lee un CSV (o .csv.gz/.csv.zst) a columnas Arrow con el lector de pyarrow.
+
+    Los tipos de `dtype` se declaran antes de leer (sin inferencia) y solo
+    se leen `columnas` si se indican. Completo, el lector multihilo; las
+    columnas se unen en un solo chunk para que filtros y particionado no
+    tengan que concatenarlas en cada operacion. Con chunksize, el lector
+    en streaming de pyarrow reagrupado en bloques de chunksize filas.
+    """
+    opciones = _opciones(dtype, columnas)
+    if chunksize:
+        return _leer_por_bloques(ruta, opciones, chunksize)
+    return _a_pandas(pacsv.read_csv(ruta, convert_options=opciones).combine_chunks())
+
+
+def _constante(valor, df):
+    """Columna con el mismo texto en todas las filas: un Categorical de una
+    categoria ocupa un byte por fila; Parquet la escribe como string"""
+    codigos = np.zeros(len(df), dtype=np.int8)
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=[valor]), index=df.index)
+
+
+def anadir_trazabilidad(df, source_name, batch_id, ingest_ts, ids_deterministas=False, offset=0):
+    """Anade los metadatos de trazabilidad a un DataFrame (o bloque).
+
+    offset es la posicion de la primera fila del bloque en el archivo, para
+    que los _event_id deterministas no se repitan entre bloques.
+    """
+    df['_ingest_ts'] = _constante(ingest_ts, df)
+    df['_source_file'] = _constante(source_name, df)
+    df['_batch_id'] = _constante(batch_id, df)
+    semilla = f'{batch_id}/{source_name}' if ids_deterministas else None
+    ids = generar_event_ids(len(df), semilla=semilla, offset=offset)
+    df['_event_id'] = pd.Series(pd.arrays.ArrowExtensionArray(ids), index=df.index)
+    return df
@@ -0,0 +1,163 @@
+"""
+Limpieza (capa Plata): dominios, reglas de validacion y deduplicacion
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.api.types import union_categoricals
+
+import dinero
+import validacion
+
+CLAVE_NATURAL = ['fecha', 'area', 'partida']
+
+area_map = {
+    'ventas': 'Ventas', 'VENTAS': 'Ventas',
+    'marketing': 'Marketing', 'MARKETING': 'Marketing',
+    'ti': 'Ti', 'TI': 'Ti', 'IT': 'Ti',
+    'rrhh': 'Rrhh', 'RRHH': 'Rrhh',
+    'operaciones': 'Operaciones', 'OPERACIONES': 'Operaciones'
+}
+# Ordenadas: son las categorias de la columna area y fijan el orden de los groupby
+areas_validas = sorted(['Ventas', 'Marketing', 'Ti', 'Rrhh', 'Operaciones'])
+partida_map = {'salarios': 'Salarios', 'SALARIOS': 'Salarios', 'publicidad': 'Publicidad', 'PUBLICIDAD': 'Publicidad'}
+
+
+def normalizar_area(s):
+    """area -> Categorical con el dominio valido (fuera de dominio = nulo)"""
+    return validacion.a_categoria(s, lambda v: v.replace(area_map).str.title(), areas_validas)
+
+
+def normalizar_partida(s):
+    """partida -> Categorical; la normalizacion solo recorre valores distintos"""
+    return validacion.a_categoria(s, lambda v: v.replace(partida_map).str.title())
+
+
+def _por_valores_distintos(s, convertir, nulo):
+    """Aplica `convertir` solo a los valores distintos y expande por codigo.
+
+    Con texto Arrow evita crear un objeto str de Python por fila; el
+    resultado es el mismo que convertir la columna entera.
+    """
+    codigos, distintos = pd.factorize(s)
+    convertidos = convertir(pd.Series(list(distintos), dtype=object)).to_numpy()
+    # Los nulos de origen (codigo -1) apuntan al nulo anadido al final
+    valores = np.append(convertidos, nulo)[codigos]
+    return pd.Series(valores, index=s.index, name=s.name)
+
+
+# Decimales que Arrow convierte igual que pandas: con 15 cifras o menos
+# ambos redondean exacto; con mas, pandas puede diferir en el ultimo bit
+_DECIMAL_SIMPLE = r'^-?[0-9]{1,9}(\.[0-9]{1,6})?$'
+
+
+def a_numero(s):
+    """Como pd.to_numeric(errors='coerce'), siempre a float64 de numpy.
+
+    Con texto Arrow, si toda la columna es numerica se convierte con un solo
+    cast de Arrow; si no, los decimales simples (-123.45) se convierten en
+    Arrow y el resto (texto invalido, espacios, exponentes...) pasa por
+    pandas, sin crear un objeto str por fila salvo para ese resto.
+
+    'inf', '-inf' y 'nan' no son importes: quedan nulos como el texto
+    invalido (la regla de conversion los envia a cuarentena).
+    """
+    if not (isinstance(s.dtype, pd.ArrowDtype) and pa.types.is_string(s.dtype.pyarrow_dtype)):
+        return _solo_finitos(pd.to_numeric(s, errors='coerce').astype('float64'))
+    texto = pa.array(s.array)
+    # Columna limpia: con 15 caracteres o menos no hay mas de 15 cifras, y
+    # si todo el texto es numero basta un unico cast (sin regex ni pandas)
+    if (pc.max(pc.utf8_length(texto)).as_py() or 0) <= 15:
+        try:
+            valores = pc.cast(texto, pa.float64()).to_numpy(zero_copy_only=False)
+            return _solo_finitos(pd.Series(valores, index=s.index, name=s.name))
+        except pa.ArrowInvalid:
+            pass
+    simple = pc.fill_null(pc.match_substring_regex(texto, _DECIMAL_SIMPLE), False)
+    valores = pc.cast(pc.if_else(simple, texto, pa.scalar(None, pa.string())), pa.float64())
+    valores = valores.to_numpy(zero_copy_only=False).copy()
+    resto = np.flatnonzero(texto.is_valid().to_numpy(zero_copy_only=False) & ~simple.to_numpy(zero_copy_only=False))
+    if len(resto) > 0:
+        otros = pd.Series(texto.take(resto).to_pylist(), dtype=object)
+        valores[resto] = pd.to_numeric(otros, errors='coerce').astype('float64').to_numpy()
+    return _solo_finitos(pd.Series(valores, index=s.index, name=s.name))
+
+
+def _solo_finitos(valores):
+    """inf/-inf -> NaN (el cast de Arrow y pd.to_numeric los aceptan)"""
+    infinitos = np.isinf(valores.to_numpy())
+    if infinitos.any():
+        valores = valores.mask(infinitos)
+    return valores
+
+
+def a_fecha(s):
+    return _por_valores_distintos(s, lambda v: pd.to_datetime(v, errors='coerce'), np.datetime64('NaT', 'ns'))
+
+
+# Reglas en orden de prioridad: cada registro se pone en cuarentena por la
+# primera que incumple
+TRANSFORMACIONES_GASTOS = {'fecha': a_fecha, 'importe': a_numero, 'area': normalizar_area, 'partida': normalizar_partida}
+REGLAS_GASTOS = [
+    validacion.campos_nulos(['fecha', 'area', 'partida', 'importe']),
+    validacion.conversion_fallida(['fecha', 'importe']),
+    validacion.fuera_de_rango('importe', dinero.LIMITE_EUROS, 'Importe fuera de rango'),
+    validacion.no_positivo('importe'),
+    validacion.fuera_de_dominio('area', areas_validas, 'Area no reconocida'),
+]
+
+TRANSFORMACIONES_PRESUPUESTO = {'presupuesto_anual': a_numero, 'area': normalizar_area}
+REGLAS_PRESUPUESTO = [
+    validacion.campos_nulos(['area', 'presupuesto_anual'], 'Campos obligatorios nulos en presupuesto'),
+    validacion.conversion_fallida(['presupuesto_anual'], 'Error en conversion de tipos en presupuesto'),
+    validacion.fuera_de_rango('presupuesto_anual', dinero.LIMITE_EUROS, 'Presupuesto fuera de rango'),
+]
+
+
+def limpiar_gastos(df_gastos):
+    """Valida y normaliza gastos (sin deduplicar).
+
+    Devuelve (validos, rechazados, causas).
+    """
+    df_gastos, rechazados, causas = validacion.validar(df_gastos, TRANSFORMACIONES_GASTOS, REGLAS_GASTOS)
+    # CONVERTIR IMPORTE A DECIMAL(18,2): centimos enteros
+    df_gastos['importe'] = dinero.a_centimos(df_gastos['importe'])
+    return df_gastos, rechazados, causas
+
+
+def limpiar_presupuesto(df_presupuesto):
+    """Valida y normaliza presupuesto. Devuelve (validos, rechazados, causas)."""
+    df_presupuesto, rechazados, causas = validacion.validar(
+        df_presupuesto, TRANSFORMACIONES_PRESUPUESTO, REGLAS_PRESUPUESTO)
+    df_presupuesto['presupuesto_anual'] = dinero.a_centimos(df_presupuesto['presupuesto_anual'])
+    return df_presupuesto, rechazados, causas
+
+
+def marcar_cuarentena(df, causa):
+    """Anade causa y timestamp de cuarentena a los registros rechazados.
+
+    causa puede ser un texto unico o una causa por fila (Categorical).
+    Los rechazados conservan los valores de Bronce (texto Arrow), que se
+    escriben en Parquet tal cual, sin conversiones previas.
+    """
+    df['_quarantine_reason'] = causa
+    df['_quarantine_ts'] = datetime.now().isoformat()
+    return df
+
+
+def concatenar(frames):
+    """pd.concat conservando las columnas category (une sus categorias)"""
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            cats = union_categoricals([f[col] for f in frames], sort_categories=True).categories
+            frames = [f.assign(**{col: f[col].cat.set_categories(cats)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def deduplicar_gastos(df_gastos):
+    """Ultimo registro gana por clave natural; ordenacion estable para
+    que, a igual _ingest_ts, gane el ultimo en orden de lectura"""
+    return df_gastos.sort_values('_ingest_ts', kind='stable').drop_duplicates(subset=CLAVE_NATURAL, keep='last')
@@ -0,0 +1,124 @@
+"""
+Manifiesto de entradas: cache por huella de contenido de los archivos ingeridos
+Anota, por archivo de entrada, una huella (hash BLAKE2b del contenido,
+tamano y mtime) y los artefactos Bronce/Plata que produjo junto con sus
+recuentos. Un archivo cuyo contenido no ha cambiado se sirve desde esos
+artefactos en lugar de volver a leerlo, limpiarlo y escribir otro par
+Bronce/Plata con un BATCH_ID nuevo.
+
+Si tamano y mtime coinciden con los registrados se reutiliza el hash
+guardado sin leer el archivo; si no, se recalcula. Las entradas se
+registran al terminar el batch y en una sola transaccion SQLite: un
+batch que falla a mitad no deja en el manifiesto artefactos incompletos.
+
+    python project/ingest/manifiesto.py          # entradas registradas
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from collections import namedtuple
+from datetime import datetime
+
+RUTA_MANIFIESTO = 'project/data/manifiesto_entradas.db'
+BLOQUE_HASH = 1 << 20
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS entradas (
+    ruta TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    tamano INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    batch_id TEXT NOT NULL,
+    artefactos TEXT NOT NULL,
+    estadisticas TEXT NOT NULL,
+    registrado_en TEXT NOT NULL
+);
+"""
+
+Huella = namedtuple('Huella', ['hash', 'tamano', 'mtime_ns'])
+# artefactos: {capa: [rutas]}; estadisticas: recuentos del batch que lo ingirio.
+# En una entrada nueva ambos se rellenan a medida que avanzan las fases.
+Entrada = namedtuple('Entrada', ['ruta', 'huella', 'batch_id', 'artefactos', 'estadisticas', 'en_cache'])
+
+
+def abrir_manifiesto(ruta=RUTA_MANIFIESTO):
+    """Abre (y crea si no existe) el manifiesto; espera si otro proceso escribe"""
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    conn = sqlite3.connect(ruta, timeout=30)
+    conn.executescript(_ESQUEMA)
+    return conn
+
+
+def hash_contenido(ruta):
+    """BLAKE2b de 128 bits del archivo, leido en bloques de 1 MB"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(BLOQUE_HASH), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def huella(conn, ruta, verificar=False):
+    """Huella actual del archivo.
+
+    Si tamano y mtime coinciden con el manifiesto se reutiliza el hash
+    registrado; con verificar=True el contenido se lee siempre.
+    """
+    estado = os.stat(ruta)
+    fila = conn.execute('SELECT hash, tamano, mtime_ns FROM entradas WHERE ruta = ?', (ruta,)).fetchone()
+    if fila is not None and not verificar and fila[1:] == (estado.st_size, estado.st_mtime_ns):
+        return Huella(fila[0], estado.st_size, estado.st_mtime_ns)
+    return Huella(hash_contenido(ruta), estado.st_size, estado.st_mtime_ns)
+
+
+def consultar(conn, ruta, batch_id, verificar=False):
+    """Entrada de un archivo de entrada.
+
+    Esta en cache si su contenido coincide con el registrado y todos los
+    artefactos que produjo siguen en disco; si no, es una entrada nueva
+    del batch `batch_id`.
+    """
+    actual = huella(conn, ruta, verificar)
+    fila = conn.execute('SELECT hash, batch_id, artefactos, estadisticas FROM entradas WHERE ruta = ?',
+                        (ruta,)).fetchone()
+    if fila is not None and fila[0] == actual.hash:
+        artefactos = json.loads(fila[2])
+        if all(os.path.exists(r) for rutas in artefactos.values() for r in rutas):
+            return Entrada(ruta, actual, fila[1], artefactos, json.loads(fila[3]), True)
+    return Entrada(ruta, actual, batch_id, {}, {}, False)
+
+
+def registrar(conn, entradas):
+    """Anota las entradas en una sola transaccion.
+
+    Las que estaban en cache solo actualizan su huella (p. ej. un mtime
+    nuevo tras copiar el mismo archivo) y conservan sus artefactos.
+    """
+    registrado_en = datetime.now().isoformat()
+    with conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(e.ruta, e.huella.hash, e.huella.tamano, e.huella.mtime_ns, e.batch_id,
+              json.dumps(e.artefactos), json.dumps(e.estadisticas), registrado_en) for e in entradas])
+
+
+def listar(ruta=RUTA_MANIFIESTO):
+    """Entradas registradas: (ruta, hash, tamano, batch_id, registrado_en)"""
+    conn = abrir_manifiesto(ruta)
+    filas = conn.execute('SELECT ruta, hash, tamano, batch_id, registrado_en FROM entradas ORDER BY ruta').fetchall()
+    conn.close()
+    return filas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Entradas registradas en el manifiesto de ingesta')
+    parser.add_argument('--manifiesto', default=RUTA_MANIFIESTO)
+    args = parser.parse_args()
+
+    filas = listar(args.manifiesto)
+    if not filas:
+        print("Manifiesto vacio: ninguna entrada ingerida con --cache-entradas")
+    for ruta, hash_, tamano, batch_id, registrado_en in filas:
+        print(f"{ruta}  {hash_[:12]}  {tamano} bytes  batch {batch_id}  ({registrado_en})")
@@ -0,0 +1,235 @@
+"""
+Instrumentacion del pipeline: tiempo, CPU, memoria y filas por etapa
+Las etapas se anidan (fase -> subpaso) y cada una registra tiempo real,
+tiempo de CPU, pico de RSS del proceso y filas de entrada/salida:
+
+    metricas.activar(BATCH_ID)
+    with metricas.etapa('read_csv') as e:
+        df = pd.read_csv(ruta)
+        e['filas_salida'] = len(df)
+    metricas.activa().guardar()
+
+Las escrituras en segundo plano se miden con `diferida`, que envuelve la
+funcion que ejecuta el hilo escritor: la etapa registra la escritura real,
+no el momento en que se encola.
+
+Sin activar, `etapa` devuelve un contexto nulo compartido: el coste es una
+llamada a funcion, asi que la instrumentacion puede quedarse en el codigo.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage, el RSS queda vacio
+    resource = None
+
+import pandas as pd
+
+DIR_METRICAS = 'project/data/metrics'
+
+
+def _rss_pico_mb():
+    """Pico de RSS del proceso hasta ahora (MB)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB, macOS en bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+class _EtapaNula:
+    """Contexto sin coste para cuando la instrumentacion esta desactivada"""
+
+    def __init__(self):
+        self.registro = {}
+
+    def __enter__(self):
+        return self.registro
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULA = _EtapaNula()
+
+
+class _Etapa:
+    def __init__(self, metricas, nombre, filas_entrada):
+        self.metricas = metricas
+        self.nombre = nombre
+        self.filas_entrada = filas_entrada
+
+    def __enter__(self):
+        return self.metricas.abrir(self.nombre, self.filas_entrada)
+
+    def __exit__(self, *exc):
+        self.metricas.cerrar()
+        return False
+
+
+class Metricas:
+    """Registro de etapas de una ejecucion (un BATCH_ID).
+
+    `rss_pico_mb` es el maximo del proceso al cerrar la etapa (getrusage
+    es monotono); `rss_delta_mb` es cuanto ha crecido ese maximo durante
+    la etapa, es decir, la memoria nueva que ha necesitado.
+    """
+
+    def __init__(self, batch_id):
+        self.batch_id = batch_id
+        self.registros = []
+        self._pila = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def abrir(self, nombre, filas_entrada=None):
+        """Inicia una etapa anidada en la actual; devuelve su registro"""
+        registro = {
+            'batch_id': self.batch_id,
+            'etapa': '/'.join([r['nombre'] for r in self._pila] + [nombre]),
+            'nombre': nombre,
+            'nivel': len(self._pila),
+            'inicio_s': time.perf_counter() - self._t0,
+            'filas_entrada': filas_entrada,
+            'filas_salida': None,
+        }
+        # Se anota al abrir para que el orden sea el de inicio
+        self.registros.append(registro)
+        registro['_t'] = (time.perf_counter(), time.process_time(), _rss_pico_mb())
+        self._pila.append(registro)
+        return registro
+
+    def cerrar(self, filas_salida=None):
+        """Cierra la etapa abierta mas interna"""
+        registro = self._pila.pop()
+        wall, cpu, rss = registro.pop('_t')
+        rss_fin = _rss_pico_mb()
+        registro['wall_s'] = time.perf_counter() - wall
+        registro['cpu_s'] = time.process_time() - cpu
+        registro['rss_pico_mb'] = rss_fin
+        registro['rss_delta_mb'] = None if rss is None else rss_fin - rss
+        if filas_salida is not None:
+            registro['filas_salida'] = filas_salida
+        return registro
+
+    def etapa(self, nombre, filas_entrada=None):
+        return _Etapa(self, nombre, filas_entrada)
+
+    def diferida(self, nombre, fn, filas_entrada=None):
+        """Envuelve fn como etapa hija de la etapa abierta ahora, aunque se
+        ejecute mas tarde y en otro hilo (escrituras en segundo plano).
+
+        El registro se anota al envolver (orden de programacion) y se
+        completa al ejecutar fn: wall_s es la duracion de fn y cpu_s la CPU
+        del hilo que la ejecuta. No pasa por la pila de etapas abiertas.
+        """
+        registro = {
+            'batch_id': self.batch_id,
+            'etapa': '/'.join([r['nombre'] for r in self._pila] + [nombre]),
+            'nombre': nombre,
+            'nivel': len(self._pila),
+            'inicio_s': None,
+            'filas_entrada': filas_entrada,
+            'filas_salida': None,
+        }
+        with self._lock:
+            self.registros.append(registro)
+
+        def medida(*args, **kwargs):
+            rss = _rss_pico_mb()
+            wall, cpu = time.perf_counter(), time.thread_time()
+            registro['inicio_s'] = wall - self._t0
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                rss_fin = _rss_pico_mb()
+                registro['wall_s'] = time.perf_counter() - wall
+                registro['cpu_s'] = time.thread_time() - cpu
+                registro['rss_pico_mb'] = rss_fin
+                registro['rss_delta_mb'] = None if rss is None else rss_fin - rss
+        return medida
+
+    def a_dataframe(self):
+        return pd.DataFrame(self.registros)
+
+    def resumen(self):
+        """Tabla de texto por etapa; las etapas repetidas (bloques en
+        streaming, reglas por bloque) se suman"""
+        df = self.a_dataframe()
+        if df.empty:
+            return '(sin etapas registradas)'
+        suma = lambda s: s.sum(min_count=1)  # etapas sin filas quedan vacias, no a 0
+        tabla = df.groupby('etapa', sort=False).agg(
+            n=('nombre', 'size'),
+            wall_s=('wall_s', 'sum'),
+            cpu_s=('cpu_s', 'sum'),
+            rss_pico_mb=('rss_pico_mb', 'max'),
+            rss_delta_mb=('rss_delta_mb', 'sum'),
+            filas_entrada=('filas_entrada', suma),
+            filas_salida=('filas_salida', suma),
+        )
+        nivel = df.groupby('etapa', sort=False)['nivel'].first()
+        tabla.index = ['  ' * n + e.rsplit('/', 1)[-1] for e, n in nivel.items()]
+        for col in ['filas_entrada', 'filas_salida']:
+            tabla[col] = tabla[col].astype('Int64')
+        return tabla.to_string(float_format=lambda v: f'{v:,.3f}')
+
+    def guardar(self, directorio=DIR_METRICAS):
+        """Escribe run_metrics_batch_{BATCH_ID}.json y .parquet"""
+        os.makedirs(directorio, exist_ok=True)
+        base = os.path.join(directorio, f'run_metrics_batch_{self.batch_id}')
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'batch_id': self.batch_id, 'etapas': self.registros}, f, indent=2)
+        self.a_dataframe().to_parquet(base + '.parquet', index=False)
+        return base + '.json'
+
+
+# ========== REGISTRO ACTIVO DEL PROCESO ==========
+_activa = None
+
+
+def activar(batch_id):
+    """Activa la instrumentacion para el batch y devuelve su registro"""
+    global _activa
+    _activa = Metricas(batch_id)
+    return _activa
+
+
+def desactivar():
+    global _activa
+    _activa = None
+
+
+def activa():
+    """Registro activo, o None si la instrumentacion esta desactivada"""
+    return _activa
+
+
+def etapa(nombre, filas_entrada=None):
+    """Contexto de una etapa en el registro activo (no-op si no hay)"""
+    if _activa is None:
+        return _NULA
+    return _activa.etapa(nombre, filas_entrada)
+
+
+def diferida(nombre, fn, filas_entrada=None):
+    """fn envuelta para registrarse como etapa al ejecutarse (fn tal cual si no hay registro activo)"""
+    if _activa is None:
+        return fn
+    return _activa.diferida(nombre, fn, filas_entrada)
+
+
+def abrir(nombre, filas_entrada=None):
+    """Version sin `with` de `etapa`, para fases que abarcan un bloque de script"""
+    if _activa is None:
+        return _NULA.registro
+    return _activa.abrir(nombre, filas_entrada)
+
+
+def cerrar(filas_salida=None):
+    if _activa is not None:
+        _activa.cerrar(filas_salida)
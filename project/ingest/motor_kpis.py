@@ -0,0 +1,141 @@
+"""
+Motor de KPIs de la capa Oro: agregados declarativos en una sola pasada
+Cada agregado declara sus dimensiones, sus medidas y, si tiene `mes`,
+las derivadas temporales (acumulado del año y variacion mensual):
+
+    Agregado('tendencia_partida', ('mes', 'area', 'partida'), {'gasto': 'gasto'}, ('ytd', 'mom'))
+
+Plata se recorre una sola vez para agregar las medidas al grano mas fino
+que piden todos los agregados (la union de sus dimensiones). Cada
+conjunto de agrupacion se obtiene despues enrollando ese agregado fino,
+que tiene una fila por combinacion de claves y no por gasto, asi que
+anadir un KPI no anade recorridos de Plata.
+"""
+from collections import namedtuple
+
+import pandas as pd
+
+import dinero
+
+# Medida -> (columna de Plata, funcion). Solo funciones que se pueden
+# volver a agregar al enrollar: la suma de sumas parciales es la suma. Los
+# importes son centimos enteros (dinero.py): las sumas son exactas y no
+# dependen del orden en que se suman las parciales
+MEDIDAS = {
+    'gasto': ('importe', 'sum'),
+    'n_gastos': ('importe', 'count'),
+    'gasto_max': ('importe', 'max'),
+}
+_REAGREGACION = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+# anio y mes salen de `fecha`: el grano fino guarda el mes como entero
+# (meses desde 1970) y el año se deriva de el al enrollar
+DIMENSIONES = ('anio', 'mes', 'area', 'partida')
+DERIVADAS = ('ytd', 'mom')
+
+# medidas: {columna de salida: medida}
+Agregado = namedtuple('Agregado', ['nombre', 'dimensiones', 'medidas', 'derivadas'], defaults=[()])
+
+
+def validar(agregado):
+    for dim in agregado.dimensiones:
+        if dim not in DIMENSIONES:
+            raise ValueError(f'{agregado.nombre}: dimension desconocida {dim} (opciones: {DIMENSIONES})')
+    for medida in agregado.medidas.values():
+        if medida not in MEDIDAS:
+            raise ValueError(f'{agregado.nombre}: medida desconocida {medida} (opciones: {list(MEDIDAS)})')
+    for derivada in agregado.derivadas:
+        if derivada not in DERIVADAS:
+            raise ValueError(f'{agregado.nombre}: derivada desconocida {derivada} (opciones: {DERIVADAS})')
+        if 'mes' not in agregado.dimensiones:
+            raise ValueError(f'{agregado.nombre}: la derivada {derivada} necesita la dimension mes')
+
+
+def _grano(agregados):
+    dims = {d for a in agregados for d in a.dimensiones}
+    return (['mes'] if dims & {'anio', 'mes'} else []) + [d for d in ('area', 'partida') if d in dims]
+
+
+def _agregar(df, claves, especificacion):
+    if not claves:
+        # Conjunto vacio: total general en una fila
+        return pd.DataFrame({m: [df[col].agg(f)] for m, (col, f) in especificacion.items()})
+    return df.groupby(claves, observed=True, sort=True).agg(**especificacion).reset_index()
+
+
+def agregar_fino(df_gastos, agregados):
+    """Unica pasada sobre Plata: las medidas de todos los agregados por el grano fino"""
+    for agregado in agregados:
+        validar(agregado)
+    grano = _grano(agregados)
+    medidas = sorted({m for a in agregados for m in a.medidas.values()})
+    columnas = {}
+    if 'mes' in grano:
+        columnas['mes'] = df_gastos['fecha'].to_numpy().astype('datetime64[M]').astype('int64')
+    for dim in grano:
+        if dim != 'mes':
+            columnas[dim] = df_gastos[dim]
+    for col in {MEDIDAS[m][0] for m in medidas}:
+        columnas[col] = df_gastos[col]
+    datos = pd.DataFrame(columnas, index=df_gastos.index)
+    return _agregar(datos, grano, {m: MEDIDAS[m] for m in medidas})
+
+
+def _ytd(res, salidas, otras):
+    """Acumulado del año: suma corrida por mes dentro de (año, resto de claves)"""
+    grupos = res.groupby(otras + [res['mes'] // 12], observed=True, sort=False)
+    return res.assign(**{f'{s}_ytd': grupos[s].cumsum() for s in salidas})
+
+
+def _mom(res, salidas, otras):
+    """Variacion frente al mes anterior (nula si ese mes no tuvo gasto)"""
+    anterior = res[otras + ['mes'] + salidas].assign(mes=res['mes'] + 1)
+    unido = res.merge(anterior, on=otras + ['mes'], how='left', suffixes=('', '_anterior'))
+    for s in salidas:
+        previo = unido.pop(f'{s}_anterior')
+        variacion = (unido[s] - previo).astype('Int64')
+        unido[f'{s}_var_mensual'] = variacion
+        unido[f'{s}_var_mensual_pct'] = dinero.cociente(variacion, previo, 2, factor=100)
+    return unido
+
+
+_DERIVADAS = {'ytd': _ytd, 'mom': _mom}
+
+
+def enrollar(fino, agregado):
+    """Conjunto de agrupacion de un agregado a partir del grano fino"""
+    medidas = sorted(set(agregado.medidas.values()))
+    if 'anio' in agregado.dimensiones:
+        fino = fino.assign(anio=fino['mes'] // 12 + 1970)
+    res = _agregar(fino, list(agregado.dimensiones),
+                   {m: (m, _REAGREGACION[MEDIDAS[m][1]]) for m in medidas})
+    res = res.assign(**{salida: res[m] for salida, m in agregado.medidas.items()})
+    res = res[list(agregado.dimensiones) + list(agregado.medidas)]
+
+    # Derivadas solo para medidas aditivas (sumas y recuentos)
+    aditivas = [s for s, m in agregado.medidas.items() if MEDIDAS[m][1] in ('sum', 'count')]
+    otras = [d for d in agregado.dimensiones if d not in ('anio', 'mes')]
+    for derivada in agregado.derivadas:
+        res = _DERIVADAS[derivada](res, aditivas, otras)
+
+    if 'mes' in res.columns:
+        res['mes'] = res['mes'].to_numpy().astype('datetime64[M]').astype(str)
+    return res
+
+
+def derivable(agregado, fino):
+    """True si el grano fino tiene las claves y medidas que pide el agregado"""
+    claves = {'mes' if d == 'anio' else d for d in agregado.dimensiones}
+    return claves.issubset(fino.columns) and set(agregado.medidas.values()).issubset(fino.columns)
+
+
+def calcular(df_gastos, agregados):
+    """{nombre: DataFrame} de todos los agregados con una pasada sobre Plata"""
+    fino = agregar_fino(df_gastos, agregados)
+    return {a.nombre: enrollar(fino, a) for a in agregados}
+
+
+def calcular_desde_fino(fino, agregados):
+    """Agregados que se pueden enrollar desde un grano fino ya calculado
+    (p. ej. los totales del estado incremental); omite los que piden
+    claves o medidas que ese grano no tiene"""
+    return {a.nombre: enrollar(fino, a) for a in agregados if derivable(a, fino)}
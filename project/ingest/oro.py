@@ -0,0 +1,195 @@
+"""
+Capa Oro: agregaciones, KPIs y carga en SQLite
+"""
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+import dinero
+import motor_kpis
+
+# Los importes se guardan en centimos (INTEGER, columnas *_cent); la vista
+# los expone en euros
+VISTA_EJECUCION_DETALLE = """
+CREATE VIEW v_ejecucion_detalle AS
+SELECT 
+    area, presupuesto_anual_cent / 100.0 AS presupuesto_anual,
+    gasto_acumulado_cent / 100.0 AS gasto_acumulado, kpi_ejecucion,
+    CASE 
+        WHEN kpi_ejecucion > 100 THEN 'SOBRE PRESUPUESTO'
+        WHEN kpi_ejecucion >= 90 THEN 'EN RIESGO'
+        WHEN kpi_ejecucion >= 70 THEN 'NORMAL'
+        ELSE 'BAJO CONSUMO'
+    END AS estado,
+    (presupuesto_anual_cent - gasto_acumulado_cent) / 100.0 AS presupuesto_restante
+FROM kpi_ejecucion
+ORDER BY kpi_ejecucion DESC
+"""
+
+# Agregados de Oro (motor_kpis): los dos de base alimentan kpi_ejecucion y
+# tendencia_mensual; el resto se guarda como project/data/gold/{nombre}.parquet
+AGREGADOS_BASE = [
+    motor_kpis.Agregado('gasto_area', ('area',), {'gasto_acumulado': 'gasto'}),
+    motor_kpis.Agregado('tendencia_mensual', ('mes', 'area'), {'gasto_mensual': 'gasto'}),
+]
+AGREGADOS_ORO = AGREGADOS_BASE + [
+    motor_kpis.Agregado('gasto_area_partida', ('area', 'partida'),
+                        {'gasto_acumulado': 'gasto', 'n_gastos': 'n_gastos', 'gasto_max': 'gasto_max'}),
+    motor_kpis.Agregado('tendencia_area_ytd', ('mes', 'area'), {'gasto_mensual': 'gasto'}, ('ytd', 'mom')),
+    motor_kpis.Agregado('tendencia_partida', ('mes', 'area', 'partida'), {'gasto_mensual': 'gasto'}, ('ytd', 'mom')),
+    motor_kpis.Agregado('gasto_anual', ('anio', 'area'), {'gasto_anual': 'gasto', 'n_gastos': 'n_gastos'}),
+    motor_kpis.Agregado('gasto_total', (), {'gasto_total': 'gasto', 'n_gastos': 'n_gastos'}),
+]
+
+# Clave primaria de cada tabla de Oro e indices secundarios:
+# - kpi_ejecucion(kpi_ejecucion): orden de v_ejecucion_detalle
+# - tendencia_mensual: la PK (mes, area) cubre rangos de meses; (area, mes)
+#   cubre la evolucion de un area
+CLAVES_ORO = {'kpi_ejecucion': ['area'], 'tendencia_mensual': ['mes', 'area']}
+INDICES_ORO = [
+    'CREATE INDEX IF NOT EXISTS idx_kpi_ejecucion_kpi ON kpi_ejecucion (kpi_ejecucion DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_tendencia_area_mes ON tendencia_mensual (area, mes, gasto_mensual_cent)',
+]
+
+
+def agregar(df_gastos, agregados=AGREGADOS_ORO):
+    """Todos los agregados de Oro con una sola pasada sobre Plata"""
+    return motor_kpis.calcular(df_gastos, agregados)
+
+
+def agregar_desde_totales(df_mensual, agregados=AGREGADOS_ORO):
+    """Agregados derivables de los totales (mes, area) del estado incremental"""
+    fino = pd.DataFrame({
+        'mes': df_mensual['mes'].to_numpy().astype('datetime64[M]').astype('int64'),
+        'area': df_mensual['area'],
+        'gasto': df_mensual['gasto_mensual'],
+    })
+    return motor_kpis.calcular_desde_fino(fino, agregados)
+
+
+def agregados_extra(agregados):
+    """Agregados de Oro distintos de los dos de base (que van a kpi_ejecucion y tendencia_mensual)"""
+    base = {a.nombre for a in AGREGADOS_BASE}
+    return {nombre: df for nombre, df in agregados.items() if nombre not in base}
+
+
+def calcular_kpis(df_gasto_area, df_presupuesto, batch_id):
+    """KPI de ejecucion presupuestaria por area.
+
+    Con presupuesto de varios años el gasto acumulado se compara con la
+    suma de los presupuestos del area (el detalle por año esta en
+    `calcular_kpis_anuales`).
+    """
+    presupuesto = df_presupuesto.groupby('area', observed=True, sort=False)['presupuesto_anual'].sum().reset_index()
+    df_oro = df_gasto_area.merge(presupuesto, on='area', how='left').astype({'presupuesto_anual': 'Int64'})
+    df_oro['kpi_ejecucion'] = dinero.cociente(df_oro['gasto_acumulado'], df_oro['presupuesto_anual'], 2, factor=100)
+    df_oro['kpi_ejecucion_decimal'] = dinero.cociente(df_oro['gasto_acumulado'], df_oro['presupuesto_anual'], 4)
+    df_oro['_batch_id'] = batch_id
+    df_oro['_created_at'] = datetime.now().isoformat()
+    return df_oro
+
+
+def calcular_kpis_anuales(df_gasto_anual, df_presupuesto, batch_id):
+    """KPI de ejecucion por (anio, area) contra el presupuesto de ese año.
+
+    Usa la columna `año` de presupuesto.csv; sin ella devuelve None.
+    """
+    if 'año' not in df_presupuesto.columns:
+        return None
+    presupuesto = df_presupuesto[['area', 'presupuesto_anual']].assign(
+        anio=pd.to_numeric(df_presupuesto['año'], errors='coerce').astype('Int64'))
+    df_kpi = df_gasto_anual.astype({'anio': 'Int64'}).merge(presupuesto, on=['anio', 'area'], how='left')
+    df_kpi = df_kpi.astype({'presupuesto_anual': 'Int64'})
+    df_kpi['kpi_ejecucion'] = dinero.cociente(df_kpi['gasto_anual'], df_kpi['presupuesto_anual'], 2, factor=100)
+    df_kpi['_batch_id'] = batch_id
+    return df_kpi
+
+
+def _tipo_sqlite(dtype):
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def a_centimos_sql(df):
+    """Importes en centimos con sufijo _cent: INTEGER exacto en SQLite"""
+    return df.rename(columns={c: f'{c}_cent' for c in df.columns if dinero.es_importe(c)})
+
+
+def _crear_tabla(conn, nombre, df, clave):
+    """Crea la tabla con clave primaria; una tabla antigua sin PK
+    (creada por to_sql) o con otras columnas (importes REAL de versiones
+    anteriores) se reconstruye, ya que Oro se recarga entera"""
+    columnas = conn.execute(f'PRAGMA table_info({nombre})').fetchall()
+    if columnas and (not any(c[5] for c in columnas) or [c[1] for c in columnas] != list(df.columns)):
+        conn.execute(f'DROP TABLE {nombre}')
+    definicion = ', '.join(
+        f'"{col}" {_tipo_sqlite(dtype)}' + (' NOT NULL' if col in clave else '')
+        for col, dtype in df.dtypes.items())
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {nombre} ({definicion}, PRIMARY KEY ({", ".join(clave)}))')
+
+
+def upsert(conn, nombre, df, clave):
+    """Upsert por lotes (executemany) y borrado de claves que ya no existen.
+
+    Las filas sin cambios no se reescriben (`_created_at` cambia en cada
+    carga y no cuenta como cambio). No hace commit: el llamador agrupa
+    todas las tablas en una transaccion.
+    """
+    columnas = list(df.columns)
+    valores = [c for c in columnas if c not in clave]
+    comparadas = [c for c in valores if c != '_created_at'] or valores
+    lista = ', '.join(f'"{c}"' for c in columnas)
+    conn.executemany(
+        f'INSERT INTO {nombre} ({lista}) VALUES ({", ".join("?" * len(columnas))}) '
+        f'ON CONFLICT ({", ".join(clave)}) DO UPDATE SET '
+        + ', '.join(f'"{c}" = excluded."{c}"' for c in valores)
+        + ' WHERE ' + ' OR '.join(f'"{c}" IS NOT excluded."{c}"' for c in comparadas),
+        df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+    # Todas las claves de df estan ya en la tabla: si no sobra ninguna fila,
+    # no hay claves obsoletas que borrar
+    if conn.execute(f'SELECT COUNT(*) FROM {nombre}').fetchone()[0] == len(df):
+        return
+    conn.execute('DROP TABLE IF EXISTS temp._claves')
+    conn.execute(f'CREATE TEMP TABLE _claves ({", ".join(clave)}, PRIMARY KEY ({", ".join(clave)}))')
+    conn.executemany(f'INSERT INTO temp._claves VALUES ({", ".join("?" * len(clave))})',
+                     df[clave].astype(object).itertuples(index=False, name=None))
+    conn.execute(
+        f'DELETE FROM {nombre} WHERE NOT EXISTS (SELECT 1 FROM temp._claves k WHERE '
+        + ' AND '.join(f'k.{c} = {nombre}.{c}' for c in clave) + ')')
+
+
+def conectar(ruta='project/data/gold/finanzas.db'):
+    """Conexion en modo WAL: los lectores nunca se bloquean durante una carga"""
+    conn = sqlite3.connect(ruta)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def cargar_sqlite(df_oro, df_mensual, ruta='project/data/gold/finanzas.db'):
+    """Carga las tablas de Oro y la vista v_ejecucion_detalle en SQLite.
+
+    Todas las tablas se actualizan en una unica transaccion: un lector ve
+    la version anterior completa o la nueva, nunca tablas vacias.
+    """
+    conn = conectar(ruta)
+    try:
+        # BEGIN explicito: sqlite3 no abre transaccion antes de DROP/CREATE,
+        # y un fallo a mitad perderia la tabla antigua sin crear la nueva
+        conn.execute('BEGIN')
+        with conn:
+            for nombre, df in [('kpi_ejecucion', df_oro), ('tendencia_mensual', df_mensual)]:
+                df = a_centimos_sql(df)
+                _crear_tabla(conn, nombre, df, CLAVES_ORO[nombre])
+                upsert(conn, nombre, df, CLAVES_ORO[nombre])
+            for indice in INDICES_ORO:
+                conn.execute(indice)
+            conn.execute('DROP VIEW IF EXISTS v_ejecucion_detalle')
+            conn.execute(VISTA_EJECUCION_DETALLE)
+    finally:
+        conn.close()
@@ -0,0 +1,187 @@
+"""
+Procesamiento paralelo por archivo: Ingesta + Limpieza en un pool de procesos
+Descubre los archivos de gastos de un directorio de llegada, procesa cada
+uno en un ProcessPoolExecutor (Bronce, Plata y cuarentena por particion) y
+reduce los resultados parciales en los KPIs de la capa Oro.
+
+Uso: python project/ingest/paralelo.py --landing project/data/landing --workers 4
+"""
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+import almacen
+import artefactos_oro
+import limpieza
+import manifiesto
+import oro
+from cuarentena import AlmacenCuarentena
+from ingesta import (DTYPES_GASTOS, DTYPES_PRESUPUESTO, ESQUEMA_BRONCE_GASTOS, anadir_trazabilidad, copy_on_write,
+                     leer_csv)
+
+DIR_LANDING = 'project/data/landing'
+
+
+def descubrir_archivos(landing):
+    """Archivos de gastos y de presupuesto del directorio de llegada (orden
+    estable); incluye los comprimidos (.csv.gz, .csv.zst)"""
+    gastos = sorted(glob.glob(os.path.join(landing, 'gastos*.csv*')))
+    presupuestos = sorted(glob.glob(os.path.join(landing, 'presupuesto*.csv*')))
+    return gastos, presupuestos
+
+
+@copy_on_write()
+def procesar_particion(ruta, batch_id, ingest_ts, ids_deterministas=False):
+    """Ingesta y limpieza de un archivo de gastos (se ejecuta en un worker).
+
+    Escribe Bronce, Plata y cuarentena de la particion y devuelve solo el
+    resultado parcial para la reduccion: recuentos, las claves naturales
+    deduplicadas con su importe (columnas estrechas y categoricas) y los
+    artefactos escritos.
+    """
+    nombre = os.path.basename(ruta)
+    particion = nombre.split('.')[0]
+
+    df_raw = leer_csv(ruta, dtype=DTYPES_GASTOS, columnas=list(DTYPES_GASTOS))
+    df_raw = anadir_trazabilidad(df_raw, nombre, batch_id, ingest_ts, ids_deterministas)
+    rutas_raw = almacen.escribir_gastos(df_raw, 'raw', f'{batch_id}-{particion}', ESQUEMA_BRONCE_GASTOS)
+
+    df_limpio, rechazados, causas = limpieza.limpiar_gastos(df_raw)
+    df_limpio = limpieza.deduplicar_gastos(df_limpio)
+    rutas_clean = almacen.escribir_gastos(df_limpio, 'clean', f'{batch_id}-{particion}')
+
+    # Un archivo por causa y particion; el indice se actualiza al cerrar
+    with AlmacenCuarentena(batch_id, f'{batch_id}-{particion}') as cuarentena:
+        cuarentena.anadir('gastos', rechazados, causas)
+    # Por causa, como los anota Pipeline en el manifiesto
+    por_causa = {causa: n for (t, causa), n in cuarentena.filas.items() if t == 'gastos'}
+
+    return {
+        'archivo': nombre,
+        'registros': len(df_raw),
+        'validos': len(df_limpio),
+        'cuarentena': por_causa,
+        'claves': df_limpio[limpieza.CLAVE_NATURAL + ['importe']],
+        'artefactos': {'raw': rutas_raw, 'clean': rutas_clean},
+    }
+
+
+def parcial_desde_cache(entrada):
+    """Resultado parcial de un archivo sin cambios, desde la Plata que ya
+    escribio: solo se leen las columnas de la clave y el importe"""
+    estadisticas = entrada.estadisticas
+    return {
+        'archivo': os.path.basename(entrada.ruta),
+        'registros': estadisticas['registros'],
+        'validos': estadisticas['validos'],
+        'cuarentena': estadisticas['cuarentena'],
+        'claves': almacen.leer_archivos(entrada.artefactos['clean'], columnas=limpieza.CLAVE_NATURAL + ['importe']),
+        'artefactos': entrada.artefactos,
+        'en_cache': True,
+    }
+
+
+def reducir(parciales):
+    """Une las claves de todas las particiones en orden de archivo.
+
+    Una clave repetida entre archivos se resuelve igual que en serie: gana
+    el registro del ultimo archivo. Devuelve los agregados de Oro.
+    """
+    claves = limpieza.concatenar([p['claves'] for p in parciales])
+    claves = claves.drop_duplicates(subset=limpieza.CLAVE_NATURAL, keep='last')
+    return oro.agregar(claves)
+
+
+@copy_on_write()
+def ejecutar(landing=DIR_LANDING, workers=None, batch_id=None, ids_deterministas=False, cache_entradas=False):
+    """Procesa todos los archivos del directorio de llegada y genera Oro.
+
+    workers=1 ejecuta en serie en el propio proceso (referencia para
+    comparar resultados). Con cache_entradas, los archivos de gastos cuyo
+    contenido ya esta en el manifiesto no van al pool: su parcial se lee
+    de la Plata que escribieron. Devuelve (df_oro, df_mensual, parciales).
+    """
+    batch_id = batch_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+    ingest_ts = datetime.now().isoformat()
+    for carpeta in ['raw', 'clean', 'gold', 'quarantine']:
+        os.makedirs(f'project/data/{carpeta}', exist_ok=True)
+
+    rutas_gastos, rutas_presupuesto = descubrir_archivos(landing)
+    if not rutas_gastos or not rutas_presupuesto:
+        raise FileNotFoundError(f'No hay gastos*.csv y presupuesto*.csv en {landing}')
+
+    print(f"Batch ID: {batch_id} | {len(rutas_gastos)} archivos de gastos | workers: {workers or os.cpu_count()}")
+
+    entradas = {}
+    if cache_entradas:
+        conn = manifiesto.abrir_manifiesto()
+        entradas = {r: manifiesto.consultar(conn, r, batch_id) for r in rutas_gastos}
+        conn.close()
+    parciales = {r: parcial_desde_cache(e) for r, e in entradas.items() if e.en_cache}
+    pendientes = [r for r in rutas_gastos if r not in parciales]
+
+    if workers == 1:
+        parciales.update((r, procesar_particion(r, batch_id, ingest_ts, ids_deterministas)) for r in pendientes)
+    elif pendientes:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = {r: pool.submit(procesar_particion, r, batch_id, ingest_ts, ids_deterministas)
+                       for r in pendientes}
+            parciales.update((r, f.result()) for r, f in futuros.items())
+    # La reduccion va en orden de archivo, no de finalizacion
+    parciales = [parciales[r] for r in rutas_gastos]
+
+    for p in parciales:
+        origen = ' (cache)' if p.get('en_cache') else ''
+        print(f"   {p['archivo']}: {p['validos']}/{p['registros']} validos, {sum(p['cuarentena'].values())} en cuarentena{origen}")
+
+    df_presupuesto_raw = pd.concat([leer_csv(r, dtype=DTYPES_PRESUPUESTO) for r in rutas_presupuesto], ignore_index=True)
+    df_presupuesto_raw = anadir_trazabilidad(df_presupuesto_raw, 'presupuesto.csv', batch_id, ingest_ts, ids_deterministas)
+    df_presupuesto, rechazados, causas = limpieza.limpiar_presupuesto(df_presupuesto_raw)
+    with AlmacenCuarentena(batch_id) as cuarentena:
+        cuarentena.anadir('presupuesto', rechazados, causas)
+
+    agregados = reducir(parciales)
+    df_oro = oro.calcular_kpis(agregados['gasto_area'], df_presupuesto, batch_id)
+    df_mensual = agregados['tendencia_mensual']
+    extra = oro.agregados_extra(agregados)
+    df_kpi_anual = oro.calcular_kpis_anuales(extra['gasto_anual'], df_presupuesto, batch_id)
+    if df_kpi_anual is not None:
+        extra['kpi_ejecucion_anual'] = df_kpi_anual
+
+    # Sin contexto de reporte: paralelo no genera reporte.md
+    artefactos_oro.escribir_parquet(df_oro, artefactos_oro.RUTA_KPIS)
+    artefactos_oro.escribir_parquet(df_mensual, artefactos_oro.RUTA_MENSUAL)
+    for nombre, df in extra.items():
+        artefactos_oro.escribir_parquet(df, os.path.join(artefactos_oro.DIR_ORO, f'{nombre}.parquet'))
+    oro.cargar_sqlite(df_oro, df_mensual)
+    print(f"   KPI calculado para {len(df_oro)} areas -> project/data/gold/")
+
+    if cache_entradas:
+        # Solo tras escribir Oro: un fallo a mitad no registra artefactos
+        for ruta, p in zip(rutas_gastos, parciales):
+            entrada = entradas[ruta]
+            if not entrada.en_cache:
+                entrada.artefactos.update(p['artefactos'])
+                entrada.estadisticas.update(registros=p['registros'], validos=p['validos'],
+                                            cuarentena=p['cuarentena'])
+        conn = manifiesto.abrir_manifiesto()
+        manifiesto.registrar(conn, entradas.values())
+        conn.close()
+    return df_oro, df_mensual, parciales
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingesta + limpieza en paralelo por archivo')
+    parser.add_argument('--landing', default=DIR_LANDING, help='Directorio de llegada de archivos')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos del pool (por defecto, numero de CPUs; 1 = en serie)')
+    parser.add_argument('--batch-id', default=None)
+    parser.add_argument('--ids-deterministas', action='store_true')
+    parser.add_argument('--cache-entradas', action='store_true',
+                        help='No reprocesa los archivos de gastos sin cambios (manifiesto de huellas)')
+    args = parser.parse_args()
+    ejecutar(args.landing, args.workers, args.batch_id, args.ids_deterministas, args.cache_entradas)
@@ -0,0 +1,606 @@
+"""
+API del pipeline ETL: Ingesta -> Limpieza -> Oro -> Reporte
+Cada fase es un metodo que recibe y devuelve datos, sin efectos al
+importar el modulo. Un proceso de larga duracion (p. ej. un worker de un
+planificador) crea un Pipeline una vez y ejecuta muchos batches seguidos
+sin volver a pagar el arranque de Python, pandas y pyarrow:
+
+    from pipeline import Pipeline
+
+    p = Pipeline(incremental=True)
+    for batch_id in batches:
+        p.ejecutar(batch_id)
+
+o fase a fase:
+
+    lote = p.nuevo_lote('2024_11')
+    bronce = p.ingest(lote)
+    plata = p.clean(lote, bronce)
+    datos_oro = p.gold(lote, plata)
+    p.report(lote, plata, datos_oro)
+
+`run.py` es la interfaz de linea de comandos sobre esta API.
+"""
+import os
+from collections import namedtuple
+from datetime import datetime
+from functools import partial
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import almacen
+import cuarentena as almacen_cuarentena
+import artefactos_oro
+import dinero
+import escritura
+import estado_oro
+import indice_dedup
+import limpieza
+import manifiesto
+import metricas
+import oro
+import reporte
+from ingesta import (COLUMNAS_TRAZABILIDAD, DTYPES_GASTOS, DTYPES_PRESUPUESTO, ESQUEMA_BRONCE_GASTOS,
+                     anadir_trazabilidad, buscar_csv, copy_on_write, leer_csv)
+
+DIRECTORIOS = ['project/data/raw', 'project/data/clean', 'project/data/gold',
+               'project/data/quarantine', 'project/output']
+
+# Identidad de un batch: todas las fases comparten BATCH_ID e INGEST_TS
+Lote = namedtuple('Lote', ['batch_id', 'ingest_ts'])
+# gastos es un DataFrame o, en streaming, un iterador de bloques (None si
+# se sirve desde la cache de entradas); entradas: {archivo: manifiesto.Entrada}
+Bronce = namedtuple('Bronce', ['gastos', 'presupuesto', 'entradas'], defaults=[None])
+# indice: indice_dedup.Cambios pendientes de confirmar con Oro (con dedup_global)
+Plata = namedtuple('Plata', ['gastos', 'presupuesto', 'cuarentena', 'reemplazados', 'registros_gastos',
+                             'registros_presupuesto', 'duplicados_eliminados', 'supersesiones', 'entradas',
+                             'indice'],
+                   defaults=[None, None])
+# agregados: {nombre: DataFrame} adicionales del motor de KPIs
+Oro = namedtuple('Oro', ['kpis', 'mensual', 'agregados'])
+# plata, oro y reporte son None si todas las entradas estaban en cache
+Resultado = namedtuple('Resultado', ['lote', 'plata', 'oro', 'reporte'])
+# Columnas de Plata de gastos al releerla desde sus artefactos
+COLUMNAS_PLATA_GASTOS = ['fecha', 'area', 'partida', 'importe'] + COLUMNAS_TRAZABILIDAD
+
+
+class Pipeline:
+    """Configuracion del ETL y sus fases.
+
+    chunksize: filas por bloque al leer gastos (0 = todo en memoria).
+    incremental: Oro fusiona los deltas del batch en el estado acumulado.
+    dedup_global: deduplica tambien contra batches anteriores.
+    ids_deterministas: _event_id derivado de BATCH_ID + offset de fila.
+    con_metricas: registra metricas por etapa de cada batch.
+    cache_entradas: no reingiere los archivos cuyo contenido ya esta en el
+        manifiesto de entradas; se sirven desde su Bronce/Plata.
+    hilos_escritura: en `ejecutar`, hilos que escriben Parquet y SQLite en
+        segundo plano mientras calcula la fase siguiente (0 = en el momento).
+    """
+
+    def __init__(self, ruta_gastos='project/data/gastos.csv', ruta_presupuesto='project/data/presupuesto.csv',
+                 chunksize=0, incremental=False, dedup_global=False, ids_deterministas=False,
+                 con_metricas=False, cache_entradas=False, hilos_escritura=2):
+        self.ruta_gastos = ruta_gastos
+        self.ruta_presupuesto = ruta_presupuesto
+        self.chunksize = chunksize
+        self.incremental = incremental
+        self.dedup_global = dedup_global
+        self.ids_deterministas = ids_deterministas
+        self.con_metricas = con_metricas
+        self.cache_entradas = cache_entradas
+        self.hilos_escritura = hilos_escritura
+        self._escritor = None
+
+    def _escribir(self, etapa, etiqueta, fn, *args, filas=None):
+        """Escritura en segundo plano dentro de `ejecutar`; fuera, en el momento.
+
+        Los DataFrames se pasan como instantanea (copia superficial): la
+        fase siguiente puede anadir o sustituir columnas sin afectar a la
+        escritura en curso. La etapa de metricas `etapa` mide la escritura
+        en el hilo que la ejecuta, no el encolado.
+        """
+        args = [a.copy(deep=False) if isinstance(a, pd.DataFrame) else a for a in args]
+        fn = metricas.diferida(etapa, fn, filas)
+        if self._escritor is None:
+            fn(*args)
+        else:
+            self._escritor.enviar(etiqueta, fn, *args)
+
+    def nuevo_lote(self, batch_id=None):
+        """Lote con BATCH_ID dado o, por defecto, el timestamp actual"""
+        return Lote(batch_id or datetime.now().strftime('%Y%m%d_%H%M%S'), datetime.now().isoformat())
+
+    # ==================== FASE 1: INGESTA (BRONCE) ====================
+    def _trazar(self, lote, df, source_name, offset=0):
+        """Metadatos de trazabilidad con el BATCH_ID/INGEST_TS del lote"""
+        return anadir_trazabilidad(df, source_name, lote.batch_id, lote.ingest_ts, self.ids_deterministas, offset)
+
+    def _leer_por_bloques(self, lote, lector, source_name):
+        """Bloques etiquetados de un lector por bloques, midiendo cada lectura"""
+        while True:
+            with metricas.etapa('read_csv') as e:
+                bloque = next(lector, None)
+                e['filas_salida'] = 0 if bloque is None else len(bloque)
+            if bloque is None:
+                return
+            with metricas.etapa('trazabilidad', len(bloque)):
+                bloque = self._trazar(lote, bloque, source_name, offset=bloque.index[0])
+            yield bloque
+
+    def ingerir_con_trazabilidad(self, lote, filepath, source_name, chunksize=None, dtype=None, columnas=None):
+        """Ingesta datos con metadatos de trazabilidad
+
+        Con chunksize devuelve un iterador de bloques ya etiquetados en lugar
+        de un unico DataFrame, para no cargar el CSV completo en memoria.
+        Acepta tambien la version comprimida del archivo (.gz, .zst).
+        """
+        filepath = buscar_csv(filepath)
+        print(f"\nIngiriendo: {filepath}")
+
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"No se encuentra {filepath}")
+
+        if chunksize:
+            print(f"   Lectura por bloques de {chunksize} filas")
+            lector = leer_csv(filepath, dtype=dtype, chunksize=chunksize, columnas=columnas)
+            return self._leer_por_bloques(lote, lector, source_name)
+
+        with metricas.etapa('read_csv') as e:
+            df = leer_csv(filepath, dtype=dtype, columnas=columnas)
+            e['filas_salida'] = len(df)
+        with metricas.etapa('trazabilidad', len(df)):
+            df = self._trazar(lote, df, source_name)
+
+        print(f"   Registros cargados: {len(df)}")
+        return df
+
+    def consultar_entradas(self, lote):
+        """Entrada del manifiesto de cada archivo de entrada (en cache o nueva)"""
+        entradas = {}
+        conn = manifiesto.abrir_manifiesto()
+        for source_name, ruta in [('gastos.csv', self.ruta_gastos), ('presupuesto.csv', self.ruta_presupuesto)]:
+            ruta = buscar_csv(ruta)
+            if not os.path.exists(ruta):
+                conn.close()
+                raise FileNotFoundError(f"No se encuentra {ruta}")
+            with metricas.etapa('huella'):
+                entradas[source_name] = manifiesto.consultar(conn, ruta, lote.batch_id)
+        conn.close()
+        return entradas
+
+    def ingest(self, lote):
+        """Lee gastos y presupuesto y escribe Bronce. Devuelve Bronce.
+
+        En streaming los gastos se devuelven como iterador y su Bronce se
+        escribe bloque a bloque en `clean`. Con cache_entradas, los
+        archivos sin cambios no se leen (quedan a None en Bronce).
+        """
+        print("\n" + "="*60)
+        print("FASE 1: INGESTA - CAPA BRONCE (RAW)")
+        print("="*60)
+        metricas.abrir('fase1_ingesta')
+
+        entradas = self.consultar_entradas(lote) if self.cache_entradas else None
+        for source_name, entrada in (entradas or {}).items():
+            if entrada.en_cache:
+                print(f"\n{source_name} sin cambios ({entrada.huella.hash[:12]}): "
+                      f"se reutiliza el Bronce/Plata del batch {entrada.batch_id}")
+
+        df_gastos_raw = None
+        if not _en_cache(entradas, 'gastos.csv'):
+            df_gastos_raw = self.ingerir_con_trazabilidad(lote, self.ruta_gastos, 'gastos.csv',
+                                                          chunksize=self.chunksize, dtype=DTYPES_GASTOS,
+                                                          columnas=list(DTYPES_GASTOS))
+        df_presupuesto_raw = None
+        if not _en_cache(entradas, 'presupuesto.csv'):
+            df_presupuesto_raw = self.ingerir_con_trazabilidad(lote, self.ruta_presupuesto, 'presupuesto.csv',
+                                                               dtype=DTYPES_PRESUPUESTO)
+
+        # Guardar en capa BRONCE (Parquet)
+        print("\nGuardando en capa BRONCE (Parquet)...")
+        if df_gastos_raw is not None and not self.chunksize:
+            self._escribir('parquet_bronce', 'bronce gastos', _escribir_gastos, entradas, 'gastos.csv',
+                           df_gastos_raw, 'raw', lote.batch_id, ESQUEMA_BRONCE_GASTOS, filas=len(df_gastos_raw))
+        if df_presupuesto_raw is not None:
+            self._escribir('parquet_bronce', 'bronce presupuesto', _escribir_presupuesto, entradas, df_presupuesto_raw,
+                           'raw', f'project/data/raw/presupuesto_batch_{lote.batch_id}.parquet',
+                           filas=len(df_presupuesto_raw))
+        print("   Datos guardados en project/data/raw/")
+        metricas.cerrar(None if self.chunksize or df_gastos_raw is None else len(df_gastos_raw))
+        return Bronce(df_gastos_raw, df_presupuesto_raw, entradas)
+
+    # ==================== FASE 2: LIMPIEZA (PLATA) ====================
+    def _enviar_a_cuarentena(self, cuarentena, tabla, df, causa):
+        """Envia registros invalidos al almacen de cuarentena con la causa.
+
+        causa puede ser un texto unico o una causa por fila (Categorical).
+        """
+        if len(df) > 0:
+            with metricas.etapa('cuarentena', len(df)):
+                por_causa = cuarentena.anadir(tabla, df, causa)
+            for motivo, n in por_causa.items():
+                if n > 0:
+                    print(f"   {n} registros -> CUARENTENA: {motivo}")
+
+    def _limpiar_gastos(self, cuarentena, df_gastos, verbose=True):
+        """Aplica validaciones y normalizacion a gastos (sin deduplicar)"""
+        if verbose:
+            print(f"   Validando {len(limpieza.REGLAS_GASTOS)} reglas en una pasada: "
+                  + ", ".join(r.causa for r in limpieza.REGLAS_GASTOS))
+
+        with metricas.etapa('validacion', len(df_gastos)) as e:
+            df_gastos, rechazados, causas = limpieza.limpiar_gastos(df_gastos)
+            e['filas_salida'] = len(df_gastos)
+        self._enviar_a_cuarentena(cuarentena, 'gastos', rechazados, causas)
+        return df_gastos
+
+    def _procesar_gastos_por_bloques(self, lote, cuarentena, bloques):
+        """Bronce + limpieza bloque a bloque.
+
+        Cada bloque se escribe como un row group de los Parquet bronce de sus
+        particiones y pasa por las validaciones; solo se retiene el estado
+        deduplicado por clave natural, cuyo tamano depende de la cardinalidad
+        de la clave y no del numero de filas del fichero.
+        """
+        estado = None
+        n_raw = 0
+        n_validos = 0
+        n_bloques = 0
+        with almacen.EscritorParticionado('raw', lote.batch_id, ESQUEMA_BRONCE_GASTOS) as bronce:
+            for bloque in bloques:
+                n_raw += len(bloque)
+                with metricas.etapa('parquet_bronce', len(bloque)):
+                    bronce.escribir(bloque)
+
+                limpio = self._limpiar_gastos(cuarentena, bloque, verbose=(n_bloques == 0))
+                n_bloques += 1
+                n_validos += len(limpio)
+                with metricas.etapa('dedup', len(limpio)) as e:
+                    estado = limpio if estado is None else limpieza.concatenar([estado, limpio])
+                    estado = limpieza.deduplicar_gastos(estado)
+                    e['filas_salida'] = len(estado)
+
+        print(f"   Bloques procesados: {n_bloques}")
+        return estado, n_raw, n_validos, bronce.rutas
+
+    def clean(self, lote, bronce, indice_pendiente=None):
+        """Valida, deduplica y escribe Plata y cuarentena. Devuelve Plata.
+
+        Con dedup_global el indice de clave natural no se modifica aqui: sus
+        cambios viajan en Plata.indice y se confirman con Oro.
+        indice_pendiente son cambios de batches anteriores aun sin confirmar.
+        """
+        print("\n" + "="*60)
+        print("FASE 2: LIMPIEZA Y VALIDACION - CAPA PLATA (CLEAN)")
+        print("="*60)
+        metricas.abrir('fase2_limpieza')
+        # Los rechazados se escriben segun se detectan, no se acumulan
+        cuarentena = almacen_cuarentena.AlmacenCuarentena(lote.batch_id)
+
+        entradas = bronce.entradas
+        en_cache = {}  # {archivo: estadisticas} de las entradas servidas desde la cache
+
+        print("\nLimpiando GASTOS...")
+
+        if _en_cache(entradas, 'gastos.csv'):
+            entrada = entradas['gastos.csv']
+            with metricas.etapa('plata_cache') as e:
+                df_gastos = almacen.leer_archivos(entrada.artefactos['clean'], columnas=COLUMNAS_PLATA_GASTOS)
+                e['filas_salida'] = len(df_gastos)
+            en_cache['gastos.csv'] = entrada.estadisticas
+            registros_iniciales = entrada.estadisticas['registros']
+            duplicados_eliminados = entrada.estadisticas['duplicados_eliminados']
+            print(f"   Plata de gastos servida desde la cache (batch {entrada.batch_id}): {len(df_gastos)} registros")
+        else:
+            if self.chunksize:
+                df_gastos, registros_iniciales, duplicados_antes, rutas_bronce = self._procesar_gastos_por_bloques(
+                    lote, cuarentena, bronce.gastos)
+                _anotar(entradas, 'gastos.csv', raw=rutas_bronce)
+                print("   Bronce de gastos escrito por bloques en project/data/raw/gastos/")
+            else:
+                registros_iniciales = len(bronce.gastos)
+                df_gastos = self._limpiar_gastos(cuarentena, bronce.gastos)
+                duplicados_antes = len(df_gastos)
+
+            # 7. DEDUPLICACION
+            print("   Deduplicando registros...")
+            print("      Politica: Clave natural = (fecha, area, partida)")
+            print("      Estrategia: Ultimo registro gana (mayor _ingest_ts)")
+
+            with metricas.etapa('dedup', len(df_gastos)) as e:
+                df_gastos = limpieza.deduplicar_gastos(df_gastos)
+                e['filas_salida'] = len(df_gastos)
+            duplicados_eliminados = duplicados_antes - len(df_gastos)
+            print(f"      Duplicados eliminados: {duplicados_eliminados}")
+
+        supersesiones = 0
+        df_reemplazados = None
+        cambios_indice = None
+        if self.dedup_global:
+            print("   Deduplicando contra batches anteriores (indice de clave natural)...")
+            with metricas.etapa('dedup_global', len(df_gastos)) as e:
+                conn_indice = indice_dedup.abrir_indice()
+                df_gastos, cambios_indice, supersesiones, obsoletos = indice_dedup.resolver_batch(
+                    conn_indice, df_gastos, indice_pendiente)
+                conn_indice.close()
+                df_reemplazados = indice_dedup.reemplazados(cambios_indice)
+                e['filas_salida'] = len(df_gastos)
+            duplicados_eliminados += obsoletos
+            print(f"      Supersesiones entre batches: {supersesiones}")
+            print(f"      Registros obsoletos descartados: {obsoletos}")
+
+        print(f"\n   GASTOS limpiados: {len(df_gastos)}/{registros_iniciales} registros validos")
+
+        # ========== LIMPIEZA DE PRESUPUESTO ==========
+        print("\nLimpiando PRESUPUESTO...")
+
+        if _en_cache(entradas, 'presupuesto.csv'):
+            entrada = entradas['presupuesto.csv']
+            with metricas.etapa('plata_cache') as e:
+                df_presupuesto = dinero.a_pandas(pq.read_table(entrada.artefactos['clean'][0]))
+                e['filas_salida'] = len(df_presupuesto)
+            en_cache['presupuesto.csv'] = entrada.estadisticas
+            registros_iniciales_pres = entrada.estadisticas['registros']
+            print(f"   Plata de presupuesto servida desde la cache (batch {entrada.batch_id})")
+        else:
+            registros_iniciales_pres = len(bronce.presupuesto)
+
+            with metricas.etapa('validacion_presupuesto', registros_iniciales_pres) as e:
+                df_presupuesto, rechazados_pres, causas_pres = limpieza.limpiar_presupuesto(bronce.presupuesto)
+                e['filas_salida'] = len(df_presupuesto)
+            self._enviar_a_cuarentena(cuarentena, 'presupuesto', rechazados_pres, causas_pres)
+
+        print(f"   PRESUPUESTO limpiado: {len(df_presupuesto)}/{registros_iniciales_pres} registros")
+
+        # ========== GUARDAR CUARENTENA ==========
+        conteos_cuarentena = cuarentena.conteos()
+        with metricas.etapa('parquet_cuarentena') as e:
+            cuarentena.cerrar()
+            e['filas_salida'] = int(conteos_cuarentena.sum())
+        if len(conteos_cuarentena) > 0:
+            print(f"\nCUARENTENA: {conteos_cuarentena.sum()} registros totales en {len(cuarentena.filas)} particiones "
+                  f"por causa -> {almacen_cuarentena.DIR_CUARENTENA}/")
+        # Los rechazados de las entradas en cache ya estan en la cuarentena de su batch
+        for estadisticas in en_cache.values():
+            conteos_cuarentena = conteos_cuarentena.add(
+                pd.Series(estadisticas['cuarentena'], dtype='int64'), fill_value=0).astype('int64')
+
+        # ========== GUARDAR CAPA PLATA ==========
+        print("\nGuardando en capa PLATA (Parquet)...")
+        if 'gastos.csv' not in en_cache:
+            self._escribir('parquet_plata', 'plata gastos', _escribir_gastos, entradas, 'gastos.csv', df_gastos,
+                           'clean', lote.batch_id, filas=len(df_gastos))
+            _anotar_estadisticas(entradas, 'gastos.csv', cuarentena, registros=int(registros_iniciales),
+                                 validos=len(df_gastos), duplicados_eliminados=int(duplicados_eliminados))
+        if 'presupuesto.csv' not in en_cache:
+            self._escribir('parquet_plata', 'plata presupuesto', _escribir_presupuesto, entradas, df_presupuesto,
+                           'clean', f'project/data/clean/presupuesto_clean_batch_{lote.batch_id}.parquet',
+                           filas=len(df_presupuesto))
+            _anotar_estadisticas(entradas, 'presupuesto.csv', cuarentena,
+                                 registros=int(registros_iniciales_pres), validos=len(df_presupuesto))
+        print("   Datos limpios guardados en project/data/clean/")
+        metricas.cerrar(len(df_gastos))
+
+        return Plata(df_gastos, df_presupuesto, conteos_cuarentena, df_reemplazados, registros_iniciales,
+                     registros_iniciales_pres, duplicados_eliminados, supersesiones, entradas, cambios_indice)
+
+    # ==================== FASE 3: CAPA ORO ====================
+    def gold(self, lote, plata):
+        """Agrega gastos, calcula KPIs y carga Parquet + SQLite. Devuelve Oro."""
+        print("\n" + "="*60)
+        print("FASE 3: MODELADO ANALITICO - CAPA ORO (GOLD)")
+        print("="*60)
+        metricas.abrir('fase3_oro', len(plata.gastos))
+
+        print("\nCalculando KPIs...")
+
+        if self.incremental:
+            # Solo se agregan las filas de este batch; los totales vienen del estado
+            conn_estado = estado_oro.abrir_estado()
+            with metricas.etapa('groupby', len(plata.gastos)):
+                # Gastos servidos desde la cache: sus deltas son los del batch que los ingirio
+                batch_gastos = _batch_gastos(lote, plata.entradas)
+                # El indice de deduplicacion se confirma con los deltas y la marca de agua
+                confirmar_indice = None
+                if plata.indice is not None:
+                    confirmar_indice = partial(indice_dedup.aplicar, cambios=plata.indice)
+                aplicado = estado_oro.aplicar_batch(conn_estado, batch_gastos, plata.gastos, plata.reemplazados,
+                                                    en_transaccion=confirmar_indice)
+            if aplicado:
+                print(f"   Deltas del batch {batch_gastos} fusionados en el estado acumulado")
+            else:
+                print(f"   Batch {batch_gastos} ya procesado: sin cambios en el estado (no-op)")
+            df_gasto_area, df_mensual = estado_oro.leer_totales(conn_estado)
+            tipo_area = pd.CategoricalDtype(limpieza.areas_validas)
+            df_gasto_area['area'] = df_gasto_area['area'].astype(tipo_area)
+            df_mensual['area'] = df_mensual['area'].astype(tipo_area)
+            conn_estado.close()
+            # Los agregados extra salen de los totales acumulados (mes, area)
+            agregados = oro.agregados_extra(oro.agregar_desde_totales(df_mensual))
+        else:
+            # Una sola pasada sobre Plata para todos los agregados del motor de KPIs
+            with metricas.etapa('groupby', len(plata.gastos)) as e:
+                agregados = oro.agregar(plata.gastos)
+                df_gasto_area, df_mensual = agregados['gasto_area'], agregados['tendencia_mensual']
+                agregados = oro.agregados_extra(agregados)
+                e['filas_salida'] = len(df_mensual)
+
+        with metricas.etapa('kpis', len(df_gasto_area)) as e:
+            df_oro = oro.calcular_kpis(df_gasto_area, plata.presupuesto, lote.batch_id)
+            if 'gasto_anual' in agregados:
+                df_kpi_anual = oro.calcular_kpis_anuales(agregados['gasto_anual'], plata.presupuesto, lote.batch_id)
+                if df_kpi_anual is not None:
+                    agregados['kpi_ejecucion_anual'] = df_kpi_anual
+            e['filas_salida'] = len(df_oro)
+
+        print(f"   KPI calculado para {len(df_oro)} areas")
+
+        print("\nGuardando en capa ORO...")
+        # El contexto del batch viaja con los KPIs para poder regenerar el reporte solo desde Oro
+        contexto = self._contexto_reporte(lote, plata)
+        self._escribir('parquet_oro', 'oro kpi_ejecucion', artefactos_oro.escribir_parquet, df_oro,
+                       artefactos_oro.RUTA_KPIS, {'reporte': contexto._asdict()}, filas=len(df_oro))
+        self._escribir('parquet_oro', 'oro tendencia_mensual', artefactos_oro.escribir_parquet, df_mensual,
+                       artefactos_oro.RUTA_MENSUAL, filas=len(df_mensual))
+        for nombre, df in agregados.items():
+            self._escribir('parquet_oro', f'oro {nombre}', artefactos_oro.escribir_parquet, df,
+                           os.path.join(artefactos_oro.DIR_ORO, f'{nombre}.parquet'), filas=len(df))
+        print(f"   Agregados adicionales: {', '.join(agregados) or '(ninguno)'}")
+
+        # ========== SQLITE ==========
+        print("\nCreando base de datos SQLite...")
+        self._escribir('sqlite', 'sqlite', oro.cargar_sqlite, df_oro, df_mensual, filas=len(df_oro) + len(df_mensual))
+        print("   SQLite creado: project/data/gold/finanzas.db")
+        print("   Vista creada: v_ejecucion_detalle")
+        metricas.cerrar(len(df_oro))
+        return Oro(df_oro, df_mensual, agregados)
+
+    def _contexto_reporte(self, lote, plata):
+        """Datos del batch para el reporte (tipos nativos: se guardan como JSON)"""
+        fechas = plata.gastos['fecha']
+        return reporte.ContextoReporte(
+            lote.batch_id, lote.ingest_ts, len(plata.gastos), int(plata.cuarentena.sum()),
+            fechas.min().strftime('%Y-%m-%d'), fechas.max().strftime('%Y-%m-%d'),
+            int(plata.registros_gastos), int(plata.registros_presupuesto),
+            int(plata.duplicados_eliminados), int(plata.supersesiones))
+
+    # ==================== FASE 4: REPORTE MARKDOWN ====================
+    def report(self, lote, plata, datos_oro, ruta='project/output/reporte.md'):
+        """Genera el reporte Markdown del batch. Devuelve su ruta."""
+        print("\n" + "="*60)
+        print("FASE 4: GENERANDO REPORTE MARKDOWN")
+        print("="*60)
+        metricas.abrir('fase4_reporte', len(datos_oro.kpis))
+
+        with metricas.etapa('render'):
+            reporte.generar_reporte(datos_oro.kpis, datos_oro.mensual, self._contexto_reporte(lote, plata), ruta)
+        metricas.cerrar()
+
+        print(f"\nReporte generado: {ruta}")
+        return ruta
+
+    # ==================== EJECUCION COMPLETA ====================
+    @copy_on_write()
+    def ejecutar(self, batch_id=None):
+        """Ejecuta las cuatro fases para un batch. Devuelve Resultado.
+
+        Copy-on-Write solo durante la ejecucion (ingesta.copy_on_write): las
+        copias superficiales que se entregan a las escrituras en segundo
+        plano son instantaneas sin copiar datos.
+        """
+        for carpeta in DIRECTORIOS:
+            os.makedirs(carpeta, exist_ok=True)
+        lote = self.nuevo_lote(batch_id)
+        if self.con_metricas:
+            metricas.activar(lote.batch_id)
+
+        print(f"""
+============================================================
+  PIPELINE ETL - FINANZAS (Presupuesto vs Gasto)
+============================================================
+
+Batch ID: {lote.batch_id}
+Timestamp: {lote.ingest_ts}
+Modo: {'streaming (' + str(self.chunksize) + ' filas/bloque)' if self.chunksize else 'en memoria'}
+""")
+        try:
+            # Las escrituras de cada fase se solapan con el calculo de la siguiente;
+            # al salir del bloque, barrera que espera todas y propaga sus errores
+            with escritura.EscritorFondo(self.hilos_escritura) as self._escritor:
+                bronce = self.ingest(lote)
+                if bronce.entradas and all(e.en_cache for e in bronce.entradas.values()):
+                    print("\nEntradas sin cambios desde su ultima ingesta: Plata, Oro y el reporte ya estan al dia")
+                    return Resultado(lote, None, None, None)
+                plata = self.clean(lote, bronce)
+                datos_oro = self.gold(lote, plata)
+                ruta_reporte = self.report(lote, plata, datos_oro)
+                with metricas.etapa('espera_escrituras'):
+                    self._escritor.esperar()
+            if plata.indice is not None and not self.incremental:
+                # Sin estado incremental, el indice se confirma cuando Oro ya esta escrito
+                conn = indice_dedup.abrir_indice()
+                indice_dedup.registrar(conn, plata.indice)
+                conn.close()
+            if plata.entradas:
+                # Solo un batch completo entra en el manifiesto
+                conn = manifiesto.abrir_manifiesto()
+                manifiesto.registrar(conn, plata.entradas.values())
+                conn.close()
+            self._imprimir_resumen(plata, datos_oro)
+            if self.con_metricas:
+                ruta_metricas = metricas.activa().guardar()
+                print("Metricas por etapa:")
+                print(metricas.activa().resumen())
+                print(f"\nMetricas guardadas: {ruta_metricas} (+ .parquet)")
+        finally:
+            self._escritor = None
+            if self.con_metricas:
+                metricas.desactivar()
+        return Resultado(lote, plata, datos_oro, ruta_reporte)
+
+    def _imprimir_resumen(self, plata, datos_oro):
+        print("\n" + "="*60)
+        print("PIPELINE COMPLETADO EXITOSAMENTE")
+        print("="*60)
+        print(f"""
+Resumen de Procesamiento:
+   - Registros procesados: {plata.registros_gastos} gastos, {plata.registros_presupuesto} presupuestos
+   - Registros validos: {len(plata.gastos)} gastos
+   - Registros en cuarentena: {int(plata.cuarentena.sum())}
+   - Duplicados eliminados: {plata.duplicados_eliminados}
+   - Supersesiones entre batches: {plata.supersesiones}
+   - KPIs generados: {len(datos_oro.kpis)} areas
+
+Archivos generados:
+   - Bronce: project/data/raw/gastos/anio=*/mes=*/ (+ presupuesto_batch_*.parquet)
+   - Plata: project/data/clean/gastos/anio=*/mes=*/area=*/ (+ presupuesto_clean_batch_*.parquet)
+   - Oro: project/data/gold/*.parquet
+   - SQLite: project/data/gold/finanzas.db
+   - Reporte: project/output/reporte.md
+   - Cuarentena: project/data/quarantine/*.parquet
+
+Proximos pasos:
+   1. Revisa el reporte: project/output/reporte.md
+   2. (Opcional) Publica en Quartz: python project/tools/copy_report_to_site.py
+   3. Consulta la BD SQLite para analisis adicionales
+""")
+
+
+# ==================== CACHE DE ENTRADAS ====================
+def _en_cache(entradas, source_name):
+    return entradas is not None and entradas[source_name].en_cache
+
+
+def _anotar(entradas, source_name, **rutas_por_capa):
+    """Anade artefactos a la entrada nueva del archivo (sin cache, no hace nada)"""
+    if entradas is not None:
+        entradas[source_name].artefactos.update(rutas_por_capa)
+
+
+def _anotar_estadisticas(entradas, source_name, cuarentena, **recuentos):
+    """Recuentos de la entrada nueva, con sus rechazados por causa"""
+    if entradas is not None:
+        tabla = source_name.split('.')[0]
+        por_causa = {causa: n for (t, causa), n in cuarentena.filas.items() if t == tabla}
+        entradas[source_name].estadisticas.update(recuentos, cuarentena=por_causa)
+
+
+def _escribir_gastos(entradas, source_name, df, capa, batch_id, esquema=None):
+    _anotar(entradas, source_name, **{capa: almacen.escribir_gastos(df, capa, batch_id, esquema)})
+
+
+def _escribir_presupuesto(entradas, df, capa, ruta):
+    """Presupuesto de Bronce (texto tal cual) o de Plata (importes DECIMAL)"""
+    with escritura.atomica(ruta) as temporal:
+        if capa == 'raw':
+            df.to_parquet(temporal, index=False)
+        else:
+            pq.write_table(dinero.a_tabla(df), temporal, **dinero.OPCIONES_PARQUET)
+    _anotar(entradas, 'presupuesto.csv', **{capa: [ruta]})
+
+
+def _batch_gastos(lote, entradas):
+    """Batch que ingirio los gastos: el de la cache o el actual"""
+    return entradas['gastos.csv'].batch_id if _en_cache(entradas, 'gastos.csv') else lote.batch_id
@@ -0,0 +1,89 @@
+"""
+Renderizado de tablas por columnas: Markdown, HTML y CSV
+Cada columna se formatea entera de una vez (una lista de textos) y las
+filas se componen uniendo las columnas, sin iterrows ni concatenacion
+repetida de cadenas. Las tablas se generan por fragmentos, de modo que
+una tabla de cientos de miles de filas se escribe en streaming:
+
+    columnas = [Columna('Area', 'area'), Columna('Gasto (EUR)', 'gasto', '{:,.2f}', 'der')]
+    escribir(tabla_markdown(df, columnas), 'project/output/tabla.md')
+"""
+import html
+from collections import namedtuple
+
+import pandas as pd
+
+import escritura
+
+# formato: plantilla de str.format para un valor ('{:,.2f}'); alineacion: 'izq' o 'der'
+Columna = namedtuple('Columna', ['titulo', 'campo', 'formato', 'alineacion'], defaults=['{}', 'izq'])
+FILAS_POR_FRAGMENTO = 10_000
+
+
+def formatear(s, formato='{}', escapar=None):
+    """Textos de una columna completa.
+
+    Con Categorical solo se formatean (y escapan) las categorias y se
+    expanden por codigo; el resto se convierte a valores de Python una vez
+    y se formatea con el metodo ya resuelto de la plantilla.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        textos = [formato.format(c) for c in s.cat.categories] + [formato.format(float('nan'))]
+        if escapar is not None:
+            textos = list(map(escapar, textos))
+        return [textos[c] for c in s.cat.codes.tolist()]
+    textos = map(formato.format, s.tolist())
+    return list(textos if escapar is None else map(escapar, textos))
+
+
+def _filas(df, columnas, inicio, fin, escapar=None):
+    bloque = df.iloc[inicio:fin]
+    return zip(*[formatear(bloque[c.campo], c.formato, escapar) for c in columnas])
+
+
+def _bloques(df):
+    for inicio in range(0, len(df), FILAS_POR_FRAGMENTO):
+        yield inicio, inicio + FILAS_POR_FRAGMENTO
+
+
+def tabla_markdown(df, columnas):
+    """Fragmentos de una tabla Markdown (cabecera y bloques de filas)"""
+    separador = ['-' * (len(c.titulo) + 1) + ':' if c.alineacion == 'der' else '-' * (len(c.titulo) + 2)
+                 for c in columnas]
+    yield '| ' + ' | '.join(c.titulo for c in columnas) + ' |\n'
+    yield '|' + '|'.join(separador) + '|\n'
+    for inicio, fin in _bloques(df):
+        yield ''.join(['| ' + ' | '.join(fila) + ' |\n' for fila in _filas(df, columnas, inicio, fin)])
+
+
+def tabla_html(df, columnas):
+    """Fragmentos de una tabla HTML con los textos escapados"""
+    estilos = [' style="text-align:right"' if c.alineacion == 'der' else '' for c in columnas]
+    yield '<table>\n<thead><tr>' + ''.join(
+        f'<th{e}>{html.escape(c.titulo)}</th>' for c, e in zip(columnas, estilos)) + '</tr></thead>\n<tbody>\n'
+    fila = ('<tr>' + ''.join(f'<td{e}>{{}}</td>' for e in estilos) + '</tr>\n').format
+    for inicio, fin in _bloques(df):
+        yield ''.join([fila(*valores) for valores in _filas(df, columnas, inicio, fin, html.escape)])
+    yield '</tbody>\n</table>\n'
+
+
+def tabla_csv(df, columnas, float_format=None):
+    """Fragmentos CSV con los valores sin formatear (los escribe pandas);
+    `float_format` ('%.2f') fija los decimales de las columnas float"""
+    datos = df[[c.campo for c in columnas]].set_axis([c.titulo for c in columnas], axis=1)
+    yield datos.iloc[:0].to_csv(index=False, lineterminator='\n')
+    for inicio, fin in _bloques(df):
+        yield datos.iloc[inicio:fin].to_csv(index=False, header=False, lineterminator='\n',
+                                            float_format=float_format)
+
+
+TABLAS = {'md': tabla_markdown, 'html': tabla_html, 'csv': tabla_csv}
+
+
+def escribir(fragmentos, ruta):
+    """Escribe los fragmentos segun se generan, sin unirlos en memoria,
+    en un temporal que sustituye a `ruta` al terminar"""
+    with escritura.atomica(ruta) as temporal:
+        with open(temporal, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(fragmentos)
+    return ruta
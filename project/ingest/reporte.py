@@ -0,0 +1,356 @@
+"""
+Reporte de ejecucion presupuestaria (FASE 4): Markdown, HTML o CSV
+El reporte se genera al final del pipeline o, sin ejecutarlo, solo a
+partir de los artefactos de Oro (`generar_desde_oro`), tambien para un
+rango de meses:
+
+    python project/ingest/run.py --solo-reporte --desde 2024-03 --hasta 2024-06
+
+El texto fijo son plantillas precompiladas y las tablas se formatean por
+columnas (`render`); la salida se escribe por fragmentos.
+"""
+import html
+from collections import namedtuple
+from datetime import datetime
+from string import Template
+
+import pandas as pd
+
+import artefactos_oro
+import dinero
+import oro
+import render
+from render import Columna
+
+# Datos del batch que el reporte necesita ademas de las tablas de Oro; se
+# guardan en los metadatos de kpi_ejecucion.parquet
+ContextoReporte = namedtuple('ContextoReporte', [
+    'batch_id', 'ingest_ts', 'n_gastos', 'n_cuarentena', 'fecha_min', 'fecha_max',
+    'registros_gastos', 'registros_presupuesto', 'duplicados_eliminados', 'supersesiones'])
+
+
+# ========== PLANTILLAS ==========
+# Plantillas precompiladas: las tablas y listas se insertan entre ellas
+# como fragmentos, asi el reporte se escribe en streaming
+
+MD_CABECERA = Template("""# Reporte de Ejecucion Presupuestaria 2024
+
+**Generado:** $generado  
+**Batch ID:** `$batch_id`  
+**Periodo:** Enero - Octubre 2024
+
+---
+
+## Resumen Ejecutivo
+
+Este reporte analiza la ejecucion presupuestaria por area, comparando el **gasto acumulado** vs el **presupuesto anual asignado**.
+
+### Hallazgos principales:
+- Se procesaron **$n_gastos** registros de gastos validos
+- Se identificaron **$n_cuarentena** registros con errores (enviados a cuarentena)
+- Se analizaron **$n_areas** areas organizacionales
+
+---
+
+## KPI Principal: Ejecucion Presupuestaria
+
+### **Definicion del KPI**
+
+```
+KPI_Ejecucion = (Gasto Acumulado / Presupuesto Anual) × 100
+```
+
+**Interpretacion:**
+- **< 70%**: Bajo consumo presupuestario
+- **70-89%**: Ejecucion normal
+- **90-100%**: En riesgo de sobrepasarse
+- **> 100%**: Sobre presupuesto (CRITICO)
+
+---
+
+## Tabla 1: Ejecucion por Area
+
+""")
+
+MD_TENDENCIA = """
+
+---
+
+## Tabla 2: Tendencia Mensual de Gastos (Top 5 Meses)
+
+"""
+
+MD_CONTEXTO = Template("""
+
+---
+
+## Contexto del Analisis
+
+### Fuente de Datos
+- **Archivo de Gastos:** `gastos.csv` ($registros_gastos registros originales)
+- **Archivo de Presupuesto:** `presupuesto.csv` ($registros_presupuesto registros originales)
+
+### Periodo Analizado
+- **Inicio:** $fecha_min
+- **Fin:** $fecha_max
+
+### Ultima Actualizacion
+- **Fecha de procesamiento:** $ingest_ts
+- **Batch ID:** `$batch_id`
+
+### Consideraciones Tecnicas
+
+#### Registros en Cuarentena
+Se identificaron **$n_cuarentena** registros con problemas:
+- Campos obligatorios nulos
+- Importes negativos o cero
+- Fechas invalidas
+- Areas no reconocidas
+
+Estos registros se guardaron en `project/data/quarantine/` para revision manual.
+
+#### Manejo de Importes
+- Todos los importes se almacenan como **DECIMAL(18,2)** (centimos enteros)
+- Los valores se redondean a 2 decimales al leerlos; sumas y KPIs son exactos
+- **No se incluye IVA** en los calculos (gastos netos)
+
+#### Deduplicacion
+- **Clave natural:** (fecha, area, partida)
+- **Politica:** "Ultimo gana" (se conserva el registro con mayor `_ingest_ts`)
+- **Duplicados eliminados:** $duplicados_eliminados
+- **Supersesiones entre batches:** $supersesiones
+
+#### Periodificacion
+- Los gastos se contabilizan por **fecha de transaccion**
+- No se aplica criterio de devengo
+
+---
+
+## Conclusiones y Recomendaciones
+
+### Areas en Riesgo
+""")
+
+MD_RIESGO = ('- **{}**: SOBRE PRESUPUESTO ({}%) - Requiere accion inmediata\n',
+             '- **{}**: En riesgo ({}%) - Monitorear de cerca\n')
+MD_SIN_RIESGO = 'No hay areas en riesgo critico actualmente.\n'
+
+MD_PIE = """
+
+### Acciones Recomendadas
+
+1. **Revision Inmediata**
+   - Analizar areas con ejecucion > 100%
+   - Evaluar necesidad de reasignacion presupuestaria
+
+2. **Monitoreo Continuo**
+   - Establecer alertas para areas con ejecucion > 90%
+   - Revisar tendencias mensuales para anticipar desvios
+
+3. **Calidad de Datos**
+   - Revisar registros en cuarentena mensualmente
+   - Validar areas y partidas con usuarios finales
+
+---
+
+## Definiciones de KPIs
+
+### KPI_Ejecucion
+- **Formula:** `(Gasto Acumulado / Presupuesto Anual) × 100`
+- **Unidad:** Porcentaje (%)
+- **Rango esperado:** 0% - 100%
+- **Actualizacion:** Por batch (ETL)
+
+### Gasto Acumulado
+- **Definicion:** Suma de todos los importes de gastos registrados para un area
+- **Unidad:** Euros (EUR)
+- **Incluye:** Gastos netos sin IVA
+
+### Presupuesto Restante
+- **Formula:** `Presupuesto Anual - Gasto Acumulado`
+- **Unidad:** Euros (EUR)
+- **Interpretacion:** Fondos disponibles hasta fin de año
+
+---
+
+## Informacion Tecnica
+
+### Pipeline ETL
+1. **Ingesta (Bronce):** Lectura de CSVs con trazabilidad completa
+2. **Limpieza (Plata):** Validaciones, normalizacion y deduplicacion
+3. **Oro (Analytics):** Calculo de KPIs y agregaciones
+4. **Reporte:** Generacion automatica en Markdown
+
+### Trazabilidad
+- `_ingest_ts`: Timestamp de ingesta
+- `_source_file`: Archivo origen
+- `_batch_id`: Identificador del batch procesado
+- `_event_id`: ID unico por registro (UUID)
+
+### Almacenamiento
+- **Parquet:** Datos persistentes con particionado temporal
+- **SQLite:** Base de datos para consultas SQL (`finanzas.db`)
+- **Vista SQL:** `v_ejecucion_detalle` con estado y calculos
+
+---
+
+**Fin del Reporte**  
+_Generado automaticamente por el pipeline ETL de Finanzas_
+"""
+
+HTML_CABECERA = Template("""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>Reporte de Ejecucion Presupuestaria 2024</title>
+</head>
+<body>
+<h1>Reporte de Ejecucion Presupuestaria 2024</h1>
+<p><strong>Generado:</strong> $generado<br>
+<strong>Batch ID:</strong> <code>$batch_id</code><br>
+<strong>Periodo analizado:</strong> $fecha_min a $fecha_max</p>
+<h2>Resumen Ejecutivo</h2>
+<ul>
+<li>Se procesaron <strong>$n_gastos</strong> registros de gastos validos</li>
+<li>Se identificaron <strong>$n_cuarentena</strong> registros con errores (enviados a cuarentena)</li>
+<li>Se analizaron <strong>$n_areas</strong> areas organizacionales</li>
+</ul>
+<h2>Tabla 1: Ejecucion por Area</h2>
+""")
+HTML_TENDENCIA = '<h2>Tabla 2: Tendencia Mensual de Gastos (Top 5 Meses)</h2>\n'
+HTML_RIESGO = ('<li><strong>{}</strong>: SOBRE PRESUPUESTO ({}%) - Requiere accion inmediata</li>\n',
+               '<li><strong>{}</strong>: En riesgo ({}%) - Monitorear de cerca</li>\n')
+HTML_SIN_RIESGO = '<p>No hay areas en riesgo critico actualmente.</p>\n'
+HTML_PIE = Template("""<p><em>Generado automaticamente por el pipeline ETL de Finanzas (batch <code>$batch_id</code>)</em></p>
+</body>
+</html>
+""")
+
+COLUMNAS_EJECUCION = [
+    Columna('Area', 'area'),
+    Columna('Presupuesto Anual (EUR)', 'presupuesto_anual', '{:,.2f}', 'der'),
+    Columna('Gasto Acumulado (EUR)', 'gasto_acumulado', '{:,.2f}', 'der'),
+    Columna('KPI Ejecucion (%)', 'kpi_ejecucion', '**{:.2f}%**', 'der'),
+    Columna('Restante (EUR)', 'restante', '{:,.2f}', 'der'),
+]
+COLUMNAS_TENDENCIA = [
+    Columna('Mes', 'mes'),
+    Columna('Gasto Total (EUR)', 'gasto_mensual', '{:,.2f}', 'der'),
+]
+# En HTML el KPI no lleva el enfasis de Markdown
+COLUMNAS_EJECUCION_HTML = COLUMNAS_EJECUCION[:3] + [
+    Columna('KPI Ejecucion (%)', 'kpi_ejecucion', '{:.2f}%', 'der')] + COLUMNAS_EJECUCION[4:]
+FORMATOS = ['md', 'html', 'csv']
+
+
+def _en_euros(df):
+    """Importes en centimos -> euros, solo para mostrar"""
+    return df.assign(**{col: dinero.a_euros(df[col]) for col in df.columns if dinero.es_importe(col)})
+
+
+def _tablas(df_oro, df_mensual):
+    """Ejecucion por area (KPI descendente, con restante) y top 5 meses.
+
+    Restante y totales se calculan en centimos y se pasan a euros al final.
+    """
+    ejecucion = df_oro.sort_values('kpi_ejecucion', ascending=False)
+    ejecucion = ejecucion.assign(restante=ejecucion['presupuesto_anual'] - ejecucion['gasto_acumulado'])
+    top = df_mensual.groupby('mes')['gasto_mensual'].sum().reset_index()
+    top = top.sort_values('gasto_mensual', ascending=False).head(5)
+    return _en_euros(ejecucion), _en_euros(top)
+
+
+def _lineas_riesgo(ejecucion, plantillas, escapar=str):
+    """Una linea por area con KPI >= 90, segun supere o no el 100%"""
+    riesgo = ejecucion[ejecucion['kpi_ejecucion'] >= 90]
+    areas = map(escapar, render.formatear(riesgo['area']))
+    kpis = render.formatear(riesgo['kpi_ejecucion'], '{:.2f}')
+    sobre = (riesgo['kpi_ejecucion'] > 100).tolist()
+    return ''.join([plantillas[0 if s else 1].format(a, k) for a, k, s in zip(areas, kpis, sobre)])
+
+
+def _valores(df_oro, contexto):
+    return dict(contexto._asdict(), generado=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), n_areas=len(df_oro))
+
+
+def fragmentos_reporte(df_oro, df_mensual, contexto, formato='md'):
+    """Genera el reporte por fragmentos en el formato indicado.
+
+    md es el reporte completo; html, la misma informacion en una pagina
+    para el sitio; csv, la tabla de ejecucion por area con los valores sin
+    formatear.
+    """
+    ejecucion, top = _tablas(df_oro, df_mensual)
+    if formato == 'csv':
+        yield from render.tabla_csv(ejecucion, COLUMNAS_EJECUCION, float_format='%.2f')
+        return
+    valores = _valores(df_oro, contexto)
+    if formato == 'html':
+        valores = {k: html.escape(str(v)) for k, v in valores.items()}
+        yield HTML_CABECERA.substitute(valores)
+        yield from render.tabla_html(ejecucion, COLUMNAS_EJECUCION_HTML)
+        yield HTML_TENDENCIA
+        yield from render.tabla_html(top, COLUMNAS_TENDENCIA)
+        yield '<h2>Areas en Riesgo</h2>\n'
+        riesgo = _lineas_riesgo(ejecucion, HTML_RIESGO, html.escape)
+        yield f'<ul>\n{riesgo}</ul>\n' if riesgo else HTML_SIN_RIESGO
+        yield HTML_PIE.substitute(valores)
+        return
+    if formato != 'md':
+        raise ValueError(f'Formato de reporte desconocido: {formato} (opciones: {FORMATOS})')
+    yield MD_CABECERA.substitute(valores)
+    yield from render.tabla_markdown(ejecucion, COLUMNAS_EJECUCION)
+    yield MD_TENDENCIA
+    yield from render.tabla_markdown(top, COLUMNAS_TENDENCIA)
+    yield MD_CONTEXTO.substitute(valores)
+    yield _lineas_riesgo(ejecucion, MD_RIESGO) or MD_SIN_RIESGO
+    yield MD_PIE
+
+
+def generar_reporte(df_oro, df_mensual, contexto, ruta='project/output/reporte.md', formato='md'):
+    """Renderiza y escribe el reporte en streaming, sin montarlo entero en memoria"""
+    return render.escribir(fragmentos_reporte(df_oro, df_mensual, contexto, formato), ruta)
+
+
+def filtrar_periodo(df_oro, df_mensual, contexto, desde=None, hasta=None):
+    """Restringe Oro a los meses [desde, hasta] (YYYY-MM, extremos opcionales).
+
+    El gasto acumulado y el KPI de cada area se recalculan con la tendencia
+    mensual del periodo; el presupuesto anual no cambia. Las fechas del
+    contexto se recortan al periodo; los recuentos siguen siendo los del
+    batch.
+    """
+    meses = df_mensual['mes']
+    en_periodo = pd.Series(True, index=df_mensual.index)
+    if desde is not None:
+        en_periodo &= meses >= desde
+    if hasta is not None:
+        en_periodo &= meses <= hasta
+    df_mensual = df_mensual[en_periodo]
+
+    df_gasto_area = df_mensual.groupby('area', observed=True)['gasto_mensual'].sum().reset_index()
+    df_gasto_area.columns = ['area', 'gasto_acumulado']
+    df_oro = oro.calcular_kpis(df_gasto_area, df_oro[['area', 'presupuesto_anual']], contexto.batch_id)
+
+    fecha_min, fecha_max = contexto.fecha_min, contexto.fecha_max
+    if desde is not None:
+        fecha_min = max(fecha_min, f'{desde}-01')
+    if hasta is not None:
+        fecha_max = min(fecha_max, pd.Period(hasta, freq='M').end_time.strftime('%Y-%m-%d'))
+    return df_oro, df_mensual, contexto._replace(fecha_min=fecha_min, fecha_max=fecha_max)
+
+
+def generar_desde_oro(ruta='project/output/reporte.md', directorio=artefactos_oro.DIR_ORO,
+                      desde=None, hasta=None, formato='md'):
+    """Regenera el reporte solo desde los Parquet de Oro, sin ejecutar el ETL.
+
+    Las lecturas se cachean por ruta y mtime: en un mismo proceso, generar
+    muchos reportes (p. ej. uno por periodo) solo lee Oro una vez.
+    """
+    df_oro, df_mensual, metadatos = artefactos_oro.leer_oro(directorio)
+    if metadatos is None or 'reporte' not in metadatos:
+        raise ValueError(f'{directorio} no tiene contexto de reporte: ejecuta primero project/ingest/run.py')
+    contexto = ContextoReporte(**metadatos['reporte'])
+    if desde is not None or hasta is not None:
+        df_oro, df_mensual, contexto = filtrar_periodo(df_oro, df_mensual, contexto, desde, hasta)
+    return generar_reporte(df_oro, df_mensual, contexto, ruta, formato)
@@ -0,0 +1,87 @@
+"""
+Motor de validacion declarativo para la capa Plata
+Evalua todas las reglas en una sola pasada vectorizada, asigna a cada fila
+el codigo de la primera regla que incumple y separa validos y cuarentena
+una unica vez.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import metricas
+
+# falla(original, vista) -> mascara booleana de filas que incumplen la regla.
+# `original` son los valores tal como llegan de Bronce; `vista` los mismos
+# datos con las transformaciones (tipos, normalizacion) ya aplicadas.
+Regla = namedtuple('Regla', ['causa', 'falla'])
+
+
+def campos_nulos(columnas, causa='Campos obligatorios nulos'):
+    """Algun campo obligatorio llega vacio en origen"""
+    return Regla(causa, lambda df, vista: df[columnas].isnull().any(axis=1))
+
+
+def conversion_fallida(columnas, causa='Error en conversion de tipos'):
+    """El valor existe en origen pero no se puede convertir a su tipo"""
+    return Regla(causa, lambda df, vista: vista[columnas].isnull().any(axis=1))
+
+
+def no_positivo(columna, causa='Importe negativo o cero'):
+    """Rango: el valor debe ser estrictamente positivo"""
+    return Regla(causa, lambda df, vista: vista[columna] <= 0)
+
+
+def fuera_de_rango(columna, limite, causa):
+    """Rango: el valor debe ser finito y |valor| < limite"""
+    return Regla(causa, lambda df, vista: ~(vista[columna].abs() < limite))
+
+
+def fuera_de_dominio(columna, valores, causa):
+    """El valor normalizado no pertenece al dominio valido"""
+    return Regla(causa, lambda df, vista: ~vista[columna].isin(valores))
+
+
+def a_categoria(s, normalizar, categorias=None):
+    """Normaliza una columna de baja cardinalidad directamente a Categorical.
+
+    La funcion `normalizar` solo se aplica a los valores distintos (tabla de
+    busqueda) y no a cada fila. Con `categorias` fijas, los valores que no
+    pertenecen al dominio quedan como nulos; sin ellas, las categorias son
+    los valores normalizados ordenados.
+    """
+    codigos, distintos = pd.factorize(s)
+    normalizados = normalizar(pd.Series(list(distintos), dtype=object))
+    if categorias is None:
+        categorias = sorted(normalizados.dropna().unique())
+    mapa = pd.Index(categorias).get_indexer(normalizados)
+    # Los nulos de origen (codigo -1) apuntan al -1 anadido al final
+    codigos = np.append(mapa, -1)[codigos]
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=categorias), index=s.index, name=s.name)
+
+
+def validar(df, transformaciones, reglas):
+    """Aplica transformaciones y reglas en una pasada.
+
+    transformaciones: {columna: funcion(Serie) -> Serie} (conversion de
+    tipos y normalizacion). Las reglas se evaluan en orden y cada fila
+    recibe la causa de la primera que incumple.
+
+    Devuelve (validos, rechazados, causas): validos con las columnas ya
+    transformadas, rechazados con los valores originales y causas como
+    Categorical alineado con rechazados.
+    """
+    with metricas.etapa('transformaciones', len(df)):
+        vista = df.assign(**{col: f(df[col]) for col, f in transformaciones.items()})
+
+    # Recorrido inverso: la regla anterior sobrescribe, asi queda la primera
+    codigo = np.zeros(len(df), dtype=np.int8)
+    for i in range(len(reglas) - 1, -1, -1):
+        with metricas.etapa(f'regla:{reglas[i].causa}', len(df)) as e:
+            falla = reglas[i].falla(df, vista).to_numpy(dtype=bool)
+            codigo[falla] = i + 1
+            e['filas_salida'] = len(df) - int(falla.sum())
+
+    ok = codigo == 0
+    causas = pd.Categorical.from_codes(codigo[~ok] - 1, categories=[r.causa for r in reglas])
+    return vista[ok], df[~ok], causas
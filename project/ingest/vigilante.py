@@ -0,0 +1,377 @@
+"""
+Vigilante del directorio de llegada: micro-batches continuos sobre el Pipeline
+Un proceso asyncio de larga duracion sondea el directorio de llegada y agrupa
+los archivos de gastos que van llegando en micro-batches. Un micro-batch se
+cierra al reunir `max_archivos` o `max_bytes`, o cuando han pasado
+`ventana_s` segundos desde la llegada de su primer archivo. Cada uno pasa
+por Ingesta + Limpieza (un sub-lote por archivo) y un unico commit de Oro
+incremental:
+
+    sondeo -> [cola de limpieza] -> ingest + clean -> [cola de Oro] -> gold
+
+- Un archivo se considera completo cuando su tamano y mtime no cambian
+  entre dos sondeos; los `.tmp`/`.part` de una escritura en curso se ignoran.
+- Contrapresion: las colas estan acotadas. Si la limpieza u Oro van por
+  detras, el sondeo se detiene y los archivos esperan en disco.
+- Oro tiene un unico consumidor: como mucho un commit de Oro a la vez,
+  solapado con la limpieza del micro-batch siguiente.
+- Los archivos procesados se mueven a `procesados/{micro-batch}-{archivo}`
+  (o a `errores/` si su micro-batch falla) dentro del directorio de llegada.
+- El indice de deduplicacion solo se modifica en el commit de Oro. Mientras
+  tanto, los cambios de los micro-batches ya limpios se aplican en memoria
+  a los siguientes; si un commit de Oro falla, sus cambios se descartan y
+  los micro-batches que se limpiaron contra ellos van tambien a `errores/`.
+- Latencia: por micro-batch se registra la espera (llegada -> cierre del
+  micro-batch) y la latencia total (llegada -> kpi_ejecucion actualizado)
+  en project/data/metrics/vigilante.jsonl. `ventana_s` acota la espera.
+
+Uso: python project/ingest/vigilante.py --landing project/data/landing --ventana 30 --max-archivos 50
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import signal
+import threading
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+import estado_oro
+import indice_dedup
+import limpieza
+import manifiesto
+import metricas
+from ingesta import EXTENSIONES_COMPRIMIDAS
+from paralelo import DIR_LANDING
+from pipeline import DIRECTORIOS, Pipeline, Plata
+
+EXTENSIONES = ('.csv',) + tuple(EXTENSIONES_COMPRIMIDAS)
+RUTA_LATENCIAS = os.path.join(metricas.DIR_METRICAS, 'vigilante.jsonl')
+
+# llegada: time.time() del primer sondeo que vio el archivo
+Archivo = namedtuple('Archivo', ['ruta', 'tamano', 'llegada'])
+MicroLote = namedtuple('MicroLote', ['batch_id', 'archivos', 'cierre'])
+# Resultado de la limpieza de un micro-batch, pendiente de su commit de Oro.
+# usados: micro-batches cuyos cambios pendientes del indice se aplicaron al limpiarlo
+Limpio = namedtuple('Limpio', ['micro', 'lote', 'platas', 'entradas', 'usados'])
+
+
+def combinar_platas(platas):
+    """Una Plata con los gastos de varios sub-lotes, para un solo commit de Oro.
+
+    No se deduplica entre sub-lotes: dedup_global ya resolvio cada clave
+    contra el indice en orden de llegada, y `reemplazados` anula en Oro los
+    importes que un sub-lote posterior sustituye.
+    """
+    reemplazados = [p.reemplazados for p in platas if p.reemplazados is not None]
+    cuarentena = pd.Series(dtype='int64', name='filas')
+    for p in platas:
+        cuarentena = cuarentena.add(p.cuarentena, fill_value=0).astype('int64')
+    return Plata(limpieza.concatenar([p.gastos for p in platas]), platas[-1].presupuesto, cuarentena,
+                 pd.concat(reemplazados, ignore_index=True) if reemplazados else None,
+                 sum(p.registros_gastos for p in platas), platas[-1].registros_presupuesto,
+                 sum(p.duplicados_eliminados for p in platas), sum(p.supersesiones for p in platas),
+                 indice=indice_dedup.combinar([p.indice for p in platas]))
+
+
+class Vigilante:
+    """Servicio de micro-batches sobre un directorio de llegada.
+
+    ventana_s: espera maxima desde la llegada del primer archivo de un
+        micro-batch hasta que se cierra.
+    max_archivos / max_bytes: cierran el micro-batch antes de la ventana.
+    intervalo_s: periodo de sondeo del directorio.
+    max_pendientes: micro-batches cerrados en espera de limpieza.
+    con_reporte: regenera reporte.md tras cada commit de Oro.
+    """
+
+    def __init__(self, landing=DIR_LANDING, ventana_s=30.0, max_archivos=50, max_bytes=256 * 2**20,
+                 intervalo_s=1.0, max_pendientes=2, ruta_presupuesto='project/data/presupuesto.csv',
+                 ids_deterministas=False, con_reporte=False, ruta_latencias=RUTA_LATENCIAS):
+        self.landing = landing
+        self.ventana_s = ventana_s
+        self.max_archivos = max_archivos
+        self.max_bytes = max_bytes
+        self.intervalo_s = intervalo_s
+        self.max_pendientes = max_pendientes
+        self.ruta_presupuesto = ruta_presupuesto
+        self.ids_deterministas = ids_deterministas
+        self.con_reporte = con_reporte
+        self.ruta_latencias = ruta_latencias
+        self.abierto = []     # archivos del micro-batch en curso
+        self.en_espera = {}   # ruta -> ((tamano, mtime_ns), llegada) hasta que se estabiliza
+        self.asignados = set()
+        self.registros = []   # latencias por micro-batch
+        self.n_micro = 0
+        # Cambios del indice de deduplicacion de micro-batches limpios aun
+        # sin commit de Oro, en orden: [(batch_id, indice_dedup.Cambios)]
+        self.indice_pendiente = []
+        self.descartados = set()  # micro-batches cuyos cambios del indice no se confirmaron
+        self._lock = threading.Lock()
+
+    def pipeline(self, ruta_gastos=None):
+        """Pipeline incremental con deduplicacion global y cache de entradas:
+        Oro fusiona cada micro-batch en el estado acumulado, y un archivo que
+        vuelve a llegar sin cambios no se suma dos veces"""
+        return Pipeline(ruta_gastos=ruta_gastos or 'project/data/gastos.csv', ruta_presupuesto=self.ruta_presupuesto,
+                        incremental=True, dedup_global=True, ids_deterministas=self.ids_deterministas,
+                        cache_entradas=True)
+
+    # ==================== SONDEO ====================
+    def sondear(self):
+        """Archivos de gastos nuevos cuyo tamano y mtime no han cambiado
+        desde el sondeo anterior (en orden de nombre)"""
+        listos = []
+        presentes = set()
+        for ruta in sorted(glob.glob(os.path.join(self.landing, 'gastos*.csv*'))):
+            if not ruta.endswith(EXTENSIONES) or ruta in self.asignados:
+                continue
+            try:
+                estado = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            presentes.add(ruta)
+            firma = (estado.st_size, estado.st_mtime_ns)
+            previo = self.en_espera.get(ruta)
+            if previo is not None and previo[0] == firma:
+                listos.append(Archivo(ruta, estado.st_size, previo[1]))
+                self.asignados.add(ruta)
+                del self.en_espera[ruta]
+            else:
+                self.en_espera[ruta] = (firma, time.time() if previo is None else previo[1])
+        for ruta in set(self.en_espera) - presentes:
+            del self.en_espera[ruta]
+        return listos
+
+    def _lleno(self):
+        return len(self.abierto) >= self.max_archivos or sum(a.tamano for a in self.abierto) >= self.max_bytes
+
+    async def _cerrar(self, cola):
+        """Cierra el micro-batch abierto; espera si la cola esta llena (contrapresion)"""
+        self.n_micro += 1
+        micro = MicroLote(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_mb{self.n_micro}", self.abierto, time.time())
+        self.abierto = []
+        print(f"\n[vigilante] micro-batch {micro.batch_id}: {len(micro.archivos)} archivos, "
+              f"{sum(a.tamano for a in micro.archivos)} bytes")
+        await cola.put(micro)
+
+    async def _vigilar(self, cola, parar):
+        while not parar.is_set():
+            for archivo in self.sondear():
+                self.abierto.append(archivo)
+                if self._lleno():
+                    await self._cerrar(cola)
+            if self.abierto and time.time() - self.abierto[0].llegada >= self.ventana_s:
+                await self._cerrar(cola)
+            try:
+                await asyncio.wait_for(parar.wait(), self.intervalo_s)
+            except asyncio.TimeoutError:
+                pass
+        # Al parar se procesa lo ya recibido
+        if self.abierto:
+            await self._cerrar(cola)
+        await cola.put(None)
+
+    # ==================== LIMPIEZA ====================
+    def limpiar(self, micro):
+        """Ingesta + Limpieza de cada archivo del micro-batch en su sub-lote.
+
+        Cada sub-lote se deduplica contra el indice mas los cambios aun sin
+        confirmar de los micro-batches anteriores y de los sub-lotes previos.
+        """
+        lote = self.pipeline().nuevo_lote(micro.batch_id)
+        with self._lock:
+            usados = [b for b, _ in self.indice_pendiente]
+            pendiente = indice_dedup.combinar([c for _, c in self.indice_pendiente])
+        platas, entradas = [], []
+        for archivo in micro.archivos:
+            p = self.pipeline(archivo.ruta)
+            particion = os.path.basename(archivo.ruta).split('.')[0]
+            sub_lote = p.nuevo_lote(f'{micro.batch_id}-{particion}')
+            bronce = p.ingest(sub_lote)
+            if bronce.entradas['gastos.csv'].en_cache:
+                print(f"   {archivo.ruta} ya ingerido con el mismo contenido: se omite")
+                continue
+            plata = p.clean(sub_lote, bronce, pendiente)
+            pendiente = indice_dedup.combinar([pendiente, plata.indice])
+            platas.append(plata)
+            entradas.extend(plata.entradas.values())
+        with self._lock:
+            self._comprobar_usados(micro, usados)
+            self.indice_pendiente.append((micro.batch_id, indice_dedup.combinar([p.indice for p in platas])))
+        return Limpio(micro, lote, platas, entradas, usados)
+
+    def _comprobar_usados(self, micro, usados):
+        """Falla si el micro-batch se resolvio contra cambios descartados (con el lock)"""
+        fallidos = self.descartados.intersection(usados)
+        if fallidos:
+            self.descartados.add(micro.batch_id)
+            raise RuntimeError(f"{micro.batch_id} se deduplico contra cambios del indice de micro-batches "
+                               f"que no llegaron a Oro: {', '.join(sorted(fallidos))}")
+
+    def _descartar_pendientes(self):
+        """Cuando un micro-batch falla en Oro: sus cambios y los de todos los
+        pendientes, que son posteriores y se limpiaron contra ellos, no se
+        confirmaran"""
+        with self._lock:
+            self.descartados.update(b for b, _ in self.indice_pendiente)
+            self.indice_pendiente = []
+
+    def _quitar_pendiente(self, micro):
+        with self._lock:
+            self.indice_pendiente = [(b, c) for b, c in self.indice_pendiente if b != micro.batch_id]
+
+    @staticmethod
+    def _confirmado(lote):
+        """True si los deltas del micro-batch (y su indice) ya estan en el estado de Oro"""
+        conn = estado_oro.abrir_estado()
+        try:
+            return estado_oro.batch_procesado(conn, lote.batch_id)
+        finally:
+            conn.close()
+
+    async def _etapa_limpieza(self, entrada, salida, executor):
+        loop = asyncio.get_running_loop()
+        while (micro := await entrada.get()) is not None:
+            try:
+                limpio = await loop.run_in_executor(executor, self.limpiar, micro)
+            except Exception:
+                traceback.print_exc()
+                self._finalizar(micro, 'error')
+                continue
+            await salida.put(limpio)
+        await salida.put(None)
+
+    # ==================== ORO ====================
+    def consolidar(self, limpio):
+        """Un commit de Oro incremental con todos los sub-lotes del micro-batch.
+
+        Los cambios del indice se confirman en la misma transaccion que los
+        deltas de Oro. Un micro-batch limpiado contra cambios que luego se
+        descartaron falla sin tocar Oro.
+        """
+        try:
+            with self._lock:
+                self._comprobar_usados(limpio.micro, limpio.usados)
+        except RuntimeError:
+            self._descartar_pendientes()
+            raise
+        filas = 0
+        if limpio.platas:
+            plata = combinar_platas(limpio.platas)
+            p = self.pipeline()
+            try:
+                datos_oro = p.gold(limpio.lote, plata)
+            except BaseException:
+                if not self._confirmado(limpio.lote):
+                    self._descartar_pendientes()
+                raise
+            finally:
+                self._quitar_pendiente(limpio.micro)
+            if self.con_reporte:
+                p.report(limpio.lote, plata, datos_oro)
+            filas = len(plata.gastos)
+        else:
+            self._quitar_pendiente(limpio.micro)
+        if limpio.entradas:
+            conn = manifiesto.abrir_manifiesto()
+            manifiesto.registrar(conn, limpio.entradas)
+            conn.close()
+        return filas
+
+    async def _etapa_oro(self, entrada, executor):
+        # Unico consumidor: los commits de Oro nunca se solapan entre si
+        loop = asyncio.get_running_loop()
+        while (limpio := await entrada.get()) is not None:
+            try:
+                filas = await loop.run_in_executor(executor, self.consolidar, limpio)
+            except Exception:
+                traceback.print_exc()
+                self._finalizar(limpio.micro, 'error')
+                continue
+            self._finalizar(limpio.micro, 'ok', filas)
+
+    # ==================== CIERRE Y LATENCIA ====================
+    def _finalizar(self, micro, estado, filas=0):
+        """Mueve los archivos fuera de la llegada y registra las latencias"""
+        fin = time.time()
+        destino = os.path.join(self.landing, 'procesados' if estado == 'ok' else 'errores')
+        os.makedirs(destino, exist_ok=True)
+        for archivo in micro.archivos:
+            if os.path.exists(archivo.ruta):
+                os.replace(archivo.ruta, os.path.join(destino, f'{micro.batch_id}-{os.path.basename(archivo.ruta)}'))
+            self.asignados.discard(archivo.ruta)
+
+        esperas = [micro.cierre - a.llegada for a in micro.archivos]
+        latencias = [fin - a.llegada for a in micro.archivos]
+        registro = {
+            'micro_batch': micro.batch_id,
+            'estado': estado,
+            'archivos': len(micro.archivos),
+            'bytes': sum(a.tamano for a in micro.archivos),
+            'filas': filas,
+            'espera_media_s': round(sum(esperas) / len(esperas), 3),
+            'espera_max_s': round(max(esperas), 3),
+            'proceso_s': round(fin - micro.cierre, 3),
+            'latencia_media_s': round(sum(latencias) / len(latencias), 3),
+            'latencia_max_s': round(max(latencias), 3),
+        }
+        self.registros.append(registro)
+        os.makedirs(os.path.dirname(self.ruta_latencias) or '.', exist_ok=True)
+        with open(self.ruta_latencias, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro) + '\n')
+        print(f"[vigilante] {micro.batch_id} {estado}: {registro['archivos']} archivos, {filas} filas, "
+              f"latencia media {registro['latencia_media_s']} s (max {registro['latencia_max_s']} s)")
+
+    async def ejecutar(self, duracion_s=None):
+        """Vigila hasta SIGINT/SIGTERM o hasta `duracion_s`; al parar procesa
+        los micro-batches pendientes. Devuelve los registros de latencia."""
+        for carpeta in DIRECTORIOS:
+            os.makedirs(carpeta, exist_ok=True)
+        parar = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, parar.set)
+            except NotImplementedError:  # Windows: solo KeyboardInterrupt
+                pass
+        if duracion_s is not None:
+            loop.call_later(duracion_s, parar.set)
+
+        cola_limpieza = asyncio.Queue(maxsize=self.max_pendientes)
+        cola_oro = asyncio.Queue(maxsize=1)
+        print(f"[vigilante] vigilando {self.landing} (ventana {self.ventana_s} s, max {self.max_archivos} archivos "
+              f"/ {self.max_bytes} bytes, sondeo cada {self.intervalo_s} s)")
+        # Un hilo por etapa: la limpieza de un micro-batch se solapa con el Oro del anterior
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            await asyncio.gather(self._vigilar(cola_limpieza, parar),
+                                 self._etapa_limpieza(cola_limpieza, cola_oro, executor),
+                                 self._etapa_oro(cola_oro, executor))
+        return self.registros
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Vigila el directorio de llegada y procesa micro-batches')
+    parser.add_argument('--landing', default=DIR_LANDING, help='Directorio de llegada de archivos')
+    parser.add_argument('--ventana', type=float, default=30.0,
+                        help='Segundos maximos desde el primer archivo hasta cerrar el micro-batch')
+    parser.add_argument('--max-archivos', type=int, default=50, help='Archivos por micro-batch')
+    parser.add_argument('--max-mb', type=float, default=256, help='MB por micro-batch')
+    parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos entre sondeos')
+    parser.add_argument('--max-pendientes', type=int, default=2,
+                        help='Micro-batches en cola antes de detener el sondeo (contrapresion)')
+    parser.add_argument('--presupuesto', default='project/data/presupuesto.csv')
+    parser.add_argument('--reporte', action='store_true', help='Regenera reporte.md tras cada micro-batch')
+    parser.add_argument('--duracion', type=float, default=None, help='Para tras N segundos (por defecto, hasta Ctrl+C)')
+    parser.add_argument('--ids-deterministas', action='store_true')
+    args = parser.parse_args()
+
+    vigilante = Vigilante(args.landing, args.ventana, args.max_archivos, int(args.max_mb * 2**20), args.intervalo,
+                          args.max_pendientes, args.presupuesto, args.ids_deterministas, args.reporte)
+    asyncio.run(vigilante.ejecutar(args.duracion))
@@ -1,38 +1,194 @@
 """
-Copia el reporte generado a la carpeta de Quartz para publicacion web
+Publica los reportes generados en la carpeta de Quartz de forma incremental
+Sincroniza los reportes Markdown de project/output/ (incluidas subcarpetas,
+p. ej. uno por periodo o por area) con site/content/reportes/:
+
+- Solo copia los reportes nuevos o cuyo contenido ha cambiado (hash
+  BLAKE2b); los demas no se tocan, asi que ni la reconstruccion de Quartz
+  ni el commit ven cambios en ellos.
+- Borra del sitio los reportes publicados cuyo origen ya no existe.
+- Regenera el indice site/content/reportes/index.md si cambia la lista.
+
+El manifiesto site/reportes_publicados.json guarda, por reporte publicado,
+su origen, hash, tamano y mtime: si tamano y mtime del origen no cambian no
+se vuelve a leer, de modo que el coste de publicar depende de los reportes
+que cambian y no del tamano del archivo historico. Cada copia se escribe en
+un temporal y se renombra.
+
+Uso: python project/tools/copy_report_to_site.py [--origen project/output] [--simular]
 """
-import shutil
+import argparse
+import hashlib
+import json
 import os
+import shutil
+import time
 from datetime import datetime
 
 # Rutas
-REPORTE_ORIGEN = 'project/output/reporte.md'
-REPORTE_DESTINO = 'site/content/reportes/reporte-UT1.md'
-
-def copiar_reporte():
-    """Copia el reporte a la carpeta de Quartz"""
-    
-    print("Copiando reporte a Quartz...")
-    
-    if not os.path.exists(REPORTE_ORIGEN):
-        print(f"ERROR: No se encuentra {REPORTE_ORIGEN}")
+DIR_ORIGEN = 'project/output'
+DIR_DESTINO = 'site/content/reportes'
+RUTA_MANIFIESTO = 'site/reportes_publicados.json'
+INDICE = 'index.md'
+# Nombre publicado de los reportes que ya tienen enlaces en el sitio
+NOMBRES_PUBLICADOS = {'reporte.md': 'reporte-UT1.md'}
+
+
+def hash_contenido(ruta):
+    h = hashlib.blake2b(digest_size=16)
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def titulo(ruta):
+    """Primer encabezado '# ' del reporte (o su nombre de archivo)"""
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            if linea.startswith('# '):
+                return linea[2:].strip()
+    return os.path.splitext(os.path.basename(ruta))[0]
+
+
+def descubrir_reportes(origen):
+    """{ruta publicada relativa: ruta de origen} de los .md de `origen`"""
+    reportes = {}
+    for directorio, _, archivos in os.walk(origen):
+        for nombre in sorted(archivos):
+            if not nombre.endswith('.md'):
+                continue
+            relativa = os.path.relpath(os.path.join(directorio, nombre), origen)
+            publicada = NOMBRES_PUBLICADOS.get(relativa, relativa)
+            reportes[publicada.replace(os.sep, '/')] = os.path.join(directorio, nombre)
+    return reportes
+
+
+def leer_manifiesto(ruta=RUTA_MANIFIESTO):
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def leer_texto(ruta):
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return f.read()
+
+
+def escribir_atomico(ruta, contenido):
+    temporal = os.path.join(os.path.dirname(ruta), f'.{os.path.basename(ruta)}.tmp')
+    with open(temporal, 'w', encoding='utf-8', newline='') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def copiar_atomico(origen, destino):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = os.path.join(os.path.dirname(destino), f'.{os.path.basename(destino)}.tmp')
+    shutil.copy2(origen, temporal)
+    os.replace(temporal, destino)
+
+
+def renderizar_indice(manifiesto):
+    """Pagina indice de Quartz con un enlace por reporte publicado"""
+    lineas = ['---', 'title: Reportes', '---', '', '# Reportes publicados', '',
+              f'{len(manifiesto)} reportes.', '']
+    for publicada, entrada in sorted(manifiesto.items()):
+        enlace = publicada[:-len('.md')]
+        lineas.append(f"- [{entrada['titulo']}]({enlace})")
+    return '\n'.join(lineas) + '\n'
+
+
+def publicar(origen=DIR_ORIGEN, destino=DIR_DESTINO, ruta_manifiesto=RUTA_MANIFIESTO, simular=False):
+    """Sincroniza `origen` con `destino`. Devuelve {estado: [rutas publicadas]}
+    con estado nuevo, actualizado, sin_cambios o eliminado."""
+    anterior = leer_manifiesto(ruta_manifiesto)
+    manifiesto = {}
+    cambios = {'nuevo': [], 'actualizado': [], 'sin_cambios': [], 'eliminado': []}
+
+    for publicada, ruta_origen in descubrir_reportes(origen).items():
+        ruta_destino = os.path.join(destino, publicada)
+        estado = os.stat(ruta_origen)
+        previa = anterior.get(publicada)
+        en_sitio = previa is not None and os.path.exists(ruta_destino)
+        if en_sitio and (previa['tamano'], previa['mtime_ns']) == (estado.st_size, estado.st_mtime_ns):
+            manifiesto[publicada] = previa
+            cambios['sin_cambios'].append(publicada)
+            continue
+
+        hash_ = hash_contenido(ruta_origen)
+        entrada = {'origen': ruta_origen, 'hash': hash_, 'tamano': estado.st_size,
+                   'mtime_ns': estado.st_mtime_ns, 'titulo': titulo(ruta_origen)}
+        manifiesto[publicada] = entrada
+        if en_sitio and previa['hash'] == hash_:
+            # Mismo contenido con otro mtime: solo se actualiza el manifiesto
+            cambios['sin_cambios'].append(publicada)
+            continue
+        cambios['actualizado' if previa is not None else 'nuevo'].append(publicada)
+        if not simular:
+            copiar_atomico(ruta_origen, ruta_destino)
+
+    # Solo se borran reportes que publico esta herramienta, nunca otras paginas
+    for publicada in sorted(set(anterior) - set(manifiesto)):
+        cambios['eliminado'].append(publicada)
+        ruta_destino = os.path.join(destino, publicada)
+        if not simular and os.path.exists(ruta_destino):
+            os.remove(ruta_destino)
+            # Subcarpetas que quedan vacias (p. ej. un periodo retirado)
+            carpeta = os.path.dirname(ruta_destino)
+            while os.path.normpath(carpeta) != os.path.normpath(destino) and not os.listdir(carpeta):
+                os.rmdir(carpeta)
+                carpeta = os.path.dirname(carpeta)
+
+    if not simular:
+        ruta_indice = os.path.join(destino, INDICE)
+        indice = renderizar_indice(manifiesto)
+        os.makedirs(destino, exist_ok=True)
+        if leer_texto(ruta_indice) != indice:
+            escribir_atomico(ruta_indice, indice)
+        if manifiesto != anterior:
+            escribir_atomico(ruta_manifiesto, json.dumps(manifiesto, indent=2, sort_keys=True) + '\n')
+    return cambios
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publica los reportes en Quartz (solo los cambios)')
+    parser.add_argument('--origen', default=DIR_ORIGEN, help='Directorio con los reportes .md generados')
+    parser.add_argument('--destino', default=DIR_DESTINO, help='Carpeta de reportes del sitio Quartz')
+    parser.add_argument('--manifiesto', default=RUTA_MANIFIESTO, help='Manifiesto de reportes publicados')
+    parser.add_argument('--simular', action='store_true', help='Muestra los cambios sin copiar ni borrar')
+    args = parser.parse_args()
+
+    print("Publicando reportes en Quartz...")
+
+    if not os.path.isdir(args.origen):
+        print(f"ERROR: No se encuentra {args.origen}")
         print("   Ejecuta primero: python project/ingest/run.py")
         return
-    
-    # Crear carpeta destino si no existe
-    os.makedirs(os.path.dirname(REPORTE_DESTINO), exist_ok=True)
-    
-    # Copiar archivo
-    shutil.copy2(REPORTE_ORIGEN, REPORTE_DESTINO)
-    
-    print(f"Reporte copiado a: {REPORTE_DESTINO}")
+
+    inicio = time.perf_counter()
+    cambios = publicar(args.origen, args.destino, args.manifiesto, args.simular)
+    for estado in ['nuevo', 'actualizado', 'eliminado']:
+        for publicada in cambios[estado]:
+            print(f"   {estado:<12} {os.path.join(args.destino, publicada)}")
+    print(f"Reportes: {len(cambios['nuevo'])} nuevos, {len(cambios['actualizado'])} actualizados, "
+          f"{len(cambios['eliminado'])} eliminados, {len(cambios['sin_cambios'])} sin cambios "
+          f"({time.perf_counter() - inicio:.2f} s){' [simulacion]' if args.simular else ''}")
     print(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    if not any(cambios[e] for e in ['nuevo', 'actualizado', 'eliminado']):
+        print("\nNada que publicar: el sitio ya esta al dia.")
+        return
     print("\nProximos pasos para publicar en GitHub Pages:")
     print("   1. cd site")
     print("   2. npx quartz build --serve  (para previsualizar)")
-    print("   3. git add . && git commit -m 'Actualizar reporte'")
+    print(f"   3. git add {args.destino} {args.manifiesto} && git commit -m 'Actualizar reportes'")
     print("   4. git push origin main")
     print("\n   El workflow de GitHub Actions desplegara automaticamente.")
 
+
 if __name__ == '__main__':
-    copiar_reporte()
\ No newline at end of file
+    main()